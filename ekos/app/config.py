@@ -29,11 +29,63 @@ class Settings(BaseSettings):
     secret_manager_project_id: Optional[str] = None
     secret_manager_secret_name: Optional[str] = None
 
+    # Embedding cache: in-memory LRU entries and optional SQLite file shared by all processes
+    embedding_cache_size: int = 50000
+    embedding_cache_path: Optional[str] = None
+    # Micro-batching: concurrent embedding calls are coalesced into backend calls
+    embedding_batch_size: int = 64
+    embedding_batch_wait_ms: float = 5.0
+    embedding_max_in_flight: int = 4
+
     # Vector Database - Pinecone
     pinecone_api_key: Optional[str] = None
     pinecone_environment: str = "us-west1-gcp"
     pinecone_index_name: str = "ekos-embeddings"
 
+    # Local vector index (used when no Pinecone key is configured)
+    vector_index_backend: str = "flat"  # flat | hnsw | ivfpq
+    # Flat scans read an int8/float16 copy first and rescore a shortlist in float32
+    vector_quantization: str = "none"  # none | int8 | float16
+    vector_rescore_candidates: int = 256
+    # Threads scanning shards of a namespace's matrix in parallel (0 = one per core, 1 = serial)
+    vector_scan_threads: int = 0
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 64
+    ivfpq_nlist: int = 256
+    ivfpq_m: int = 48
+    ivfpq_nprobe: int = 16
+    ivfpq_rerank: bool = False
+    ivfpq_rerank_candidates: int = 256
+    ivfpq_train_size: int = 10000
+    # Durable segments + append log; in-memory only when unset
+    vector_store_dir: Optional[str] = None
+    vector_segment_rows: int = 50000
+    vector_store_fsync: bool = False
+    # Each namespace (tenant) gets its own collection under vector_store_dir;
+    # idle persistent ones beyond this count are closed (0 = never)
+    vector_max_open_namespaces: int = 64
+    # writer: this process owns the directory; reader: attach read-only, sharing
+    # the mapped segments and following the writer. Unset: the ingest worker is
+    # the writer and every other process (the API) a reader
+    vector_store_role: Optional[str] = None
+    vector_store_refresh_seconds: float = 1.0
+    # Background compaction rewrites segments once this fraction of rows is deleted
+    vector_compact_dead_ratio: float = 0.3
+    vector_compact_interval_seconds: int = 300  # 0 disables the background compactor
+    # Vectors sampled from a namespace to fit a PCA reduction and estimate its recall
+    vector_reduction_sample_size: int = 20000
+    # Chunks whose estimated Jaccard similarity (5-byte shingles, MinHash) to a stored
+    # chunk of the same tenant reaches this are collapsed into it at ingest (0 disables)
+    near_duplicate_threshold: float = 0.8
+    # BM25 index over this chunk metadata field ("" disables) and hybrid fusion
+    lexical_index_field: str = "text"
+    hybrid_candidates: int = 50
+    hybrid_rrf_k: int = 60
+    hybrid_lexical_weight: float = 1.0
+    # Metadata fields kept in posting lists so filters resolve before scoring
+    vector_filter_fields: Union[List[str], str] = ["tenant_id", "source", "tags", "doc_id"]
+
     # Knowledge Graph - Neo4j
     neo4j_uri: str = "bolt://localhost:7687"
     neo4j_user: str = "neo4j"
@@ -55,10 +107,10 @@ class Settings(BaseSettings):
     # CORS
     cors_origins: Union[List[str], str] = ["http://localhost:3000", "http://localhost:5173"]
 
-    @field_validator("cors_origins", mode="before")
+    @field_validator("cors_origins", "vector_filter_fields", mode="before")
     @classmethod
     def parse_cors_origins(cls, v):
-        """Parse CORS origins from comma-separated string or list."""
+        """Parse CORS origins (and other list settings) from comma-separated string or list."""
         if isinstance(v, str):
             return [origin.strip() for origin in v.split(",") if origin.strip()]
         return v
@@ -66,6 +118,21 @@ class Settings(BaseSettings):
     # File Upload
     max_upload_size_mb: int = 100
     upload_dir: str = "./uploads"
+    # Chunks the ingest worker embeds and upserts per step while streaming a document
+    ingest_batch_chunks: int = 256
+    # Processes parsing and chunking text/tabular files off the event loop
+    # (0 = one per core, -1 = in the calling process)
+    preprocess_processes: int = 0
+    # Spreadsheet / Parquet / Arrow rows read and converted to chunks per batch
+    spreadsheet_batch_rows: int = 10000
+    # Text chunk boundaries: "content" (at content-defined anchors, so an edit
+    # only changes nearby chunks) | "fixed" (every chunk_size - chunk_overlap characters)
+    text_chunking: str = "content"
+    # PDF pages extracted per pool task (pages are split into ranges across processes)
+    pdf_pages_per_task: int = 8
+    # Chunk outputs persisted by (file sha256, chunking options); disabled when unset
+    preprocess_cache_dir: Optional[str] = None
+    preprocess_cache_max_mb: int = 2048  # least recently used artifacts are evicted beyond this
 
     # Logging
     log_level: str = "INFO"
@@ -40,10 +40,25 @@ async def lifespan(app: FastAPI):
 
     os.makedirs(settings.upload_dir, exist_ok=True)
 
+    # Background compaction of the local vector store (readers leave it to the writer)
+    import asyncio
+
+    from services.vector_store import run_compaction_loop, vector_store_role
+
+    compactor = None
+    if settings.vector_compact_interval_seconds > 0 and vector_store_role(settings) != "reader":
+        compactor = asyncio.create_task(run_compaction_loop(settings.vector_compact_interval_seconds))
+
     yield
 
     # Shutdown
     logger.info("Shutting down EKOS backend...")
+    if compactor is not None:
+        compactor.cancel()
+
+    from services.preprocess import get_preprocess_service
+
+    get_preprocess_service().close()
 
 
 # Create FastAPI app
@@ -42,7 +42,7 @@ class PreprocessRequest(BaseModel):
 
     doc_id: str = Field(..., description="Document ID to preprocess")
     options: Dict[str, Any] = Field(
-        default_factory=dict, description="Preprocessing options (ocr, stt, chunking)"
+        default_factory=dict, description="Preprocessing options (ocr, stt, chunking, columns for tabular files)"
     )
 
 
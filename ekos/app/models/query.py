@@ -1,7 +1,7 @@
 """Pydantic models for query endpoints."""
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -16,6 +16,15 @@ class QueryRequest(BaseModel):
     )
     top_k: int = Field(default=5, ge=1, le=20, description="Number of results to retrieve")
     include_citations: bool = Field(default=True, description="Include source citations")
+    expansions: List[str] = Field(
+        default_factory=list,
+        max_length=16,
+        description="Alternative phrasings retrieved together with the query (query expansion)",
+    )
+    mode: Literal["vector", "lexical", "hybrid"] = Field(
+        default="vector",
+        description="Retrieval mode: embeddings, keywords (BM25) or both fused",
+    )
 
 
 class Citation(BaseModel):
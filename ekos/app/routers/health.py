@@ -2,6 +2,7 @@
 
 import logging
 from datetime import datetime
+from typing import Any, Dict
 
 from fastapi import APIRouter, Depends
 
@@ -55,3 +56,23 @@ async def health_check(settings: Settings = Depends(get_settings)):
         services=services,
     )
 
+
+@router.get("/stats")
+async def service_stats() -> Dict[str, Any]:
+    """Cache and batching counters, near-duplicate counts and per-namespace vector store statistics."""
+    from services.embeddings import get_embedding_service
+    from services.preprocess import get_preprocess_service
+    from services.vector_store import get_vector_store
+
+    embedding_service = get_embedding_service()
+    cache = embedding_service.cache
+    artifacts = get_preprocess_service().artifacts
+    vector_store = get_vector_store()
+    near_duplicates = vector_store.near_duplicates
+    return {
+        "embedding_cache": cache.stats() if cache is not None else None,
+        "embedding_batches": embedding_service.batch_stats(),
+        "preprocess_artifacts": artifacts.stats() if artifacts is not None else None,
+        "vector_store": vector_store.stats(),
+        "near_duplicates": near_duplicates.stats() if near_duplicates is not None else None,
+    }
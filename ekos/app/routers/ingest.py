@@ -18,6 +18,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Uploads are copied to disk in blocks of this size
+_UPLOAD_BLOCK_BYTES = 1 << 20
+
 
 @router.post("/url", response_model=IngestUrlResponse)
 async def ingest_url(
@@ -100,27 +103,28 @@ async def ingest_upload(
 
         settings = get_settings()
 
-        # Check file size
-        file_content = await file.read()
-        file_size = len(file_content)
-
-        max_size = settings.max_upload_size_mb * 1024 * 1024
-        if file_size > max_size:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Maximum size: {settings.max_upload_size_mb}MB",
-            )
-
         # Generate document ID
         doc_id = str(uuid.uuid4())
 
-        # Save file
+        # Save file in blocks, checking the size as it arrives
         os.makedirs(settings.upload_dir, exist_ok=True)
         file_ext = os.path.splitext(file.filename)[1] if file.filename else ""
         file_path = os.path.join(settings.upload_dir, f"{doc_id}{file_ext}")
 
+        max_size = settings.max_upload_size_mb * 1024 * 1024
+        file_size = 0
         with open(file_path, "wb") as f:
-            f.write(file_content)
+            while block := await file.read(_UPLOAD_BLOCK_BYTES):
+                file_size += len(block)
+                if file_size > max_size:
+                    break
+                f.write(block)
+        if file_size > max_size:
+            os.unlink(file_path)
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large. Maximum size: {settings.max_upload_size_mb}MB",
+            )
 
         # Parse metadata
         metadata_dict = {}
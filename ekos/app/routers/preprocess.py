@@ -52,18 +52,17 @@ async def preprocess_document(
                 detail=f"Document not found: {doc_id}",
             )
 
-        # Process document
-        result = await preprocess_service.process_document(
-            doc_id=doc_id,
-            file_path=file_path,
-            options=request.options,
-        )
+        # Process document; chunks are counted as they stream in (parsing runs
+        # in the preprocessing pool), never held all at once
+        chunk_count = 0
+        async for _ in preprocess_service.iter_chunks(file_path, request.options):
+            chunk_count += 1
 
         return PreprocessResponse(
             doc_id=doc_id,
-            status=result["status"],
-            message=f"Processed {result['chunk_count']} chunks",
-            chunks_created=result["chunk_count"],
+            status="success" if chunk_count else "no_chunks",
+            message=f"Processed {chunk_count} chunks",
+            chunks_created=chunk_count,
         )
 
     except HTTPException:
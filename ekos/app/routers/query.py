@@ -3,7 +3,7 @@
 import logging
 import uuid
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Any, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, status
 
@@ -35,9 +35,14 @@ async def query(
     Accepts a natural language query, retrieves relevant chunks, and synthesizes a response.
     """
     try:
-        # Generate query embedding
+        # Generate query embeddings (one per expansion)
         embedding_service = get_embedding_service()
-        query_embedding = await embedding_service.generate_embedding(request.query)
+        query_texts = [request.query, *request.expansions]
+        query_embeddings = None
+        if request.mode != "lexical":
+            query_embeddings = await embedding_service.generate_embeddings_array(
+                query_texts, task_type="retrieval_query"
+            )
 
         # Query vector store
         vector_store = get_vector_store()
@@ -46,13 +51,42 @@ async def query(
         filters = request.filters.copy()
         filters["tenant_id"] = request.tenant_id or tenant_id
 
-        # Retrieve top-k chunks
-        results = await vector_store.query(
-            vector=query_embedding,
-            top_k=request.top_k,
-            filter=filters if filters else None,
-            include_metadata=True,
-        )
+        if request.mode == "hybrid":
+            # Vector and keyword retrieval run concurrently and are fused (RRF)
+            results = await vector_store.hybrid_query(
+                vectors=query_embeddings,
+                text=" ".join(query_texts),
+                top_k=request.top_k,
+                namespace=filters["tenant_id"],
+                filter=filters,
+                include_metadata=True,
+            )
+        elif request.mode == "lexical":
+            results = await vector_store.lexical_query(
+                text=" ".join(query_texts),
+                top_k=request.top_k,
+                namespace=filters["tenant_id"],
+                filter=filters,
+                include_metadata=True,
+            )
+        else:
+            # Retrieve top-k chunks for every phrasing in one batched pass over the
+            # tenant's namespace, keeping each chunk's best score
+            batch_results = await vector_store.query_batch(
+                vectors=query_embeddings,
+                top_k=request.top_k,
+                namespace=filters["tenant_id"],
+                filters=filters if filters else None,
+                include_metadata=True,
+            )
+            best: Dict[str, Dict[str, Any]] = {}
+            for result in (r for query_results in batch_results for r in query_results):
+                if result["id"] not in best or result["score"] > best[result["id"]]["score"]:
+                    best[result["id"]] = result
+            results = sorted(best.values(), key=lambda r: r["score"], reverse=True)[: request.top_k]
+
+        # Near-duplicates were collapsed at ingest: cite their documents too
+        results = await vector_store.attach_duplicates(results, filters["tenant_id"])
 
         # Prepare context chunks
         context_chunks = []
@@ -0,0 +1,49 @@
+"""
+Benchmark embedding dimensionality reduction: recall@10 against memory per vector.
+
+Embeds a synthetic corpus with the local backend (or samples a tenant's
+stored vectors with ``--namespace``) and compares the exact top-10 of
+held-out vectors in reduced space with the full-dimension top-10.
+
+Usage (from the ``ekos/`` directory):
+    python -m benchmarks.dim_reduction --docs 20000 --dims 64 128 192
+    VECTOR_STORE_DIR=/data/vectors python -m benchmarks.dim_reduction --namespace acme
+"""
+
+import argparse
+import asyncio
+
+from benchmarks.local_embeddings import synthetic_corpus
+from services.dim_reduction import evaluate_reductions
+from services.local_embeddings import HashedNgramEmbedder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--chars", type=int, default=400)
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 96, 128, 192, 256])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--namespace", help="Evaluate a tenant's stored vectors instead of a synthetic corpus")
+    args = parser.parse_args()
+
+    if args.namespace:
+        from services.vector_store import VectorStore
+
+        report = asyncio.run(VectorStore().evaluate_reduction(args.namespace, args.dims))
+        full_dim, rows = report["dim"], report["candidates"]
+    else:
+        vectors = HashedNgramEmbedder().embed(synthetic_corpus(args.docs, args.chars))
+        full_dim, rows = vectors.shape[1], evaluate_reductions(vectors, args.dims, queries=args.queries)
+
+    print(f"full dimension {full_dim}: {full_dim * 4} bytes/vector")
+    print(f"{'method':>9} {'dims':>5} {'bytes/vec':>10} {'memory':>7} {'recall@10':>10}")
+    for row in rows:
+        print(
+            f"{row['method']:>9} {row['dims']:>5} {row['bytes_per_vector']:>10} "
+            f"{row['memory_ratio']:>7.2%} {row['recall@10']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark re-ingesting an edited document: chunks re-embedded per edit.
+
+Ingests a synthetic text document with the ingest worker's chunk pipeline
+(in-memory vector store), applies a few small edits at random places, and
+ingests it again, once per chunking strategy. With content-defined chunking
+only the chunks around each edit are embedded and upserted again. Fixed
+chunks end at the last period or newline in their second half, so they fall
+back in step after an edit only where sentences are short; with
+``--sentence-words 0`` (no punctuation, like logs or transcripts) every chunk
+after the first edit shifts.
+
+Usage (from the ``ekos/`` directory):
+    python -m benchmarks.incremental_ingest --words 200000 --edits 1 5 20 --sentence-words 0
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import get_settings
+from services.preprocess import TEXT_CHUNKERS, PreprocessService
+from services.vector_store import get_vector_store
+from workers.worker_ingest import _ingest_chunks
+
+
+def synthetic_text(words: int, sentence_words: int = 12, seed: int = 0) -> str:
+    """Sentences of random words (no periods when ``sentence_words`` is 0), a line break every 100 words."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    vocabulary = ["".join(rng.choice(letters, rng.integers(2, 10))) for _ in range(5000)]
+    tokens = [vocabulary[i] for i in rng.integers(0, len(vocabulary), words)]
+    if sentence_words:
+        for i in range(sentence_words, words, sentence_words):
+            tokens[i] += "."
+    for i in range(100, words, 100):
+        tokens[i] += "\n"
+    return " ".join(tokens)
+
+
+def edit(text: str, edits: int, seed: int = 1) -> str:
+    """Insert a sentence and delete a few words at ``edits`` random places."""
+    rng = np.random.default_rng(seed)
+    for position in sorted(rng.integers(0, len(text), edits).tolist(), reverse=True):
+        text = text[:position] + " A newly added sentence." + text[position + int(rng.integers(0, 60)) :]
+    return text
+
+
+async def _ingest(service: PreprocessService, doc_id: str, path: str) -> tuple:
+    start = time.perf_counter()
+    # One namespace per document: copies of the same text would be collapsed as near-duplicates
+    chunk_ids, stored_ids, upserted, unchanged = await _ingest_chunks(service, doc_id, path, {}, doc_id)
+    await get_vector_store().delete_by_doc(doc_id, namespace=doc_id, keep_ids=stored_ids)
+    return len(chunk_ids), upserted, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=100000)
+    parser.add_argument("--edits", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--sentence-words", type=int, default=12)
+    args = parser.parse_args()
+
+    text = synthetic_text(args.words, args.sentence_words)
+    print(f"{len(text) / 1e6:.1f}M characters")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "doc.txt")
+        for strategy in TEXT_CHUNKERS:
+            settings = get_settings().model_copy(update={"text_chunking": strategy, "preprocess_processes": -1})
+            service = PreprocessService(settings)
+            for edits in args.edits:
+                doc_id = f"{strategy}-{edits}"
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                chunks, _, full = asyncio.run(_ingest(service, doc_id, path))
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(edit(text, edits))
+                chunks, upserted, elapsed = asyncio.run(_ingest(service, doc_id, path))
+                print(
+                    f"{strategy:>8}, {edits:>3} edits: re-embedded {upserted}/{chunks} chunks "
+                    f"({upserted / chunks:.1%}) in {elapsed:.2f}s, first ingest {full:.2f}s"
+                )
+
+
+if __name__ == "__main__":
+    main()
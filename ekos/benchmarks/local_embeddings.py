@@ -0,0 +1,92 @@
+"""
+Benchmark the local CPU embedding backend: throughput and retrieval quality.
+
+Throughput is measured on one thread, so docs/sec is also docs/sec per core.
+Retrieval uses synthetic documents with a Zipf vocabulary; each query is a
+few words of one document with a typo, and recall@k counts how often that
+document is among the ``k`` nearest.
+
+Usage (from the ``ekos/`` directory):
+    python -m benchmarks.local_embeddings --docs 5000 --chars 1000
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.local_embeddings import HashedNgramEmbedder
+
+
+def synthetic_corpus(n: int, chars: int, vocabulary: int = 20000, seed: int = 0) -> List[str]:
+    """Documents of about ``chars`` characters drawn from a Zipf-distributed vocabulary."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = ["".join(rng.choice(letters, rng.integers(3, 11))) for _ in range(vocabulary)]
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    per_doc = max(1, chars // 7)
+    return [" ".join(words[i] for i in rng.choice(vocabulary, per_doc, p=weights)) for _ in range(n)]
+
+
+def typo_queries(documents: List[str], n: int, words: int = 6, seed: int = 1) -> List[str]:
+    """Pick ``words`` consecutive words of random documents and swap two letters in one."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in range(n):
+        tokens = documents[i].split()
+        start = rng.integers(0, max(1, len(tokens) - words))
+        picked = tokens[start : start + words]
+        j = rng.integers(0, len(picked))
+        word = picked[j]
+        if len(word) > 3:
+            k = rng.integers(1, len(word) - 1)
+            picked[j] = word[:k] + word[k + 1] + word[k] + word[k + 2 :]
+        queries.append(" ".join(picked))
+    return queries
+
+
+def run(n_docs: int, chars: int, n_queries: int, batch_size: int) -> Dict[str, float]:
+    embedder = HashedNgramEmbedder()
+    documents = synthetic_corpus(n_docs, chars)
+    embedder.embed(documents[:batch_size])
+
+    start = time.perf_counter()
+    matrix = np.concatenate(
+        [embedder.embed(documents[i : i + batch_size]) for i in range(0, n_docs, batch_size)]
+    )
+    elapsed = time.perf_counter() - start
+
+    queries = embedder.embed(typo_queries(documents, n_queries))
+    ranks = np.argsort(-(queries @ matrix.T), axis=1)[:, :10]
+    truth = np.arange(n_queries)[:, None]
+    return {
+        "docs": n_docs,
+        "mean_chars": float(np.mean([len(d) for d in documents])),
+        "docs_per_sec_core": n_docs / elapsed,
+        "mb_per_sec_core": sum(len(d) for d in documents) / elapsed / 1e6,
+        "recall@1": float(np.mean(ranks[:, :1] == truth)),
+        "recall@10": float(np.mean((ranks == truth).any(axis=1))),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--chars", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'chars':>6} {'docs/s/core':>12} {'MB/s/core':>10} {'recall@1':>9} {'recall@10':>10}")
+    for chars in args.chars:
+        row = run(args.docs, chars, min(args.queries, args.docs), args.batch_size)
+        print(
+            f"{row['mean_chars']:>6.0f} {row['docs_per_sec_core']:>12.0f} {row['mb_per_sec_core']:>10.2f} "
+            f"{row['recall@1']:>9.3f} {row['recall@10']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
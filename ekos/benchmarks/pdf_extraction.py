@@ -0,0 +1,97 @@
+"""
+Benchmark PDF ingestion: pages/sec/core from PDF file to chunks.
+
+Writes a synthetic text PDF and times ``PreprocessService`` extracting and
+chunking it, in-process and with page ranges split across pool processes.
+
+Usage (from the ``ekos/`` directory):
+    python -m benchmarks.pdf_extraction --pages 400 --processes 1 2 4 --pages-per-task 8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+from app.config import get_settings
+from services.preprocess import PreprocessService
+
+
+def synthetic_pdf(path: str, pages: int, lines_per_page: int = 50) -> None:
+    """Write a PDF of ``pages`` pages of text lines (Helvetica, no compression)."""
+
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects: List[bytes] = []  # object i + 1
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for number in range(pages):
+        lines = [
+            f"Page {number + 1} line {line}: section {number % 13} covers topic {(number + line) % 7}."
+            for line in range(lines_per_page)
+        ]
+        content = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[number] + 1} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream".encode())
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+async def _count_chunks(service: PreprocessService, path: str) -> int:
+    return sum([1 async for _ in service.iter_chunks(path)])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--pages-per-task", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "doc.pdf")
+        synthetic_pdf(path, args.pages)
+        warmup = os.path.join(directory, "warmup.pdf")
+        synthetic_pdf(warmup, 1)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} cores")
+        for processes in [-1, *args.processes]:
+            settings = get_settings().model_copy(
+                update={"preprocess_processes": processes, "pdf_pages_per_task": args.pages_per_task}
+            )
+            service = PreprocessService(settings)
+            try:
+                asyncio.run(_count_chunks(service, warmup))  # start the pool outside the timing
+                start = time.perf_counter()
+                chunks = asyncio.run(_count_chunks(service, path))
+                elapsed = time.perf_counter() - start
+            finally:
+                service.close()
+            cores = max(processes, 1)
+            label = "in-process" if processes < 0 else f"{processes} processes"
+            print(
+                f"{label:>14}: {chunks} chunks in {elapsed:.2f}s, {args.pages / elapsed:,.1f} pages/sec, "
+                f"{args.pages / elapsed / cores:,.1f} pages/sec/core"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark spreadsheet ingestion: rows/sec from CSV file to chunks.
+
+Writes a synthetic export (mixed types, ~10% null cells, some long notes)
+and times ``PreprocessService`` turning it into chunks.
+
+Usage (from the ``ekos/`` directory):
+    python -m benchmarks.spreadsheet_ingest --rows 500000 --batch-rows 10000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.config import get_settings
+from services.preprocess import PreprocessService
+
+
+def synthetic_sheet(path: str, rows: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    notes = np.array(["ok", "late delivery, customer called twice", None, "x" * 1500], dtype=object)
+    pd.DataFrame(
+        {
+            "id": np.arange(rows),
+            "name": rng.choice(["alice", "bob", "carol", "dave"], rows),
+            "amount": rng.random(rows) * 100,
+            "region": rng.choice(np.array(["north", "south", None], dtype=object), rows),
+            "qty": rng.integers(0, 50, rows),
+            "note": notes[rng.choice(4, rows, p=[0.5, 0.3, 0.19, 0.01])],
+            "date": pd.date_range("2024-01-01", periods=rows, freq="min").astype(str),
+            "score": np.where(rng.random(rows) < 0.1, np.nan, rng.random(rows)),
+        }
+    ).to_csv(path, index=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    service = PreprocessService(get_settings().model_copy(update={"spreadsheet_batch_rows": args.batch_rows}))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sheet.csv")
+        synthetic_sheet(path, args.rows)
+        start = time.perf_counter()
+        chunks = sum(1 for _ in service._iter_spreadsheet_chunks(path))
+        elapsed = time.perf_counter() - start
+    print(f"{args.rows} rows -> {chunks} chunks in {elapsed:.2f}s: {args.rows / elapsed:,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compare local vector index backends: recall@k, memory and query latency.
+
+Usage (from the ``ekos/`` directory):
+    python -m benchmarks.vector_indexes --vectors 50000 --dim 384
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from services.hnsw_index import HNSW_AVAILABLE, HNSWIndex
+from services.ivfpq_index import IVFPQIndex
+from services.vector_index import FlatIndex, VectorIndex
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Clustered Gaussian vectors, a rough stand-in for document embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    labels = rng.integers(0, clusters, n)
+    return (centers[labels] + 0.7 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def recall_at_k(index: VectorIndex, reference: VectorIndex, queries: np.ndarray, k: int) -> float:
+    """Fraction of the exact top-k returned by ``index``."""
+    hits = 0
+    for query in queries:
+        truth = {vector_id for vector_id, _ in reference.search(query, top_k=k)}
+        hits += len(truth & {vector_id for vector_id, _ in index.search(query, top_k=k)})
+    return hits / (k * len(queries))
+
+
+def run(n: int, dim: int, n_queries: int, k: int) -> List[Dict[str, float]]:
+    vectors = synthetic_embeddings(n, dim)
+    queries = synthetic_embeddings(n_queries, dim, seed=1)
+    ids = [f"v{i}" for i in range(n)]
+    m = next(m for m in (48, 32, 24, 16, 8, 4, 2, 1) if dim % m == 0)
+
+    backends: Dict[str, Callable[[], VectorIndex]] = {
+        "flat": FlatIndex,
+        "flat+int8": lambda: FlatIndex(quantization="int8"),
+        "flat+float16": lambda: FlatIndex(quantization="float16"),
+        "ivfpq": lambda: IVFPQIndex(nlist=256, m=m, nprobe=16, train_size=min(n, 10000), seed=0),
+        "ivfpq+rerank": lambda: IVFPQIndex(
+            nlist=256, m=m, nprobe=16, rerank=True, train_size=min(n, 10000), seed=0
+        ),
+    }
+    if HNSW_AVAILABLE:
+        backends["hnsw"] = lambda: HNSWIndex(m=16, ef_construction=100, ef_search=64, seed=0)
+
+    reference = None
+    rows = []
+    for name, factory in backends.items():
+        index = factory()
+        start = time.perf_counter()
+        index.add(ids, vectors)
+        build = time.perf_counter() - start
+        reference = reference or index
+
+        start = time.perf_counter()
+        for query in queries:
+            index.search(query, top_k=k)
+        latency = (time.perf_counter() - start) / n_queries
+
+        rows.append(
+            {
+                "backend": name,
+                "recall": recall_at_k(index, reference, queries, k),
+                "bytes_per_vector": index.memory_bytes() / n,
+                "build_s": build,
+                "query_ms": latency * 1000,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'backend':<14}{'recall@' + str(args.k):>10}{'bytes/vec':>12}{'build s':>10}{'query ms':>10}")
+    for row in run(args.vectors, args.dim, args.queries, args.k):
+        print(
+            f"{row['backend']:<14}{row['recall']:>10.3f}{row['bytes_per_vector']:>12.1f}"
+            f"{row['build_s']:>10.2f}{row['query_ms']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
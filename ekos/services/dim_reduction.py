@@ -0,0 +1,151 @@
+"""Embedding dimensionality reduction (truncation or PCA) for compact per-tenant indexes."""
+
+import io
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.vector_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+REDUCTION_METHODS = ("truncate", "pca")
+
+
+class Projection:
+    """
+    Linear map from ``input_dim`` to ``output_dim`` dimensions.
+
+    ``truncate`` keeps the leading coordinates (Matryoshka-style embeddings
+    put most information there). ``pca`` projects onto the top principal
+    directions of a sample of the tenant's vectors; the sample is not
+    centered, so projected dot products approximate the original ones.
+    Callers renormalize after ``apply``.
+    """
+
+    def __init__(self, method: str, input_dim: int, output_dim: int, components: Optional[np.ndarray] = None):
+        """
+        Initialize the projection.
+
+        Args:
+            method: ``"truncate"`` or ``"pca"``
+            input_dim: Dimension of incoming vectors
+            output_dim: Dimension of stored vectors
+            components: ``(output_dim, input_dim)`` rows to project onto (``pca`` only)
+        """
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Unknown reduction method: {method}")
+        if not 0 < output_dim <= input_dim:
+            raise ValueError(f"Cannot reduce {input_dim} dimensions to {output_dim}")
+        if method == "pca" and (components is None or components.shape != (output_dim, input_dim)):
+            raise ValueError(f"PCA needs a ({output_dim}, {input_dim}) component matrix")
+        self.method = method
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.components = None if components is None else np.ascontiguousarray(components, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, method: str, sample: np.ndarray, output_dim: int) -> "Projection":
+        """
+        Build a projection for vectors like ``sample``.
+
+        Args:
+            method: ``"truncate"`` or ``"pca"``
+            sample: ``(n, input_dim)`` vectors (only its width is used for truncation)
+            output_dim: Target dimension
+        """
+        sample = normalize_rows(sample)
+        if method != "pca":
+            return cls(method, sample.shape[1], output_dim)
+        if len(sample) < output_dim:
+            raise ValueError(f"PCA to {output_dim} dimensions needs at least {output_dim} sample vectors")
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        return cls("pca", sample.shape[1], output_dim, vt[:output_dim])
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        """Project ``(n, input_dim)`` vectors to ``(n, output_dim)`` (not renormalized)."""
+        if vectors.shape[1] != self.input_dim:
+            raise ValueError(f"Expected {self.input_dim}-dimensional vectors, got {vectors.shape[1]}")
+        if self.method == "truncate":
+            return np.ascontiguousarray(vectors[:, : self.output_dim])
+        return vectors @ self.components.T
+
+    def to_bytes(self) -> bytes:
+        """Serialize as an ``.npz`` archive."""
+        buffer = io.BytesIO()
+        arrays = {"components": self.components} if self.components is not None else {}
+        np.savez(buffer, method=self.method, dims=np.array([self.input_dim, self.output_dim]), **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        """Read a projection written with ``to_bytes``."""
+        with np.load(path) as archive:
+            input_dim, output_dim = (int(d) for d in archive["dims"])
+            components = archive["components"] if "components" in archive.files else None
+            return cls(str(archive["method"]), input_dim, output_dim, components)
+
+    def describe(self) -> Dict[str, Any]:
+        """Method and dimensions, for stats."""
+        return {"method": self.method, "input_dim": self.input_dim, "output_dim": self.output_dim}
+
+
+def evaluate_reductions(
+    vectors: np.ndarray,
+    dims: Sequence[int],
+    methods: Sequence[str] = REDUCTION_METHODS,
+    queries: int = 200,
+    top_k: int = 10,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Measure recall against memory for candidate reductions of one tenant's vectors.
+
+    ``queries`` of the vectors are held out as queries; for each candidate
+    the exact top-k over the rest in reduced space is compared with the
+    exact top-k in full space. PCA is fitted on the remaining vectors.
+
+    Args:
+        vectors: Sample of the tenant's stored vectors
+        dims: Target dimensions to try
+        methods: Reduction methods to try
+        queries: Number of held-out query vectors
+        top_k: Neighbors compared per query
+
+    Returns:
+        One row per candidate: ``method``, ``dims``, ``recall@k``,
+        ``bytes_per_vector`` and ``memory_ratio`` (vs float32 full dimension)
+    """
+    vectors = normalize_rows(vectors)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    n_queries = min(queries, len(vectors) // 2)
+    query_vectors, corpus = vectors[order[:n_queries]], vectors[order[n_queries:]]
+    k = min(top_k, len(corpus))
+    if n_queries == 0 or k == 0:
+        raise ValueError("Need at least two vectors to evaluate a reduction")
+
+    def top(matrix: np.ndarray, q: np.ndarray) -> np.ndarray:
+        return np.argpartition(-(q @ matrix.T), k - 1, axis=1)[:, :k]
+
+    truth = top(corpus, query_vectors)
+    full_dim = vectors.shape[1]
+    rows = []
+    for method in methods:
+        for dim in dims:
+            if dim >= full_dim or (method == "pca" and dim > len(corpus)):
+                continue
+            projection = Projection.fit(method, corpus, dim)
+            found = top(normalize_rows(projection.apply(corpus)), normalize_rows(projection.apply(query_vectors)))
+            hits = sum(len(set(a) & set(b)) for a, b in zip(truth.tolist(), found.tolist()))
+            rows.append(
+                {
+                    "method": method,
+                    "dims": dim,
+                    f"recall@{k}": round(hits / (k * n_queries), 4),
+                    "bytes_per_vector": dim * 4,
+                    "memory_ratio": round(dim / full_dim, 4),
+                }
+            )
+    return rows
@@ -0,0 +1,109 @@
+"""Dynamic micro-batching of embedding requests."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesce concurrent embedding calls into batched backend calls.
+
+    Texts submitted by concurrent callers are queued and sent together: a
+    batch goes out as soon as ``max_batch_size`` texts are waiting, or
+    ``max_wait_ms`` after the first text arrived. At most ``max_in_flight``
+    batches run at once. While all slots are busy, texts keep accumulating
+    and are sent as soon as a batch completes, so under load every call
+    carries close to ``max_batch_size`` texts.
+
+    The queue belongs to the running event loop; a batcher used from a new
+    loop (e.g. successive ``asyncio.run`` calls in a worker) starts afresh.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Awaitable[np.ndarray]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_in_flight: int = 4,
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            embed: Backend call embedding a list of texts into an ``(n, dim)`` array
+            max_batch_size: Most texts per backend call
+            max_wait_ms: Longest a text waits for others to join its batch
+            max_in_flight: Most backend calls running concurrently
+        """
+        self._embed = embed
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_in_flight = max(1, max_in_flight)
+        self.batches = 0
+        self.texts = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight = 0
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed ``texts``, sharing backend calls with concurrent callers.
+
+        Returns:
+            ``(len(texts), dim)`` float32 array
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._pending, self._timer, self._in_flight = loop, [], None, 0
+
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append((text, future))
+            futures.append(future)
+        self._dispatch(flush=False)
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch, True)
+
+        rows = await asyncio.gather(*futures)
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(rows).astype(np.float32, copy=False)
+
+    def _dispatch(self, flush: bool) -> None:
+        """Send full batches, and with ``flush`` a partial one, while slots are free."""
+        if flush and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending and self._in_flight < self.max_in_flight:
+            if not flush and len(self._pending) < self.max_batch_size:
+                break
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+            self._in_flight += 1
+            self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            embeddings = await self._embed([text for text, _ in batch])
+            self.batches += 1
+            self.texts += len(batch)
+            for (_, future), row in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(row)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(batch)} texts failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            if asyncio.get_running_loop() is self._loop:
+                self._in_flight -= 1
+                # Whatever queued up meanwhile goes out now
+                self._dispatch(flush=True)
@@ -1,82 +1,279 @@
 """Embedding generation service using Gemini or fallback methods."""
 
+import asyncio
 import hashlib
 import logging
-from typing import List, Optional
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 
+from app.config import Settings, get_settings
+from services.embedding_batcher import EmbeddingBatcher
 from services.gemini_client import get_gemini_client
+from services.local_embeddings import HashedNgramEmbedder
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_DIM = 384
+
+# SQLite's default limit on host parameters per statement
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Entries are keyed by ``sha256(model, task_type, text)``, so identical
+    texts share one entry across documents, tenants and queries. A bounded
+    in-memory LRU sits in front of an optional SQLite file, which survives
+    restarts and can be shared by every process on the host.
+    """
+
+    def __init__(self, max_entries: int = 50000, path: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Embeddings kept in memory (0 disables the memory tier)
+            path: SQLite file for the persistent tier (disabled if omitted)
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    @staticmethod
+    def key(text: str, model: str, task_type: str) -> bytes:
+        """Cache key of one text."""
+        digest = hashlib.sha256(f"{model}\0{task_type}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings, memory first, then the persistent tier.
+
+        Returns:
+            One embedding per key, ``None`` for misses
+        """
+        found: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            pending: Dict[bytes, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+                    self.hits += 1
+                else:
+                    pending.setdefault(key, []).append(i)
+
+            if pending and self._db is not None:
+                wanted = list(pending)
+                for start in range(0, len(wanted), _SQL_BATCH):
+                    batch = wanted[start : start + _SQL_BATCH]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        self._remember(key, vector)
+                        for i in pending.pop(key):
+                            found[i] = vector
+                            self.disk_hits += 1
+
+            self.misses += sum(len(positions) for positions in pending.values())
+        return found
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        """Store one embedding (row of ``vectors``) per key in both tiers."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                # Copy so a cached row doesn't keep the caller's whole batch alive
+                self._remember(key, vector.copy())
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in zip(keys, vectors)],
+                )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry counts and hit/miss counters."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "persistent": self.path is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
 
 class EmbeddingService:
     """Service for generating embeddings."""
 
-    def __init__(self):
+    def __init__(self, settings: Settings | None = None):
         """Initialize embedding service."""
+        self.settings = settings or get_settings()
         self.gemini_client = get_gemini_client()
-
-    async def generate_embedding(self, text: str, model: str = "embedding-001") -> List[float]:
+        self.embedder = HashedNgramEmbedder(dim=EMBEDDING_DIM)
+        self.cache: Optional[EmbeddingCache] = None
+        if self.settings.embedding_cache_size > 0 or self.settings.embedding_cache_path:
+            self.cache = EmbeddingCache(self.settings.embedding_cache_size, self.settings.embedding_cache_path)
+        # One micro-batcher per (model, task_type): a backend call embeds one kind
+        self._batchers: Dict[Tuple[str, str], EmbeddingBatcher] = {}
+
+    async def generate_embedding(
+        self, text: str, model: Optional[str] = None, task_type: str = "retrieval_document"
+    ) -> List[float]:
         """
         Generate embedding for a text string.
 
         Args:
             text: Input text
-            model: Embedding model name
+            model: Embedding model name (defaults to the backend's, see ``generate_embeddings_array``)
+            task_type: ``"retrieval_document"`` for indexed text, ``"retrieval_query"`` for queries
 
         Returns:
             Embedding vector
         """
-        # TODO: Implement Gemini embedding API when available
-        # For now, use a simple hash-based embedding (not for production!)
-
-        # Mock embedding: hash-based deterministic vector
-        # This is a placeholder - replace with real Gemini embedding API
-        hash_obj = hashlib.md5(text.encode())
-        hash_bytes = hash_obj.digest()
-
-        # Convert hash to 384-dimensional vector (typical embedding size)
-        # This is a simplified mock - NOT a real embedding
-        embedding = []
-        for i in range(0, min(len(hash_bytes) * 2, 384), 2):
-            if i + 1 < len(hash_bytes) * 2:
-                val = (hash_bytes[i % len(hash_bytes)] << 8) + hash_bytes[(i + 1) % len(hash_bytes)]
-                embedding.append((val / 65535.0) - 0.5)  # Normalize to [-0.5, 0.5]
+        embeddings = await self.generate_embeddings_array([text], model, task_type)
+        logger.debug(f"Generated embedding for text: {text[:50]}...")
+        return embeddings[0].tolist()
+
+    async def generate_embeddings_array(
+        self,
+        texts: Sequence[str],
+        model: Optional[str] = None,
+        task_type: str = "retrieval_document",
+    ) -> np.ndarray:
+        """
+        Generate embeddings for multiple texts as one matrix.
 
-        # Pad to 384 dimensions
-        while len(embedding) < 384:
-            embedding.append(0.0)
+        Cached texts are served from the embedding cache; each distinct
+        uncached text is embedded once and then cached.
 
-        embedding = embedding[:384]
+        Args:
+            texts: Input texts
+            model: Embedding model name; defaults to the backend's. Until the
+                Gemini API is wired up only the local backend's is served
+            task_type: ``"retrieval_document"`` for indexed text, ``"retrieval_query"`` for queries
 
-        # Normalize
-        norm = np.linalg.norm(embedding)
-        if norm > 0:
-            embedding = (np.array(embedding) / norm).tolist()
+        Returns:
+            Contiguous float32 array of shape ``(len(texts), EMBEDDING_DIM)``
+            with unit-length rows
 
-        logger.debug(f"Generated mock embedding for text: {text[:50]}...")
+        Raises:
+            ValueError: If ``model`` names a model no backend serves
+        """
+        model = model or self.embedder.name
+        if model != self.embedder.name:
+            raise ValueError(f"Embedding model {model!r} is not available (only {self.embedder.name!r} is)")
+        if self.cache is None:
+            return await self._embed_batched(texts, model, task_type)
+
+        # The persistent tier reads and commits SQLite: keep it off the event loop
+        keys = [self.cache.key(text, model, task_type) for text in texts]
+        cached = await asyncio.to_thread(self.cache.get_many, keys)
+        missing: Dict[bytes, int] = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(keys[i], i)
+        computed = None
+        if missing:
+            computed = await self._embed_batched([texts[i] for i in missing.values()], model, task_type)
+            await asyncio.to_thread(self.cache.put_many, list(missing), computed)
+            logger.debug(f"Embedded {len(missing)} of {len(texts)} texts ({len(texts) - len(missing)} cached)")
+
+        if computed is not None:
+            dim = computed.shape[1]
+        else:
+            dim = len(cached[0]) if cached else EMBEDDING_DIM
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        positions = {key: j for j, key in enumerate(missing)}
+        for i, vector in enumerate(cached):
+            embeddings[i] = vector if vector is not None else computed[positions[keys[i]]]
+        return embeddings
 
-        # TODO: Replace with real Gemini embedding API:
+    async def _embed_batched(self, texts: Sequence[str], model: str, task_type: str) -> np.ndarray:
+        """Embed ``texts`` through the shared micro-batcher, coalescing with concurrent callers."""
+        if not texts:
+            return await self._embed(texts, model, task_type)
+        batcher = self._batchers.get((model, task_type))
+        if batcher is None:
+            batcher = self._batchers[(model, task_type)] = EmbeddingBatcher(
+                lambda batch: self._embed(batch, model, task_type),
+                max_batch_size=self.settings.embedding_batch_size,
+                max_wait_ms=self.settings.embedding_batch_wait_ms,
+                max_in_flight=self.settings.embedding_max_in_flight,
+            )
+        return await batcher.embed(texts)
+
+    def batch_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Backend calls and texts embedded per ``model/task_type``."""
+        return {
+            f"{model}/{task_type}": {
+                "batches": batcher.batches,
+                "texts": batcher.texts,
+                "mean_batch_size": round(batcher.texts / batcher.batches, 2) if batcher.batches else 0.0,
+            }
+            for (model, task_type), batcher in self._batchers.items()
+        }
+
+    async def _embed(self, texts: Sequence[str], model: str, task_type: str) -> np.ndarray:
+        """Embed ``texts`` with the backend (no caching)."""
+        # TODO: Use the Gemini embedding API when available (batched):
         # try:
         #     result = await self.gemini_client.models.embed_content(
         #         model=model,
-        #         content=text,
-        #         task_type="retrieval_document"  # or "retrieval_query"
+        #         contents=list(texts),
+        #         task_type=task_type,
         #     )
-        #     return result.embedding.values
+        #     return np.asarray([e.values for e in result.embeddings], dtype=np.float32)
         # except Exception as e:
-        #     logger.error(f"Error generating embedding: {e}")
+        #     logger.error(f"Error generating embeddings: {e}")
         #     raise
 
-        return embedding
+        # Local CPU backend; run off the event loop
+        return await asyncio.to_thread(self.embedder.embed, list(texts))
 
     async def generate_embeddings_batch(
-        self, texts: List[str], model: str = "embedding-001"
+        self, texts: List[str], model: Optional[str] = None
     ) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts.
+        Generate embeddings for multiple texts as lists.
+
+        Prefer ``generate_embeddings_array``, which avoids building a Python
+        float per element.
 
         Args:
             texts: List of input texts
@@ -85,11 +282,7 @@ class EmbeddingService:
         Returns:
             List of embedding vectors
         """
-        # Process in parallel (async)
-        import asyncio
-
-        embeddings = await asyncio.gather(*[self.generate_embedding(text, model) for text in texts])
-        return embeddings
+        return (await self.generate_embeddings_array(texts, model)).tolist()
 
     def cosine_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """
@@ -0,0 +1,13 @@
+"""Vectorized hashing helpers shared by the local embedder, the chunker and near-duplicate detection."""
+
+import numpy as np
+
+
+def mix64(h: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: spreads polynomial hashes over all 64 bits (in place)."""
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return h
@@ -0,0 +1,231 @@
+"""Hierarchical Navigable Small World (HNSW) approximate nearest-neighbour index."""
+
+import logging
+import os
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # The HNSW backend needs hnswlib; VectorStore falls back to the flat index
+    hnswlib = None
+
+from services.vector_index import VectorIndex, normalize_rows, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+HNSW_AVAILABLE = hnswlib is not None
+
+
+class HNSWIndex(VectorIndex):
+    """
+    Graph-based approximate cosine index (Malkov & Yashunin, 2016) backed by hnswlib.
+
+    The graph and its copy of the vectors live in hnswlib's native index,
+    labelled by row number; inserts are incremental and run on ``threads``
+    threads. Deletes and overwrites mark the old label deleted: it keeps
+    routing through the graph but is never returned. Filtered queries pass
+    the row mask to hnswlib, and very selective ones are scored exactly.
+
+    Calls into the native index (inserts, growth, queries) are serialized
+    by a lock: resizing is not safe while a query runs.
+    """
+
+    _reuse_rows = False
+    approximate = True
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        m: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        seed: Optional[int] = None,
+        initial_capacity: int = 1024,
+        threads: int = 0,
+    ):
+        """
+        Initialize an empty HNSW index.
+
+        Args:
+            dim: Vector dimension (inferred on first insert if omitted)
+            m: Links per node on upper layers (layer 0 keeps ``2 * m``)
+            ef_construction: Candidate list size while inserting
+            ef_search: Default candidate list size while querying
+            seed: Seed for level assignment
+            initial_capacity: Initial number of graph nodes
+            threads: Insert and batch-query threads (0 = one per core)
+
+        Raises:
+            ImportError: If hnswlib is not installed
+        """
+        if hnswlib is None:
+            raise ImportError("The HNSW index needs hnswlib (pip install hnswlib)")
+        super().__init__(dim=dim, initial_capacity=initial_capacity)
+        if m < 2:
+            raise ValueError("HNSW m must be at least 2")
+        self.m = m
+        self.m_max0 = 2 * m
+        self.ef_construction = max(ef_construction, m)
+        self.ef_search = ef_search
+        self.seed = 100 if seed is None else seed
+        self.threads = threads or os.cpu_count() or 1
+        self._graph = None
+        self._graph_lock = threading.Lock()
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the native index (vectors, layer-0 links, labels) and row bookkeeping."""
+        if self._graph is None:
+            return super().memory_bytes()
+        per_node = 4 * self.dim + 4 * (self.m_max0 + 1) + 8
+        return super().memory_bytes() + self._graph.get_max_elements() * per_node
+
+    def _resize(self, capacity: int) -> None:
+        super()._resize(capacity)
+        with self._graph_lock:
+            if self._graph is None:
+                self._graph = hnswlib.Index(space="ip", dim=self.dim)
+                self._graph.init_index(
+                    max_elements=capacity, ef_construction=self.ef_construction, M=self.m, random_seed=self.seed
+                )
+            elif capacity > self._graph.get_max_elements():
+                self._graph.resize_index(capacity)
+
+    def add(self, ids: Sequence[str], vectors) -> np.ndarray:
+        """
+        Insert vectors and link each one into the graph (overwrites replace the old node).
+
+        Args:
+            ids: Vector IDs, one per row of ``vectors``
+            vectors: Sequence of vectors or a 2-D array
+
+        Returns:
+            Row numbers assigned to ``ids``
+        """
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        matrix = self._check_vectors(ids, vectors)
+        replaced = [self._rows[vector_id] for vector_id in ids if vector_id in self._rows]
+        rows = self._assign_rows(ids)
+        # An id repeated within the batch keeps its last vector
+        last = {row: i for i, row in enumerate(rows.tolist()) if self._ids[row] is not None}
+        with self._graph_lock:
+            for row in replaced:
+                self._graph.mark_deleted(row)
+            self._graph.add_items(matrix[list(last.values())], list(last), num_threads=self.threads)
+        self._live[list(last)] = True
+        return rows
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Delete vectors by id; their graph nodes are marked deleted."""
+        rows = [self._rows[vector_id] for vector_id in ids if vector_id in self._rows]
+        removed = super().remove(ids)
+        with self._graph_lock:
+            for row in rows:
+                self._graph.mark_deleted(row)
+        return removed
+
+    def live_items(self) -> Tuple[List[str], np.ndarray]:
+        """Return the ids and normalized vectors of all live rows, in row order."""
+        rows = np.flatnonzero(self.live_mask())
+        return [self._ids[row] for row in rows], self._vectors_at(rows)
+
+    def _vectors_at(self, rows: np.ndarray) -> np.ndarray:
+        if not len(rows):
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        with self._graph_lock:
+            return np.asarray(self._graph.get_items(rows.tolist(), return_type="numpy"), dtype=np.float32)
+
+    def search(
+        self,
+        vector,
+        top_k: int = 5,
+        mask: Optional[np.ndarray] = None,
+        ef: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return approximately the ``top_k`` most similar vectors.
+
+        Args:
+            vector: Query vector (normalized internally)
+            top_k: Number of results to return
+            mask: Optional boolean array over rows; ``False`` rows are skipped
+            ef: Candidate list size (defaults to ``ef_search``)
+
+        Returns:
+            List of ``(id, score)`` pairs, best first
+        """
+        if self._graph is None or not len(self) or top_k <= 0:
+            return []
+
+        query = self._check_query(vector)
+        allowed = self._allowed_rows(mask)
+        ef = max(ef or self.ef_search, top_k)
+        permitted = len(self) if mask is None else int(allowed.sum())
+        if permitted == 0:
+            return []
+
+        # A very selective filter is cheaper to scan exactly than to route around
+        if mask is not None and permitted <= 4 * ef:
+            return self._exact_search(query, np.flatnonzero(allowed), top_k)
+
+        k = min(top_k, permitted)
+        try:
+            with self._graph_lock:
+                self._graph.set_ef(ef)
+                labels, distances = self._graph.knn_query(
+                    query, k=k, num_threads=1, filter=None if mask is None else lambda row: bool(allowed[row])
+                )
+        except RuntimeError:
+            # Fewer than k permitted rows reachable at this ef
+            return self._exact_search(query, np.flatnonzero(allowed), top_k)
+        return [(self._ids[row], 1.0 - float(distance)) for row, distance in zip(labels[0].tolist(), distances[0])]
+
+    def search_batch(
+        self,
+        vectors,
+        top_k: int = 5,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Run several queries; unfiltered ones go to hnswlib as one multi-threaded batch.
+
+        Args:
+            vectors: Query vectors, one per row (normalized internally)
+            top_k: Number of results per query
+            masks: Optional row mask per query (``None`` entries are unfiltered)
+
+        Returns:
+            One list of ``(id, score)`` pairs per query, best first
+        """
+        queries = normalize_rows(vectors)
+        masks = masks if masks is not None else [None] * len(queries)
+        results: List[List[Tuple[str, float]]] = [[] for _ in queries]
+        plain = [i for i, mask in enumerate(masks) if mask is None]
+        if len(plain) > 1 and self._graph is not None and len(self) and top_k > 0:
+            if queries.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional query, got {queries.shape[1]}")
+            try:
+                with self._graph_lock:
+                    self._graph.set_ef(max(self.ef_search, top_k))
+                    labels, distances = self._graph.knn_query(
+                        queries[plain], k=min(top_k, len(self)), num_threads=self.threads
+                    )
+            except RuntimeError:
+                labels = None
+            if labels is not None:
+                for i, row_labels, row_distances in zip(plain, labels.tolist(), distances):
+                    results[i] = [(self._ids[row], 1.0 - float(d)) for row, d in zip(row_labels, row_distances)]
+                plain = []
+        for i, mask in enumerate(masks):
+            if mask is not None or i in plain:
+                results[i] = self.search(queries[i], top_k, mask)
+        return results
+
+    def _exact_search(self, query: np.ndarray, rows: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        """Brute-force scoring restricted to ``rows``."""
+        scores = self._vectors_at(rows) @ query
+        best = top_k_indices(scores, top_k)
+        return [(self._ids[rows[i]], float(scores[i])) for i in best]
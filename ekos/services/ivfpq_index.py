@@ -0,0 +1,296 @@
+"""Inverted-file index with product quantization (IVF-PQ) for memory-bound tenants."""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.vector_index import VectorIndex, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+
+def kmeans(
+    data: np.ndarray,
+    k: int,
+    iterations: int = 20,
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """
+    Lloyd's k-means with squared Euclidean distance.
+
+    Args:
+        data: ``(n, d)`` float32 training vectors
+        k: Number of centroids (must not exceed ``n``)
+        iterations: Maximum number of refinement passes
+        rng: Random generator used to pick the initial centroids
+
+    Returns:
+        ``(k, d)`` float32 centroid matrix
+    """
+    rng = rng or np.random.default_rng()
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    assignment = None
+    for _ in range(iterations):
+        new_assignment = nearest_centroids(data, centroids)
+        if assignment is not None and np.array_equal(new_assignment, assignment):
+            break
+        assignment = new_assignment
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+        counts = np.bincount(assignment, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters from random points so every code stays usable
+        empty = np.flatnonzero(~filled)
+        if empty.size:
+            centroids[empty] = data[rng.choice(len(data), size=empty.size, replace=False)]
+    return centroids
+
+
+def nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the nearest centroid (L2) for every row of ``data``."""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    return np.argmax(data @ centroids.T - half_norms, axis=1)
+
+
+class IVFPQIndex(VectorIndex):
+    """
+    Approximate cosine index storing vectors as product-quantized codes.
+
+    Vectors are assigned to the nearest of ``nlist`` coarse centroids and the
+    residual is split into ``m`` sub-vectors, each encoded as one byte. A
+    ``384``-dim vector with ``m=48`` therefore costs 48 bytes instead of 1536.
+    Queries probe the ``nprobe`` nearest lists and score codes through a
+    per-query lookup table; with ``rerank`` the best ``rerank_candidates`` are
+    rescored against full-precision vectors kept alongside the codes.
+
+    Until ``train_size`` vectors have been added the index keeps raw vectors
+    and answers exactly; it then trains once and encodes everything.
+    """
+
+    _reuse_rows = False
+    approximate = True
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        nlist: int = 256,
+        m: int = 48,
+        nprobe: int = 16,
+        rerank: bool = False,
+        rerank_candidates: int = 256,
+        train_size: int = 10000,
+        seed: Optional[int] = None,
+        initial_capacity: int = 1024,
+    ):
+        """
+        Initialize an empty IVF-PQ index.
+
+        Args:
+            dim: Vector dimension (inferred on first insert; must be divisible by ``m``)
+            nlist: Number of inverted lists (coarse centroids)
+            m: Number of PQ sub-quantizers (bytes per vector)
+            nprobe: Number of lists scanned per query
+            rerank: Keep float32 vectors and rescore the shortlist exactly
+            rerank_candidates: Shortlist size rescored when ``rerank`` is on
+            train_size: Number of vectors to collect before training
+            seed: Seed for training
+            initial_capacity: Initial number of rows
+        """
+        super().__init__(dim=dim, initial_capacity=initial_capacity)
+        self.nlist = nlist
+        self.m = m
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.rerank_candidates = rerank_candidates
+        self.train_size = max(train_size, 1)
+        self._rng = np.random.default_rng(seed)
+
+        self._raw = np.empty((0, dim or 0), dtype=np.float32)
+        self._codes = np.empty((0, m), dtype=np.uint8)
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._centroids: Optional[np.ndarray] = None
+        self._codebooks: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._list_sizes = np.zeros(0, dtype=np.int64)
+
+    @property
+    def trained(self) -> bool:
+        """Whether the coarse and PQ codebooks have been trained."""
+        return self._centroids is not None
+
+    @property
+    def _keeps_raw(self) -> bool:
+        return self.rerank or not self.trained
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by codes, lists, codebooks and (optional) raw vectors."""
+        total = super().memory_bytes()
+        total += self._raw.nbytes + self._codes.nbytes + self._assignments.nbytes
+        total += sum(lst.nbytes for lst in self._lists)
+        if self.trained:
+            total += self._centroids.nbytes + self._codebooks.nbytes
+        return int(total)
+
+    def _resize(self, capacity: int) -> None:
+        old = self._codes.shape[0]
+        codes = np.zeros((capacity, self.m), dtype=np.uint8)
+        codes[:old] = self._codes
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[:old] = self._assignments
+        self._codes, self._assignments = codes, assignments
+        if self._keeps_raw:
+            raw = np.empty((capacity, self.dim), dtype=np.float32)
+            if self._raw.shape[0]:
+                raw[: self._raw.shape[0]] = self._raw
+            self._raw = raw
+        super()._resize(capacity)
+
+    def add(self, ids: Sequence[str], vectors) -> np.ndarray:
+        """
+        Insert vectors (overwrites tombstone the previous version).
+
+        Args:
+            ids: Vector IDs, one per row of ``vectors``
+            vectors: Sequence of vectors or a 2-D array
+
+        Returns:
+            Row numbers assigned to ``ids``
+        """
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        matrix = self._check_vectors(ids, vectors)
+        if self.dim % self.m:
+            raise ValueError(f"Vector dimension {self.dim} is not divisible by PQ m={self.m}")
+
+        rows = self._assign_rows(ids)
+        if self._keeps_raw:
+            self._raw[rows] = matrix
+        if self.trained:
+            self._encode(rows, matrix)
+        self._live[rows] = True
+
+        if not self.trained and len(self) >= self.train_size:
+            self.train()
+        return rows
+
+    def train(self) -> None:
+        """Train coarse centroids and PQ codebooks on the stored vectors and encode them."""
+        rows = np.flatnonzero(self._live[: self.row_count])
+        data = self._raw[rows]
+        if len(data) == 0:
+            return
+
+        sample = data
+        max_sample = max(self.train_size, 64 * self.nlist)
+        if len(sample) > max_sample:
+            sample = sample[self._rng.choice(len(sample), size=max_sample, replace=False)]
+
+        nlist = min(self.nlist, len(sample))
+        centroids = kmeans(sample, nlist, rng=self._rng)
+        residuals = sample - centroids[nearest_centroids(sample, centroids)]
+
+        dsub = self.dim // self.m
+        ksub = min(256, len(sample))
+        codebooks = np.stack(
+            [
+                kmeans(np.ascontiguousarray(residuals[:, j * dsub : (j + 1) * dsub]), ksub, rng=self._rng)
+                for j in range(self.m)
+            ]
+        )
+
+        self._centroids, self._codebooks = centroids, codebooks
+        self._lists = [np.empty(0, dtype=np.int32) for _ in range(nlist)]
+        self._list_sizes = np.zeros(nlist, dtype=np.int64)
+        self._encode(rows, data)
+        if not self.rerank:
+            self._raw = np.empty((0, self.dim), dtype=np.float32)
+        logger.info(f"Trained IVF-PQ index: {len(rows)} vectors, nlist={nlist}, m={self.m}")
+
+    def _encode(self, rows: np.ndarray, matrix: np.ndarray) -> None:
+        """Assign ``rows`` to inverted lists and store their PQ codes."""
+        assignments = nearest_centroids(matrix, self._centroids)
+        residuals = matrix - self._centroids[assignments]
+
+        dsub = self.dim // self.m
+        for j in range(self.m):
+            self._codes[rows, j] = nearest_centroids(
+                residuals[:, j * dsub : (j + 1) * dsub], self._codebooks[j]
+            )
+        self._assignments[rows] = assignments
+
+        order = np.argsort(assignments, kind="stable")
+        lists, starts = np.unique(assignments[order], return_index=True)
+        for list_id, chunk in zip(lists.tolist(), np.split(rows[order], starts[1:])):
+            self._append_to_list(list_id, chunk)
+
+    def _append_to_list(self, list_id: int, rows: np.ndarray) -> None:
+        size = self._list_sizes[list_id]
+        needed = size + len(rows)
+        current = self._lists[list_id]
+        if needed > current.shape[0]:
+            grown = np.empty(max(needed, 2 * current.shape[0], 16), dtype=np.int32)
+            grown[:size] = current[:size]
+            self._lists[list_id] = current = grown
+        current[size:needed] = rows
+        self._list_sizes[list_id] = needed
+
+    def search(
+        self,
+        vector,
+        top_k: int = 5,
+        mask: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return approximately the ``top_k`` most similar vectors.
+
+        Args:
+            vector: Query vector (normalized internally)
+            top_k: Number of results to return
+            mask: Optional boolean array over rows; ``False`` rows are skipped
+            nprobe: Number of inverted lists to scan (defaults to ``self.nprobe``)
+
+        Returns:
+            List of ``(id, score)`` pairs, best first
+        """
+        if self.row_count == 0 or top_k <= 0:
+            return []
+
+        query = self._check_query(vector)
+        allowed = self._allowed_rows(mask)
+
+        if not self.trained:
+            rows = np.flatnonzero(allowed)
+            return self._rank(rows, self._raw[rows] @ query, top_k)
+
+        shortlist = max(top_k, self.rerank_candidates if self.rerank else top_k)
+        coarse = self._centroids @ query
+
+        if mask is not None and int(allowed.sum()) <= 4 * shortlist:
+            # Selective filter: score every permitted row instead of probing lists
+            rows = np.flatnonzero(allowed)
+        else:
+            probe = top_k_indices(coarse, nprobe or self.nprobe)
+            rows = np.concatenate(
+                [self._lists[i][: self._list_sizes[i]] for i in probe.tolist()]
+            ).astype(np.int64)
+            rows = rows[allowed[rows]]
+        if rows.size == 0:
+            return []
+
+        dsub = self.dim // self.m
+        table = np.einsum("jkd,jd->jk", self._codebooks, query.reshape(self.m, dsub))
+        scores = coarse[self._assignments[rows]] + table[np.arange(self.m), self._codes[rows]].sum(axis=1)
+
+        if not self.rerank:
+            return self._rank(rows, scores, top_k)
+
+        best = top_k_indices(scores, shortlist)
+        rows = rows[best]
+        return self._rank(rows, self._raw[rows] @ query, top_k)
+
+    def _rank(self, rows: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        return [(self._ids[rows[i]], float(scores[i])) for i in top_k_indices(scores, top_k)]
@@ -0,0 +1,511 @@
+"""BM25 lexical index with compressed, impact-ordered posting lists."""
+
+import bisect
+import json
+import logging
+import math
+import re
+import struct
+from collections import Counter
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.vector_index import VectorIndex, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Words plus compound tokens such as ticket keys (ABC-123), error codes
+# (0x80070005, E_FAIL) and dotted names; compounds also index their parts
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase ``text`` and split it into BM25 terms."""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART.findall(token))
+    return tokens
+
+
+def _append_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data: bytes) -> np.ndarray:
+    """Decode a run of LEB128 varints into an int64 array (vectorized)."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return np.empty(0, dtype=np.int64)
+    ends = raw < 0x80
+    value_of = np.concatenate(([0], np.cumsum(ends)[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    shift = 7 * (np.arange(raw.size) - starts[value_of])
+    parts = (raw & 0x7F).astype(np.float64) * np.exp2(shift)
+    return np.bincount(value_of, weights=parts).astype(np.int64)
+
+
+def bm25_idf(rows: int, df: int) -> float:
+    """BM25 inverse document frequency; ``df`` may count tombstoned rows, so it is kept non-negative."""
+    return math.log(1 + (max(rows, df) - df + 0.5) / (df + 0.5))
+
+
+def _group_rows(data) -> np.ndarray:
+    """Row numbers of one delta + varint encoded impact group."""
+    return np.cumsum(decode_varints(data)) - 1
+
+
+class _Group:
+    """Rows sharing one quantized impact, delta + varint encoded in row order."""
+
+    __slots__ = ("data", "last", "count")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.last = -1
+        self.count = 0
+
+    def append(self, row: int) -> None:
+        _append_varint(self.data, row - self.last)
+        self.last = row
+        self.count += 1
+
+    def rows(self) -> np.ndarray:
+        return _group_rows(bytes(self.data))
+
+
+class _Term:
+    __slots__ = ("df", "groups")
+
+    def __init__(self):
+        self.df = 0
+        self.groups: Dict[int, _Group] = {}
+
+
+# (impact level, rows of the group) for one term's postings
+_Groups = List[Tuple[int, Callable[[], np.ndarray]]]
+
+
+class _ImpactScorer:
+    """
+    Score-at-a-time BM25 evaluation over impact-grouped postings.
+
+    Shared by the in-memory ``LexicalIndex`` and the segment-mapped
+    ``MappedLexicalIndex``; subclasses provide ``_term_groups``.
+    """
+
+    k1: float
+    impact_levels: int
+
+    @property
+    def row_count(self) -> int:
+        raise NotImplementedError
+
+    def _term_groups(self, token: str) -> Optional[Tuple[int, _Groups]]:
+        """``(df, groups)`` of ``token``, or ``None`` if it isn't indexed."""
+        raise NotImplementedError
+
+    def document_frequencies(self, tokens: Sequence[str]) -> Dict[str, int]:
+        """Document frequency of each indexed token (tombstoned rows included)."""
+        frequencies = {}
+        for token in tokens:
+            term = self._term_groups(token)
+            if term is not None:
+                frequencies[token] = term[0]
+        return frequencies
+
+    def top_rows(
+        self,
+        tokens: Sequence[str],
+        idf: Dict[str, float],
+        top_k: int,
+        allowed: np.ndarray,
+        early_termination: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the ``top_k`` best rows for the query ``tokens`` and their BM25 scores.
+
+        Groups from all query terms are visited in decreasing ``idf * impact``
+        order and evaluation stops as soon as the remaining groups can no
+        longer change which rows are in the top ``k``.
+
+        Args:
+            tokens: Distinct query tokens
+            idf: Inverse document frequency per token (tokens without one are skipped),
+                so several indexes can be scored against shared collection statistics
+            top_k: Number of rows to return
+            allowed: Boolean mask over rows; ``False`` rows are skipped
+            early_termination: Stop once the top-k set can no longer change
+
+        Returns:
+            ``(rows, scores)``, best first
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        # (score bound of the group, term position, rows of the group)
+        work: List[Tuple[float, int, Callable[[], np.ndarray]]] = []
+        unit = (self.k1 + 1) / self.impact_levels
+        position = 0
+        for token in tokens:
+            term = self._term_groups(token) if token in idf else None
+            if term is None:
+                continue
+            for level, rows in term[1]:
+                work.append((idf[token] * level * unit, position, rows))
+            position += 1
+        if not work or top_k <= 0:
+            return empty
+        work.sort(key=lambda item: item[0], reverse=True)
+
+        # Unvisited group scores per term, best first; the sum of their heads
+        # bounds what any row can still gain
+        pending: List[List[float]] = [[] for _ in range(position)]
+        for score, term_position, _ in reversed(work):
+            pending[term_position].append(score)
+
+        scores = np.zeros(self.row_count, dtype=np.float32)
+        touched = np.zeros(self.row_count, dtype=bool)
+        for visited, (score, term_position, group_rows) in enumerate(work, start=1):
+            rows = group_rows()
+            rows = rows[allowed[rows]]
+            scores[rows] += score
+            touched[rows] = True
+
+            pending[term_position].pop()
+            bound = sum(p[-1] for p in pending if p)
+            if early_termination and visited < len(work) and self._top_k_settled(scores, touched, top_k, bound):
+                logger.debug(f"BM25 early termination after {visited}/{len(work)} posting groups")
+                # The top-k set is fixed; finish the scores of its rows only
+                candidates = np.flatnonzero(touched)
+                winners = np.zeros(self.row_count, dtype=bool)
+                winners[candidates[top_k_indices(scores[candidates], top_k)]] = True
+                for score, _, group_rows in work[visited:]:
+                    rows = group_rows()
+                    scores[rows[winners[rows]]] += score
+                touched = winners
+                break
+
+        candidates = np.flatnonzero(touched)
+        best = candidates[top_k_indices(scores[candidates], top_k)]
+        return best, scores[best]
+
+    @staticmethod
+    def _top_k_settled(scores: np.ndarray, touched: np.ndarray, top_k: int, bound: float) -> bool:
+        """Whether no row can enter or leave the top ``k`` by gaining at most ``bound``."""
+        if bound == 0.0:
+            return True
+        candidates = scores[touched]
+        if candidates.size <= top_k:
+            return False
+        partitioned = np.partition(-candidates, (top_k - 1, top_k))
+        kth, next_best = -partitioned[top_k - 1], -partitioned[top_k]
+        # Unseen rows reach at most ``bound``; touched rows outside gain at most ``bound``
+        return kth >= next_best + bound
+
+
+class LexicalIndex(VectorIndex, _ImpactScorer):
+    """
+    Okapi BM25 over short texts (chunks), using the shared row bookkeeping.
+
+    Each posting stores only the BM25 term-frequency component quantized to
+    one of ``impact_levels`` values; postings of a term are grouped by that
+    impact and each group is a delta + varint byte string. Queries are
+    evaluated score-at-a-time: groups from all query terms are visited in
+    decreasing ``idf * impact`` order and evaluation stops as soon as the
+    remaining groups can no longer change which rows are in the top ``k``.
+
+    Impacts are fixed when a row is added, using the average length at that
+    time; ``idf`` is applied at query time. Overwrites and deletes tombstone
+    the old row.
+    """
+
+    _reuse_rows = False
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        impact_levels: int = 16,
+        initial_capacity: int = 1024,
+    ):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+            impact_levels: Number of quantized impact values per term
+            initial_capacity: Initial number of rows
+        """
+        super().__init__(initial_capacity=initial_capacity)
+        self.k1 = k1
+        self.b = b
+        self.impact_levels = max(1, impact_levels)
+        self._terms: Dict[str, _Term] = {}
+        self._lengths = np.zeros(0, dtype=np.uint32)
+        self._total_length = 0
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by compressed postings and row arrays."""
+        postings = sum(len(g.data) for term in self._terms.values() for g in term.groups.values())
+        return int(super().memory_bytes() + self._lengths.nbytes + postings)
+
+    def _resize(self, capacity: int) -> None:
+        lengths = np.zeros(capacity, dtype=np.uint32)
+        lengths[: self._lengths.shape[0]] = self._lengths
+        self._lengths = lengths
+        super()._resize(capacity)
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """Delete texts by id."""
+        for vector_id in ids:
+            row = self._rows.get(vector_id)
+            if row is not None:
+                self._total_length -= int(self._lengths[row])
+        return super().remove(ids)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> np.ndarray:
+        """
+        Index texts (overwrites tombstone the previous version).
+
+        Args:
+            ids: Text IDs
+            texts: One text per id
+
+        Returns:
+            Row numbers assigned to ``ids``
+        """
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        for vector_id in ids:
+            row = self._rows.get(vector_id)
+            if row is not None:
+                self._total_length -= int(self._lengths[row])
+
+        rows = self._assign_rows(ids)
+        counts = [Counter(tokenize(text or "")) for text in texts]
+        for row, tf in zip(rows.tolist(), counts):
+            length = sum(tf.values())
+            self._lengths[row] = length
+            self._total_length += length
+            self._live[row] = True
+        average = self._total_length / max(len(self), 1) or 1.0
+
+        scale = self.impact_levels / (self.k1 + 1)
+        for row, tf in zip(rows.tolist(), counts):
+            norm = self.k1 * (1 - self.b + self.b * int(self._lengths[row]) / average)
+            for token, count in tf.items():
+                weight = count * (self.k1 + 1) / (count + norm)
+                level = min(self.impact_levels, max(1, math.ceil(weight * scale)))
+                term = self._terms.get(token)
+                if term is None:
+                    term = self._terms[token] = _Term()
+                term.df += 1
+                group = term.groups.get(level)
+                if group is None:
+                    group = term.groups[level] = _Group()
+                group.append(row)
+        return rows
+
+    def _term_groups(self, token: str) -> Optional[Tuple[int, _Groups]]:
+        term = self._terms.get(token)
+        if term is None:
+            return None
+        return term.df, [(level, group.rows) for level, group in term.groups.items()]
+
+    def search(
+        self,
+        text: str,
+        top_k: int = 5,
+        mask: Optional[np.ndarray] = None,
+        early_termination: bool = True,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the ``top_k`` best BM25 matches for ``text``.
+
+        Args:
+            text: Query text
+            top_k: Number of results to return
+            mask: Optional boolean array over rows; ``False`` rows are skipped
+            early_termination: Stop once the top-k set can no longer change
+
+        Returns:
+            List of ``(id, score)`` pairs, best first
+        """
+        if not len(self) or top_k <= 0:
+            return []
+        tokens = list(dict.fromkeys(tokenize(text)))
+        idf = {token: bm25_idf(len(self), df) for token, df in self.document_frequencies(tokens).items()}
+        rows, scores = self.top_rows(tokens, idf, top_k, self._allowed_rows(mask), early_termination)
+        return [(self._ids[row], float(score)) for row, score in zip(rows.tolist(), scores.tolist())]
+
+    def to_block(self, field: str) -> bytes:
+        """
+        Serialize the postings for ``MappedLexicalIndex``.
+
+        Rows are written as they are numbered here, so the index must have
+        been filled with one row per segment row, in order.
+
+        Args:
+            field: Metadata field the texts came from
+
+        Returns:
+            ``uint64`` header length, JSON header padded to 8 bytes, then
+            8-byte aligned sections: the sorted term table (``uint64``
+            offsets + UTF-8 bytes), ``uint32`` df per term, ``uint32`` first
+            group per term (terms + 1), ``uint8`` impact level per group,
+            ``uint64`` data offset per group (groups + 1) and the group bytes
+        """
+        terms = sorted((token.encode("utf-8"), term) for token, term in self._terms.items())
+        groups = [(level, term.groups[level]) for _, term in terms for level in sorted(term.groups, reverse=True)]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum([len(name) for name, _ in terms], out=term_offsets[1:])
+        group_starts = np.zeros(len(terms) + 1, dtype=np.uint32)
+        np.cumsum([len(term.groups) for _, term in terms], out=group_starts[1:])
+        data_offsets = np.zeros(len(groups) + 1, dtype=np.uint64)
+        np.cumsum([len(group.data) for _, group in groups], out=data_offsets[1:])
+        sections = [
+            ("term_offsets", term_offsets.tobytes()),
+            ("term_bytes", b"".join(name for name, _ in terms)),
+            ("df", np.array([term.df for _, term in terms], dtype=np.uint32).tobytes()),
+            ("group_starts", group_starts.tobytes()),
+            ("levels", np.array([level for level, _ in groups], dtype=np.uint8).tobytes()),
+            ("data_offsets", data_offsets.tobytes()),
+            ("data", b"".join(bytes(group.data) for _, group in groups)),
+        ]
+        offsets, position = {}, 0
+        for name, data in sections:
+            offsets[name] = position
+            position += len(data) + (-len(data) % 8)
+        header = json.dumps(
+            {
+                "field": field,
+                "k1": self.k1,
+                "b": self.b,
+                "impact_levels": self.impact_levels,
+                "rows": self.row_count,
+                "terms": len(terms),
+                "groups": len(groups),
+                "sections": offsets,
+            },
+            separators=(",", ":"),
+        ).encode("utf-8")
+        header += b" " * (-len(header) % 8)
+        padded = [data + b"\0" * (-len(data) % 8) for _, data in sections]
+        return struct.pack("<Q", len(header)) + header + b"".join(padded)
+
+
+class _TermTable:
+    """Sorted UTF-8 terms inside a mapped block, indexable for ``bisect``."""
+
+    def __init__(self, buffer, offsets: np.ndarray, base: int):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._base = base
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._buffer[self._base + int(self._offsets[i]) : self._base + int(self._offsets[i + 1])]
+
+
+class MappedLexicalIndex(_ImpactScorer):
+    """
+    Read-only BM25 postings serialized by ``LexicalIndex.to_block``.
+
+    Every array is a zero-copy view of ``buffer`` (normally a segment's
+    memory mapping), so opening costs one small JSON header whatever the
+    number of rows; terms are found by binary search and only the groups a
+    query touches are decoded. Rows are the segment's rows; the caller
+    passes the live (and filter) mask.
+    """
+
+    def __init__(self, buffer, offset: int = 0):
+        """
+        Attach to the block at ``offset`` of ``buffer``.
+
+        Args:
+            buffer: Bytes-like object (e.g. an ``mmap``)
+            offset: Start of the block
+        """
+        (length,) = struct.unpack_from("<Q", buffer, offset)
+        header = json.loads(bytes(buffer[offset + 8 : offset + 8 + length]))
+        base = offset + 8 + length
+        sections = {name: base + start for name, start in header["sections"].items()}
+        terms, groups = header["terms"], header["groups"]
+        self.field: str = header["field"]
+        self.k1: float = header["k1"]
+        self.b: float = header["b"]
+        self.impact_levels: int = header["impact_levels"]
+        self._rows: int = header["rows"]
+        self._terms = _TermTable(
+            buffer, np.frombuffer(buffer, dtype=np.uint64, count=terms + 1, offset=sections["term_offsets"]),
+            sections["term_bytes"],
+        )
+        self._df = np.frombuffer(buffer, dtype=np.uint32, count=terms, offset=sections["df"])
+        self._group_starts = np.frombuffer(buffer, dtype=np.uint32, count=terms + 1, offset=sections["group_starts"])
+        self._levels = np.frombuffer(buffer, dtype=np.uint8, count=groups, offset=sections["levels"])
+        self._data_offsets = np.frombuffer(buffer, dtype=np.uint64, count=groups + 1, offset=sections["data_offsets"])
+        self._data = np.frombuffer(buffer, dtype=np.uint8, count=int(self._data_offsets[-1]), offset=sections["data"])
+
+    @property
+    def row_count(self) -> int:
+        return self._rows
+
+    def _term_groups(self, token: str) -> Optional[Tuple[int, _Groups]]:
+        name = token.encode("utf-8")
+        i = bisect.bisect_left(self._terms, name)
+        if i == len(self._terms) or self._terms[i] != name:
+            return None
+        groups = range(int(self._group_starts[i]), int(self._group_starts[i + 1]))
+        return int(self._df[i]), [
+            (
+                int(self._levels[g]),
+                partial(_group_rows, self._data[int(self._data_offsets[g]) : int(self._data_offsets[g + 1])]),
+            )
+            for g in groups
+        ]
+
+
+def lexical_block(texts: Sequence[str], field: str) -> bytes:
+    """Build the ``MappedLexicalIndex`` block for a segment whose rows hold ``texts``."""
+    index = LexicalIndex(initial_capacity=max(1, len(texts)))
+    index.add([str(row) for row in range(len(texts))], texts)
+    return index.to_block(field)
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Sequence[Dict[str, Any]]],
+    top_k: int,
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fuse ranked result lists with (weighted) reciprocal-rank fusion.
+
+    Args:
+        result_lists: Ranked ``{"id", "score", "metadata"}`` lists
+        top_k: Number of fused results to return
+        k: RRF rank constant
+        weights: Optional weight per list (defaults to 1.0 each)
+
+    Returns:
+        Fused results; ``score`` is the RRF score
+    """
+    weights = weights or [1.0] * len(result_lists)
+    fused: Dict[str, Dict[str, Any]] = {}
+    for weight, results in zip(weights, result_lists):
+        for rank, result in enumerate(results):
+            entry = fused.setdefault(result["id"], {**result, "score": 0.0})
+            entry["score"] += weight / (k + rank + 1)
+            if not entry.get("metadata"):
+                entry["metadata"] = result.get("metadata", {})
+    return sorted(fused.values(), key=lambda r: r["score"], reverse=True)[:top_k]
@@ -0,0 +1,84 @@
+"""CPU-only text embeddings from hashed character n-grams (no model files, no network)."""
+
+import logging
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from services.hashing import mix64
+
+logger = logging.getLogger(__name__)
+
+# Byte separating texts in the joined batch buffer; stripped from the texts themselves
+_SEPARATOR = 0
+_PRIME = np.uint64(0x100000001B3)
+
+
+class HashedNgramEmbedder:
+    """
+    Feature-hashing embedder over character n-grams.
+
+    Each text is lowercased, padded with spaces and read as UTF-8 bytes; every
+    byte n-gram (``ngram_sizes``) is hashed to one of ``dim`` buckets with a
+    random sign. Bucket counts are damped with ``log1p`` and rows are
+    L2-normalized, so the dot product approximates the cosine similarity of
+    the texts' n-gram profiles: shared words, stems, identifiers and typos
+    all count.
+
+    A whole batch is joined into one byte buffer and hashed with array
+    operations; there is no per-text or per-n-gram Python loop.
+    """
+
+    name = "local-ngram-v1"
+
+    def __init__(self, dim: int = 384, ngram_sizes: Tuple[int, ...] = (3, 5)):
+        """
+        Initialize the embedder.
+
+        Args:
+            dim: Output dimension (number of hash buckets)
+            ngram_sizes: Byte n-gram lengths to hash
+        """
+        self.dim = dim
+        self.ngram_sizes = tuple(sorted(ngram_sizes))
+        # Longer n-grams are rarer and more specific: weight them up
+        self._weights = {n: 1.0 + 0.25 * (n - self.ngram_sizes[0]) for n in self.ngram_sizes}
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed ``texts``.
+
+        Returns:
+            ``(len(texts), dim)`` float32 array with unit-length rows (zero rows for empty texts)
+        """
+        n_texts = len(texts)
+        counts = np.zeros(n_texts * self.dim, dtype=np.float64)
+        if n_texts == 0:
+            return counts.reshape(0, self.dim).astype(np.float32)
+
+        joined = "\x00".join(" " + text.replace("\x00", " ").lower() + " " for text in texts)
+        data = np.frombuffer(joined.encode("utf-8", "surrogatepass"), dtype=np.uint8)
+        # Text index of every byte (separators belong to the following text)
+        text_of = np.cumsum(data == _SEPARATOR)
+        codes = data.astype(np.uint64)
+
+        for n in self.ngram_sizes:
+            windows = len(data) - n + 1
+            if windows <= 0:
+                continue
+            h = np.zeros(windows, dtype=np.uint64)
+            for k in range(n):
+                h *= _PRIME
+                h += codes[k : k + windows]
+            # Drop n-grams that span a separator
+            valid = (text_of[n - 1 :] == text_of[:windows]) & (data[:windows] != _SEPARATOR)
+            h = mix64(h[valid])
+            buckets = (h % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where(h >> np.uint64(63), -self._weights[n], self._weights[n])
+            counts += np.bincount(text_of[:windows][valid] * self.dim + buckets, signs, minlength=len(counts))
+
+        embeddings = counts.reshape(n_texts, self.dim)
+        embeddings = np.sign(embeddings) * np.log1p(np.abs(embeddings))
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(embeddings / norms, dtype=np.float32)
@@ -0,0 +1,200 @@
+"""Inverted posting-list index over the metadata fields used in vector filters."""
+
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def posting_key(value: Any) -> Optional[str]:
+    """
+    Canonical posting key for a scalar metadata value (``None`` if not indexable).
+
+    Values that compare equal in ``matches_filter`` share a key: ``True``,
+    ``1`` and ``1.0`` all map to ``1``. NaN never equals itself, so it is
+    left to the residual filter.
+    """
+    if isinstance(value, bool):
+        value = int(value)
+    elif isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            value = int(value)
+    if value is None or isinstance(value, (str, int, float)):
+        return json.dumps(value)
+    return None
+
+
+def _canonical_postings(values: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Re-key postings persisted before keys were canonical (``true``, ``1.0``), merging what now collides."""
+    canonical: Dict[str, np.ndarray] = {}
+    for key, rows in values.items():
+        if not key.startswith('"') and key != "null":
+            key = posting_key(json.loads(key)) or key
+        canonical[key] = np.union1d(canonical[key], rows).astype(np.int32) if key in canonical else rows
+    return canonical
+
+
+def _field_keys(metadata: Dict[str, Any], fields: Iterable[str]) -> Set[Tuple[str, str]]:
+    """Return the ``(field, key)`` postings a metadata dict belongs to; lists index each element."""
+    keys = set()
+    for field in fields:
+        if field not in metadata:
+            continue
+        value = metadata[field]
+        for item in value if isinstance(value, (list, tuple)) else (value,):
+            key = posting_key(item)
+            if key is not None:
+                keys.add((field, key))
+    return keys
+
+
+class _Posting:
+    """Growable int32 array of row numbers."""
+
+    __slots__ = ("rows", "size")
+
+    def __init__(self, rows: Optional[np.ndarray] = None):
+        self.rows = rows if rows is not None else np.empty(0, dtype=np.int32)
+        self.size = len(self.rows)
+
+    def view(self) -> np.ndarray:
+        return self.rows[: self.size]
+
+    def extend(self, rows: np.ndarray) -> None:
+        needed = self.size + len(rows)
+        if needed > len(self.rows) or not self.rows.flags.writeable:
+            grown = np.empty(max(needed, 2 * len(self.rows), 8), dtype=np.int32)
+            grown[: self.size] = self.view()
+            self.rows = grown
+        self.rows[self.size : needed] = rows
+        self.size = needed
+
+    def discard(self, row: int) -> None:
+        kept = self.view()
+        kept = kept[kept != row]
+        self.rows, self.size = kept.copy(), len(kept)
+
+
+class MetadataIndex:
+    """
+    Posting lists mapping ``(field, value)`` to row numbers.
+
+    Only the configured ``fields`` are indexed. ``resolve`` turns the
+    equality, ``$eq`` and ``$in`` clauses of a filter into a boolean row mask
+    before any similarity math; any other clause is handed back as a residual
+    filter to check on the surviving rows only.
+    """
+
+    def __init__(
+        self,
+        fields: Iterable[str],
+        postings: Optional[Dict[str, Dict[str, np.ndarray]]] = None,
+    ):
+        """
+        Initialize the index.
+
+        Args:
+            fields: Metadata fields to index
+            postings: Pre-built ``{field: {key: rows}}`` arrays (e.g. mapped from a segment)
+        """
+        self.fields = frozenset(fields)
+        self._postings: Dict[str, Dict[str, _Posting]] = {field: {} for field in self.fields}
+        for field, values in (postings or {}).items():
+            self._postings[field] = {key: _Posting(rows) for key, rows in _canonical_postings(values).items()}
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by posting arrays."""
+        return int(sum(p.rows.nbytes for values in self._postings.values() for p in values.values()))
+
+    def add(
+        self,
+        rows: Sequence[int],
+        metadata: Sequence[Dict[str, Any]],
+        previous: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """
+        Index ``metadata`` for ``rows``.
+
+        Args:
+            rows: Row numbers
+            metadata: Metadata dict per row
+            previous: Metadata previously stored in the same row, for rows
+                overwritten in place (``None`` entries for fresh rows)
+        """
+        batch: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        for i, row in enumerate(rows):
+            keys = _field_keys(metadata[i], self.fields)
+            old = previous[i] if previous is not None else None
+            if old:
+                old_keys = _field_keys(old, self.fields)
+                for field, key in old_keys - keys:
+                    posting = self._postings[field].get(key)
+                    if posting is not None:
+                        posting.discard(row)
+                keys -= old_keys
+            for field_key in keys:
+                batch[field_key].append(int(row))
+
+        for (field, key), field_rows in batch.items():
+            posting = self._postings[field].setdefault(key, _Posting())
+            posting.extend(np.asarray(field_rows, dtype=np.int32))
+
+    def export(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """Return ``{field: {key: rows}}`` arrays for persisting."""
+        return {
+            field: {key: posting.view() for key, posting in values.items()}
+            for field, values in self._postings.items()
+        }
+
+    def _lookup(self, field: str, value: Any) -> Optional[np.ndarray]:
+        """Rows matching one filter clause, or ``None`` if the clause can't be answered here."""
+        if field not in self.fields:
+            return None
+        if isinstance(value, dict):
+            if set(value) == {"$in"} and isinstance(value["$in"], (list, tuple, set)):
+                values = list(value["$in"])
+            elif set(value) == {"$eq"}:
+                values = [value["$eq"]]
+            else:
+                return None
+        else:
+            values = [value]
+
+        keys = [posting_key(v) for v in values]
+        if any(key is None for key in keys):
+            return None
+        postings = self._postings[field]
+        arrays = [postings[key].view() for key in keys if key in postings]
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+    def resolve(self, filter: Dict[str, Any], row_count: int) -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+        """
+        Resolve the indexed clauses of ``filter`` to a row mask.
+
+        Args:
+            filter: Metadata filter
+            row_count: Length of the returned mask
+
+        Returns:
+            ``(mask, residual)``; ``mask`` is ``None`` when no clause was
+            indexed, and ``residual`` holds the clauses still to be checked
+        """
+        mask: Optional[np.ndarray] = None
+        residual: Dict[str, Any] = {}
+        for field, value in filter.items():
+            rows = self._lookup(field, value)
+            if rows is None:
+                residual[field] = value
+                continue
+            clause = np.zeros(row_count, dtype=bool)
+            clause[rows] = True
+            mask = clause if mask is None else mask & clause
+        return mask, residual
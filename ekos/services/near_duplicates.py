@@ -0,0 +1,487 @@
+"""Near-duplicate chunk detection with MinHash-LSH, per tenant."""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.hashing import mix64
+from services.vector_collection import matches_filter
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+_BIN_BITS = 6  # log2(NUM_PERM)
+BANDS = 16  # 4 rows per band: pairs with Jaccard >= 0.5 are candidates with probability >= 0.64
+SHINGLE_BYTES = 5
+
+_PRIME = np.uint64(0x100000001B3)
+_EMPTY = np.iinfo(np.uint32).max
+# Added per bin skipped when an empty bin borrows a neighbour's value
+_ROTATION = np.uint32(0x9E3779B1)
+# SQLite's default limit on host parameters per statement
+_SQL_BATCH = 500
+# canonical_id of copies whose canonical chunk is gone, until they are re-homed
+_ORPHANED = ""
+
+
+def minhash_signatures(texts: Sequence[str]) -> np.ndarray:
+    """
+    MinHash signatures of the texts' shingle sets (one-permutation hashing).
+
+    Texts are lowercased with whitespace collapsed, so reflowed or
+    re-indented copies match; shingles are ``SHINGLE_BYTES``-byte windows
+    of the UTF-8 text. Each shingle is hashed once: the top bits pick one of
+    ``NUM_PERM`` bins and the low 32 bits are its value, and a signature
+    holds the minimum per bin, so the fraction of equal positions estimates
+    the Jaccard similarity like ``NUM_PERM`` separate permutations would,
+    with one sort instead of ``NUM_PERM`` passes. Empty bins (short texts)
+    take the next non-empty bin's value, offset by the distance
+    (rotation densification). As in ``HashedNgramEmbedder`` the whole
+    batch is hashed with array operations.
+
+    Returns:
+        ``(len(texts), NUM_PERM)`` uint32 array; texts shorter than a
+        shingle get all-``0xFFFFFFFF`` rows, which never match anything
+    """
+    signatures = np.full((len(texts), NUM_PERM), _EMPTY, dtype=np.uint32)
+    joined = "\x00".join(" ".join(text.replace("\x00", " ").lower().split()) for text in texts)
+    data = np.frombuffer(joined.encode("utf-8"), dtype=np.uint8)
+    windows = len(data) - SHINGLE_BYTES + 1
+    if windows <= 0:
+        return signatures
+    # Text index of every byte (separators belong to the following text)
+    text_of = np.cumsum(data == 0)
+    codes = data.astype(np.uint64)
+    h = np.zeros(windows, dtype=np.uint64)
+    for k in range(SHINGLE_BYTES):
+        h *= _PRIME
+        h += codes[k : k + windows]
+    valid = (text_of[SHINGLE_BYTES - 1 :] == text_of[:windows]) & (data[:windows] != 0)
+    h = mix64(h[valid])
+    if len(h) == 0:
+        return signatures
+
+    # Sort by (text, bin, value): the first entry of every (text, bin) run is its minimum
+    slot = text_of[:windows][valid].astype(np.uint64) * np.uint64(NUM_PERM) + (h >> np.uint64(64 - _BIN_BITS))
+    values = np.minimum(h & np.uint64(0xFFFFFFFF), np.uint64(_EMPTY - 1))
+    combined = np.sort((slot << np.uint64(32)) | values)
+    slots = combined >> np.uint64(32)
+    first = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+    flat = signatures.reshape(-1)
+    flat[slots[first].astype(np.int64)] = (combined[first] & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    empty = signatures == _EMPTY
+    partial = np.flatnonzero(empty.any(axis=1) & ~empty.all(axis=1))
+    if len(partial):
+        # Next non-empty bin to the right, wrapping around
+        rows = signatures[partial]
+        doubled = np.concatenate([rows, rows], axis=1)
+        positions = np.where(doubled != _EMPTY, np.arange(2 * NUM_PERM), 2 * NUM_PERM)
+        nearest = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1][:, :NUM_PERM]
+        distance = (nearest - np.arange(NUM_PERM)).astype(np.uint32)
+        borrowed = np.take_along_axis(doubled, nearest, axis=1) + distance * _ROTATION
+        signatures[partial] = np.where(rows == _EMPTY, np.minimum(borrowed, _EMPTY - 1), rows)
+    return signatures
+
+
+def _is_empty(signature: np.ndarray) -> bool:
+    return bool(signature[0] == _EMPTY and (signature == _EMPTY).all())
+
+
+def _namespace_seed(namespace: str) -> np.uint64:
+    return np.frombuffer(hashlib.sha256(namespace.encode("utf-8")).digest()[:8], dtype=np.uint64)[0]
+
+
+def band_keys(namespace: str, signatures: np.ndarray) -> np.ndarray:
+    """
+    LSH bucket of every band of every signature, distinct per namespace.
+
+    Returns:
+        ``(n, BANDS)`` int64 array (SQLite integers are signed)
+    """
+    pairs = np.ascontiguousarray(signatures).view(np.uint64).reshape(len(signatures), BANDS, NUM_PERM // BANDS // 2)
+    keys = np.full((len(signatures), BANDS), _namespace_seed(namespace), dtype=np.uint64)
+    keys ^= np.arange(BANDS, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    for column in range(pairs.shape[2]):
+        keys = mix64(keys ^ pairs[:, :, column])
+    return keys.view(np.int64)
+
+
+class NearDuplicateIndex:
+    """
+    Per-tenant MinHash-LSH index of stored chunks, with back-references from collapsed copies.
+
+    Every chunk stored as a vector is a *canonical* chunk: its signature is
+    bucketed by band so that chunks sharing one band with it are candidates,
+    and candidates are kept only if their estimated Jaccard similarity
+    reaches ``threshold``. A chunk matching a canonical one is not embedded
+    or stored; it is recorded as a *duplicate* pointing at it, with its text
+    and metadata, so it can be re-homed (matched again or stored itself)
+    when the canonical chunk's document changes or is deleted. Until then
+    it is kept as an *orphan* (see ``orphans``).
+
+    Everything lives in one SQLite file next to the vector segments, shared
+    by the writer (the ingest worker) and the API workers that attach
+    back-references to query results; without a path it is kept in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.85):
+        """
+        Initialize the index.
+
+        Args:
+            path: SQLite file (in memory if omitted)
+            threshold: Minimum estimated Jaccard similarity of a near-duplicate
+        """
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS canonical (
+                id INTEGER PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                doc_id TEXT,
+                signature BLOB NOT NULL,
+                UNIQUE (namespace, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS canonical_doc ON canonical (namespace, doc_id);
+            CREATE TABLE IF NOT EXISTS band (key INTEGER NOT NULL, canonical INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS band_key ON band (key);
+            CREATE INDEX IF NOT EXISTS band_canonical ON band (canonical);
+            CREATE TABLE IF NOT EXISTS duplicate (
+                namespace TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                doc_id TEXT,
+                canonical_id TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                PRIMARY KEY (namespace, chunk_id)
+            );
+            CREATE INDEX IF NOT EXISTS duplicate_canonical ON duplicate (namespace, canonical_id);
+            CREATE INDEX IF NOT EXISTS duplicate_doc ON duplicate (namespace, doc_id);
+            """
+        )
+        self._db.commit()
+
+    def _similarity(self, signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+        return (others == signature).mean(axis=1)
+
+    def match(
+        self,
+        namespace: str,
+        chunk_ids: Sequence[str],
+        signatures: np.ndarray,
+        replacing_doc: Optional[str] = None,
+        fresh_ids: Iterable[str] = (),
+    ) -> List[Optional[str]]:
+        """
+        Find the canonical chunk each chunk duplicates, if any.
+
+        Chunks are matched against stored canonical chunks and against
+        earlier chunks of the same batch that don't match anything
+        themselves (the caller stores those as canonical).
+
+        Args:
+            namespace: Tenant namespace
+            chunk_ids: IDs of the chunks, in order
+            signatures: Their ``(n, NUM_PERM)`` MinHash signatures
+            replacing_doc: Document being re-ingested: its previous chunks
+                are about to be replaced and can't be matched, except those
+                in ``fresh_ids`` (already written by the current run)
+            fresh_ids: See ``replacing_doc``
+
+        Returns:
+            Per chunk the id of the canonical chunk it duplicates, or ``None``
+        """
+        fresh = set(fresh_ids)
+        keys = band_keys(namespace, signatures)
+        candidates: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+        wanted = np.unique(keys).tolist()
+        with self._lock:
+            for start in range(0, len(wanted), _SQL_BATCH):
+                batch = wanted[start : start + _SQL_BATCH]
+                rows = self._db.execute(
+                    "SELECT band.key, canonical.chunk_id, canonical.doc_id, canonical.signature "
+                    "FROM band JOIN canonical ON canonical.id = band.canonical "
+                    f"WHERE band.key IN ({','.join('?' * len(batch))}) AND canonical.namespace = ?",
+                    [*batch, namespace],
+                ).fetchall()
+                for key, chunk_id, doc_id, blob in rows:
+                    if replacing_doc is not None and doc_id == replacing_doc and chunk_id not in fresh:
+                        continue
+                    candidates.setdefault(key, []).append((chunk_id, np.frombuffer(blob, dtype=np.uint32)))
+
+        found: List[Optional[str]] = []
+        for chunk_id, signature, chunk_keys in zip(chunk_ids, signatures, keys.tolist()):
+            if _is_empty(signature):
+                found.append(None)
+                continue
+            pool = {
+                other_id: other
+                for key in chunk_keys
+                for other_id, other in candidates.get(key, ())
+                if other_id != chunk_id
+            }
+            best = None
+            if pool:
+                names = list(pool)
+                similarity = self._similarity(signature, np.stack([pool[name] for name in names]))
+                top = int(np.argmax(similarity))
+                if similarity[top] >= self.threshold:
+                    best = names[top]
+            found.append(best)
+            if best is None:
+                # Later chunks of the batch may duplicate this one
+                for key in chunk_keys:
+                    candidates.setdefault(key, []).append((chunk_id, signature))
+        return found
+
+    def add_canonical(
+        self, namespace: str, chunk_ids: Sequence[str], doc_ids: Sequence[Any], signatures: np.ndarray
+    ) -> None:
+        """Index chunks just stored as vectors (replacing earlier entries with the same ids)."""
+        keys = band_keys(namespace, signatures)
+        with self._lock, self._db:
+            for chunk_id, doc_id, signature, chunk_keys in zip(chunk_ids, doc_ids, signatures, keys.tolist()):
+                self._remove_canonical(namespace, chunk_id)
+                self._db.execute("DELETE FROM duplicate WHERE namespace = ? AND chunk_id = ?", (namespace, chunk_id))
+                if _is_empty(signature):
+                    continue
+                row = self._db.execute(
+                    "INSERT INTO canonical (namespace, chunk_id, doc_id, signature) VALUES (?, ?, ?, ?)",
+                    (namespace, chunk_id, doc_id, signature.tobytes()),
+                ).lastrowid
+                self._db.executemany("INSERT INTO band (key, canonical) VALUES (?, ?)", [(k, row) for k in chunk_keys])
+
+    def add_duplicates(
+        self,
+        namespace: str,
+        chunk_ids: Sequence[str],
+        canonical_ids: Sequence[str],
+        signatures: np.ndarray,
+        texts: Sequence[str],
+        metadata: Sequence[Dict[str, Any]],
+    ) -> None:
+        """Record chunks collapsed into canonical ones (their metadata keeps ``doc_id`` for citations)."""
+        with self._lock, self._db:
+            for chunk_id, canonical_id, signature, text, md in zip(
+                chunk_ids, canonical_ids, signatures, texts, metadata
+            ):
+                self._remove_canonical(namespace, chunk_id)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO duplicate "
+                    "(namespace, chunk_id, doc_id, canonical_id, signature, text, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        namespace,
+                        chunk_id,
+                        md.get("doc_id"),
+                        canonical_id,
+                        signature.tobytes(),
+                        text,
+                        json.dumps(md, default=str),
+                    ),
+                )
+
+    def _remove_canonical(self, namespace: str, chunk_id: str) -> None:
+        row = self._db.execute(
+            "SELECT id FROM canonical WHERE namespace = ? AND chunk_id = ?", (namespace, chunk_id)
+        ).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM band WHERE canonical = ?", row)
+            self._db.execute("DELETE FROM canonical WHERE id = ?", row)
+
+    def release_doc(
+        self, namespace: str, doc_id: str, chunk_ids: Iterable[str], stored_ids: Iterable[str]
+    ) -> int:
+        """
+        Drop a document's entries that its latest ingest didn't produce, and orphan copies left without a match.
+
+        Call after re-ingesting ``doc_id``. Duplicates in other documents
+        that pointed at one of its chunks which is now gone, or whose
+        content changed too much, become orphans to be re-homed.
+
+        Args:
+            namespace: Tenant namespace
+            doc_id: Document just (re-)ingested
+            chunk_ids: All chunk ids of the new version
+            stored_ids: Those stored as vectors (canonical)
+
+        Returns:
+            Number of duplicates orphaned
+        """
+        chunk_ids, stored_ids = set(chunk_ids), set(stored_ids)
+        orphaned = 0
+        with self._lock, self._db:
+            owned = [
+                chunk_id
+                for (chunk_id,) in self._db.execute(
+                    "SELECT chunk_id FROM canonical WHERE namespace = ? AND doc_id = ?", (namespace, doc_id)
+                )
+            ]
+            for chunk_id in owned:
+                if chunk_id not in stored_ids:
+                    self._remove_canonical(namespace, chunk_id)
+            stale = [
+                chunk_id
+                for (chunk_id,) in self._db.execute(
+                    "SELECT chunk_id FROM duplicate WHERE namespace = ? AND doc_id = ?", (namespace, doc_id)
+                )
+                if chunk_id not in chunk_ids
+            ]
+            self._delete_duplicates(namespace, stale)
+
+            # Copies elsewhere that pointed at this document's chunks, old or new
+            for start in range(0, len(owned), _SQL_BATCH):
+                batch = owned[start : start + _SQL_BATCH]
+                rows = self._db.execute(
+                    "SELECT duplicate.chunk_id, duplicate.signature, canonical.signature "
+                    "FROM duplicate LEFT JOIN canonical "
+                    "ON canonical.namespace = duplicate.namespace AND canonical.chunk_id = duplicate.canonical_id "
+                    f"WHERE duplicate.namespace = ? AND duplicate.canonical_id IN ({','.join('?' * len(batch))}) "
+                    "AND duplicate.doc_id IS NOT ?",
+                    [namespace, *batch, doc_id],
+                ).fetchall()
+                for chunk_id, signature, canonical_signature in rows:
+                    if canonical_signature is not None and self._similarity(
+                        np.frombuffer(signature, dtype=np.uint32),
+                        np.frombuffer(canonical_signature, dtype=np.uint32)[None, :],
+                    )[0] >= self.threshold:
+                        continue
+                    self._db.execute(
+                        "UPDATE duplicate SET canonical_id = ? WHERE namespace = ? AND chunk_id = ?",
+                        (_ORPHANED, namespace, chunk_id),
+                    )
+                    orphaned += 1
+        return orphaned
+
+    def release_chunks(self, namespace: str, chunk_ids: Iterable[str]) -> int:
+        """
+        Forget deleted chunks and orphan the copies that pointed at them.
+
+        Call before deleting the chunks' vectors, so that no later chunk is
+        collapsed into a chunk that no longer exists.
+
+        Args:
+            namespace: Tenant namespace
+            chunk_ids: IDs being deleted (canonical chunks or copies)
+
+        Returns:
+            Number of duplicates orphaned
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        orphaned = 0
+        with self._lock, self._db:
+            for chunk_id in chunk_ids:
+                self._remove_canonical(namespace, chunk_id)
+            self._delete_duplicates(namespace, chunk_ids)
+            for start in range(0, len(chunk_ids), _SQL_BATCH):
+                batch = chunk_ids[start : start + _SQL_BATCH]
+                orphaned += self._db.execute(
+                    "UPDATE duplicate SET canonical_id = ? "
+                    f"WHERE namespace = ? AND canonical_id IN ({','.join('?' * len(batch))})",
+                    [_ORPHANED, namespace, *batch],
+                ).rowcount
+        return orphaned
+
+    def drop_duplicates(self, namespace: str, filter: Dict[str, Any]) -> int:
+        """
+        Forget the copies whose metadata matches ``filter`` (e.g. ``{"doc_id": ...}`` of a deleted document).
+
+        Returns:
+            Number of copies dropped
+        """
+        query = "SELECT chunk_id, metadata FROM duplicate WHERE namespace = ?"
+        params: List[Any] = [namespace]
+        if isinstance(filter.get("doc_id"), str):
+            query += " AND doc_id = ?"
+            params.append(filter["doc_id"])
+        with self._lock, self._db:
+            dropped = [
+                chunk_id
+                for chunk_id, md in self._db.execute(query, params).fetchall()
+                if matches_filter(json.loads(md), filter)
+            ]
+            self._delete_duplicates(namespace, dropped)
+        return len(dropped)
+
+    def _delete_duplicates(self, namespace: str, chunk_ids: Sequence[str]) -> None:
+        for start in range(0, len(chunk_ids), _SQL_BATCH):
+            batch = chunk_ids[start : start + _SQL_BATCH]
+            self._db.execute(
+                f"DELETE FROM duplicate WHERE namespace = ? AND chunk_id IN ({','.join('?' * len(batch))})",
+                [namespace, *batch],
+            )
+
+    def orphans(self, namespace: str) -> List[Dict[str, Any]]:
+        """
+        Copies whose canonical chunk is gone, to be matched again or stored.
+
+        Storing one (``add_canonical``) or matching it (``add_duplicates``)
+        replaces its orphan entry.
+
+        Returns:
+            ``chunk_id``, ``text`` and ``metadata`` per orphan
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chunk_id, text, metadata FROM duplicate "
+                "WHERE namespace = ? AND canonical_id = ? ORDER BY chunk_id",
+                (namespace, _ORPHANED),
+            ).fetchall()
+        return [{"chunk_id": chunk_id, "text": text, "metadata": json.loads(md)} for chunk_id, text, md in rows]
+
+    def duplicates_of(self, namespace: str, chunk_ids: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Back-references of canonical chunks.
+
+        Returns:
+            Per canonical chunk id that has copies, their ``chunk_id`` and ``doc_id``
+        """
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        wanted = list(dict.fromkeys(chunk_ids))
+        with self._lock:
+            for start in range(0, len(wanted), _SQL_BATCH):
+                batch = wanted[start : start + _SQL_BATCH]
+                rows = self._db.execute(
+                    "SELECT canonical_id, chunk_id, doc_id FROM duplicate "
+                    f"WHERE namespace = ? AND canonical_id IN ({','.join('?' * len(batch))}) ORDER BY chunk_id",
+                    [namespace, *batch],
+                ).fetchall()
+                for canonical_id, chunk_id, doc_id in rows:
+                    found.setdefault(canonical_id, []).append({"chunk_id": chunk_id, "doc_id": doc_id})
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        """Canonical, duplicate and orphaned chunk counts."""
+        with self._lock:
+            canonical = self._db.execute("SELECT COUNT(*) FROM canonical").fetchone()[0]
+            duplicates = self._db.execute("SELECT COUNT(*) FROM duplicate").fetchone()[0]
+            orphaned = self._db.execute(
+                "SELECT COUNT(*) FROM duplicate WHERE canonical_id = ?", (_ORPHANED,)
+            ).fetchone()[0]
+        return {
+            "canonical_chunks": canonical,
+            "duplicate_chunks": duplicates,
+            "orphaned_chunks": orphaned,
+            "threshold": self.threshold,
+            "persistent": self.path is not None,
+        }
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._db.close()
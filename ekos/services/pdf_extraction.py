@@ -0,0 +1,195 @@
+"""Local PDF text extraction, split by page range across processes."""
+
+import bisect
+import logging
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TextIO, Tuple
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF ingestion needs pypdf
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+# Separator between consecutive pages in the chunked text
+PAGE_SEPARATOR = "\n\n"
+
+
+# The last PDF opened in this process, keyed by (path, mtime, size): opening
+# parses the cross-reference table and page tree, which is linear in the page
+# count, so each pool process opens a document once rather than per range
+_last_reader: Optional[Tuple[Tuple[str, int, int], "PdfReader"]] = None
+
+
+def _open(file_path: str, cache: bool = True) -> "PdfReader":
+    global _last_reader
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if _last_reader is not None and _last_reader[0] == key:
+        return _last_reader[1]
+    reader = PdfReader(file_path)
+    if reader.is_encrypted:
+        # Many PDFs are "encrypted" with an empty user password only
+        reader.decrypt("")
+    if cache:
+        _last_reader = (key, reader)
+    return reader
+
+
+def pdf_page_count(file_path: str) -> int:
+    """Number of pages in a PDF (the reader is not kept: pypdf holds the whole file in memory)."""
+    return len(_open(file_path, cache=False).pages)
+
+
+def extract_page_range(file_path: str, first: int, last: int) -> List[str]:
+    """
+    Extract the text of pages ``first`` to ``last - 1`` (0-based).
+
+    Runs in a pool process: the file is opened there (once per process and
+    document), so only the path and the page texts cross process boundaries.
+    A page that fails to parse yields empty text instead of failing the
+    document.
+
+    Returns:
+        One text per page
+    """
+    reader = _open(file_path)
+    texts = []
+    for number in range(first, last):
+        try:
+            texts.append(reader.pages[number].extract_text() or "")
+        except Exception as e:
+            logger.warning(f"Could not extract page {number + 1} of {file_path}: {e}")
+            texts.append("")
+    return texts
+
+
+def iter_page_ranges(
+    file_path: str,
+    page_count: int,
+    pages_per_task: int,
+    executor: Optional[Executor] = None,
+    in_flight: int = 2,
+) -> Iterator[List[str]]:
+    """
+    Extract a PDF's pages in ranges of ``pages_per_task``, yielding them in page order.
+
+    With an ``executor`` up to ``in_flight`` ranges are extracted at once and
+    each is yielded as soon as it and all earlier ones are done; otherwise
+    ranges are extracted one after another in this process.
+
+    Yields:
+        Page texts, one list per range
+    """
+    ranges = [(first, min(first + pages_per_task, page_count)) for first in range(0, page_count, pages_per_task)]
+    if executor is None:
+        for first, last in ranges:
+            yield extract_page_range(file_path, first, last)
+        return
+
+    pending: Deque[Future] = deque()
+    try:
+        for first, last in ranges:
+            pending.append(executor.submit(extract_page_range, file_path, first, last))
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # The consumer stopped early (or a range failed): drop queued ranges
+        for future in pending:
+            future.cancel()
+
+
+class PageStream:
+    """
+    Text stream over page texts, joined with ``PAGE_SEPARATOR``.
+
+    Pages are pulled from ``ranges`` only as ``read`` needs them, and the
+    offset where each page starts is recorded so that chunk offsets can be
+    mapped back to page numbers.
+    """
+
+    def __init__(self, ranges: Iterator[List[str]]):
+        """
+        Initialize the stream.
+
+        Args:
+            ranges: Page texts in page order, in lists of any length
+        """
+        self._ranges = ranges
+        self._pending = ""
+        self._position = 0  # offset of _pending[0] in the joined text
+        self.page_starts: List[int] = []
+
+    def read(self, size: int) -> str:
+        """Read up to ``size`` characters ("" at the end)."""
+        while len(self._pending) < size:
+            texts = next(self._ranges, None)
+            if texts is None:
+                break
+            parts = [self._pending]
+            length = len(self._pending)
+            for text in texts:
+                if self.page_starts:
+                    parts.append(PAGE_SEPARATOR)
+                    length += len(PAGE_SEPARATOR)
+                self.page_starts.append(self._position + length)
+                parts.append(text)
+                length += len(text)
+            self._pending = "".join(parts)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        self._position += len(data)
+        return data
+
+    def pages(self, start: int, end: int) -> Tuple[int, int]:
+        """First and last (1-based) page overlapping the text from ``start`` to ``end``."""
+        first = max(bisect.bisect_right(self.page_starts, start), 1)
+        last = max(bisect.bisect_right(self.page_starts, max(end - 1, start)), first)
+        return first, last
+
+
+def iter_pdf_chunks(
+    file_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    executor: Optional[Executor] = None,
+    pages_per_task: int = 8,
+    in_flight: int = 2,
+    chunker: Optional[Callable[[TextIO, int, int], Iterator[Dict[str, Any]]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Extract and chunk a PDF, streaming pages into the chunker as they are extracted.
+
+    Pages are extracted in ranges (in parallel with an ``executor``) and
+    chunked in page order; each chunk records the pages it spans for
+    citations.
+
+    Args:
+        file_path: Path to the PDF
+        chunk_size: Size of each chunk
+        chunk_overlap: Overlap between chunks
+        executor: Process pool extracting page ranges (``None``: in this process)
+        pages_per_task: Pages extracted per task
+        in_flight: Ranges extracted concurrently with an executor
+        chunker: Text chunker, called with the page stream, ``chunk_size`` and
+            ``chunk_overlap`` (default: ``iter_text_chunks``)
+
+    Yields:
+        Chunks with offset metadata plus ``page_start``, ``page_end`` and ``page_count``
+    """
+    # Imported here: the text chunker lives with the preprocessing service, which imports this module
+    from services.preprocess import iter_text_chunks
+
+    page_count = pdf_page_count(file_path)
+    stream = PageStream(iter_page_ranges(file_path, page_count, pages_per_task, executor, in_flight))
+    for chunk in (chunker or iter_text_chunks)(stream, chunk_size, chunk_overlap):
+        if not chunk["text"]:
+            continue  # pages without a text layer (scans)
+        metadata = chunk["metadata"]
+        metadata["page_start"], metadata["page_end"] = stream.pages(metadata["chunk_start"], metadata["chunk_end"])
+        metadata["page_count"] = page_count
+        yield chunk
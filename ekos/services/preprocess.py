@@ -1,15 +1,430 @@
 """Preprocessing service for OCR/STT and chunking."""
 
+import asyncio
+import io
+import itertools
 import logging
+import multiprocessing
 import os
-from typing import Any, Dict, List, Optional
-
+import pickle
+import queue
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+import numpy as np
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Arrow ingestion needs pyarrow
+    pa = None
+
 from app.config import Settings, get_settings
+from services.hashing import mix64
+from services.pdf_extraction import PdfReader, iter_pdf_chunks
+from services.preprocess_cache import ArtifactCache
 
 logger = logging.getLogger(__name__)
 
+# Characters read from a text file per step while chunking
+_READ_CHARS = 1 << 16
+
+# Content-defined chunking: characters hashed to decide whether a position is
+# a boundary, and how far a boundary may move forward to the end of its word
+_ANCHOR_WINDOW = 32
+_ANCHOR_SNAP = 32
+_ANCHOR_PRIME = np.uint64(0x100000001B3)
+_WHITESPACE = re.compile(r"\s")
+
+TABULAR_EXTENSIONS = [".xlsx", ".xls", ".csv"]
+COLUMNAR_EXTENSIONS = [".parquet", ".arrow", ".feather"]
+TEXT_EXTENSIONS = [".txt", ".md"]
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".webp"]
+AUDIO_EXTENSIONS = [".mp3", ".wav", ".m4a", ".ogg"]
+# Parsed and chunked locally (CPU-bound): run in the preprocessing process pool
+CPU_BOUND_EXTENSIONS = TEXT_EXTENSIONS + TABULAR_EXTENSIONS + COLUMNAR_EXTENSIONS
+
+# Chunks pickled per message from a pool process, and messages buffered per job
+_RESULT_BATCH_CHUNKS = 256
+_RESULT_QUEUE_BATCHES = 8
+
+
+def iter_text_chunks(stream: TextIO, chunk_size: int = 1000, chunk_overlap: int = 200) -> Iterator[Dict[str, Any]]:
+    """
+    Chunk text read incrementally from ``stream``.
+
+    Only the current chunk and one read block are held in memory, so a large
+    file is chunked in constant memory. A chunk ends at the last period or
+    newline in its second half, if any; the next one starts ``chunk_overlap``
+    characters before that end. Offsets are character positions in the
+    whole text.
+
+    Args:
+        stream: Text stream (e.g. a file opened in text mode)
+        chunk_size: Size of each chunk
+        chunk_overlap: Overlap between chunks
+
+    Yields:
+        Chunks with ``text`` and offset metadata
+    """
+    buffer = ""
+    offset = 0  # position of buffer[0] in the text
+    eof = False
+    start = 0
+
+    while True:
+        # Read until the buffer holds one character past the chunk, or the whole rest
+        while not eof and offset + len(buffer) <= start + chunk_size:
+            block = stream.read(_READ_CHARS)
+            if block:
+                buffer += block
+            else:
+                eof = True
+        text_end = offset + len(buffer)
+        if start >= text_end:
+            return
+
+        end = start + chunk_size
+        chunk_text = buffer[start - offset : end - offset]
+        more = end < text_end
+        # Try to end at sentence boundary
+        if more:
+            last_period = chunk_text.rfind(".")
+            last_newline = chunk_text.rfind("\n")
+            boundary = max(last_period, last_newline)
+            if boundary > chunk_size * 0.5:  # Only adjust if reasonable
+                end = start + boundary + 1
+                chunk_text = chunk_text[: boundary + 1]
+
+        yield {
+            "text": chunk_text.strip(),
+            "metadata": {
+                "chunk_start": start,
+                "chunk_end": end,
+                "chunk_length": len(chunk_text),
+            },
+        }
+        if not more:
+            return
+
+        # Move start position with overlap (always forward)
+        start = max(end - chunk_overlap, start + 1)
+        if start - offset >= _READ_CHARS:
+            buffer = buffer[start - offset :]
+            offset = start
+
+
+def _anchor_positions(text: str, first: int, divisor: int) -> np.ndarray:
+    """
+    Positions in ``text`` (offset by ``first``) where a content-defined boundary may follow.
+
+    Position ``p`` is an anchor if a hash of the ``_ANCHOR_WINDOW``
+    characters ending at ``p`` is divisible by ``divisor``, so whether it
+    is one depends only on those characters. Hashed with array operations,
+    like the n-grams in ``HashedNgramEmbedder``.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32).astype(np.uint64)
+    windows = len(codes) - _ANCHOR_WINDOW + 1
+    if windows <= 0:
+        return np.empty(0, dtype=np.int64)
+    h = np.zeros(windows, dtype=np.uint64)
+    for k in range(_ANCHOR_WINDOW):
+        h *= _ANCHOR_PRIME
+        h += codes[k : k + windows]
+    return np.flatnonzero(mix64(h) % np.uint64(divisor) == 0) + (first + _ANCHOR_WINDOW - 1)
+
+
+def iter_content_defined_chunks(
+    stream: TextIO, chunk_size: int = 1000, chunk_overlap: int = 200
+) -> Iterator[Dict[str, Any]]:
+    """
+    Chunk text read incrementally from ``stream`` at content-defined boundaries.
+
+    Each chunk adds between a third and all of ``chunk_size - chunk_overlap``
+    new characters and ends after the last anchor (see
+    ``_anchor_positions``) in that range, moved to the end of its word;
+    without an anchor in range it ends at the last whitespace. Because
+    anchors depend only on nearby text, an edit changes the chunks around
+    it and the boundaries after it fall where they did before, so later
+    chunks come out identical (re-ingesting only re-embeds what changed).
+    Like ``iter_text_chunks``, every chunk repeats the ``chunk_overlap``
+    characters before it, and only the current chunk and one read block are
+    held in memory.
+
+    Args:
+        stream: Text stream (e.g. a file opened in text mode)
+        chunk_size: Maximum size of each chunk
+        chunk_overlap: Characters repeated from the previous chunk
+
+    Yields:
+        Chunks with ``text`` and offset metadata
+    """
+    max_new = max(chunk_size - chunk_overlap, 1)
+    # With an anchor every max_new / 2 characters on average, the boundaries
+    # after an edit fall back in step within a chunk or two
+    min_new = max_new // 3
+    divisor = max(max_new // 2, 1)
+    buffer = ""
+    offset = 0  # position of buffer[0] in the text
+    hashed = 0  # anchors are known up to here
+    anchors = np.empty(0, dtype=np.int64)
+    eof = False
+    start = 0  # where the current chunk's new text starts
+
+    while True:
+        # Read until the buffer holds the longest possible chunk plus the word-end lookahead
+        while not eof and offset + len(buffer) <= start + max_new + _ANCHOR_SNAP:
+            block = stream.read(_READ_CHARS)
+            if block:
+                buffer += block
+            else:
+                eof = True
+        text_end = offset + len(buffer)
+        if text_end > hashed:
+            # Hash the new characters, with the window before them as context
+            context = max(hashed - _ANCHOR_WINDOW + 1, offset)
+            found = _anchor_positions(buffer[context - offset :], context, divisor)
+            anchors = np.concatenate([anchors, found[found >= hashed]])
+            hashed = text_end
+        if start >= text_end:
+            return
+
+        limit = start + max_new
+        if eof and text_end <= limit:
+            end = text_end
+        else:
+            i = np.searchsorted(anchors, limit) - 1
+            if i >= 0 and anchors[i] >= start + min_new - 1:
+                end = int(anchors[i]) + 1
+                word_end = _WHITESPACE.search(buffer, end - offset, min(end + _ANCHOR_SNAP, limit) - offset)
+                if word_end:
+                    end = offset + word_end.end()
+            else:
+                lo, hi = start + min_new - offset, limit - offset
+                space = max(buffer.rfind(" ", lo, hi), buffer.rfind("\n", lo, hi))
+                end = offset + space + 1 if space >= 0 else limit
+
+        chunk_start = max(start - chunk_overlap, 0)
+        chunk_text = buffer[chunk_start - offset : end - offset]
+        yield {
+            "text": chunk_text.strip(),
+            "metadata": {
+                "chunk_start": chunk_start,
+                "chunk_end": end,
+                "chunk_length": len(chunk_text),
+            },
+        }
+
+        start = end
+        anchors = anchors[np.searchsorted(anchors, start) :]
+        keep = max(start - chunk_overlap, 0)
+        if keep - offset >= _READ_CHARS:
+            buffer = buffer[keep - offset :]
+            offset = keep
+
+
+TEXT_CHUNKERS: Dict[str, Callable[[TextIO, int, int], Iterator[Dict[str, Any]]]] = {
+    "fixed": iter_text_chunks,
+    "content": iter_content_defined_chunks,
+}
+
+
+def _row_chunks(
+    row_indices: Sequence[int],
+    texts: Sequence[str],
+    row_data_at: Callable[[int], Dict[str, str]],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Chunk synthetic row documents of a table and attach their row metadata.
+
+    Rows that fit in one chunk skip the text chunker; empty rows yield nothing.
+
+    Args:
+        row_indices: Row number of each text in the source table
+        texts: Row texts (``"col: value | ..."``)
+        row_data_at: Non-null cells of the i-th row as strings
+        chunk_size: Size of each chunk
+        chunk_overlap: Overlap between chunks
+
+    Yields:
+        Chunks with row metadata
+    """
+    for i, (idx, text) in enumerate(zip(row_indices, texts)):
+        if not text:
+            continue
+        row_data = row_data_at(i)
+
+        if len(text) <= chunk_size:
+            row_chunks = [
+                {
+                    "text": text.strip(),
+                    "metadata": {"chunk_start": 0, "chunk_end": chunk_size, "chunk_length": len(text)},
+                }
+            ]
+        else:
+            row_chunks = iter_text_chunks(io.StringIO(text), chunk_size, chunk_overlap)
+
+        # Add row metadata to each chunk
+        for chunk_idx, chunk in enumerate(row_chunks):
+            chunk["metadata"]["row_index"] = int(idx)
+            chunk["metadata"]["chunk_index"] = chunk_idx
+            chunk["metadata"]["row_data"] = row_data
+            yield chunk
+
+
+def _spreadsheet_batch_chunks(
+    batch: pd.DataFrame, chunk_size: int = 1000, chunk_overlap: int = 200
+) -> Iterator[Dict[str, Any]]:
+    """
+    Turn a batch of spreadsheet rows into synthetic docs/chunks.
+
+    Row texts (``"col: value | ..."`` over the non-null cells) are built
+    column by column over the whole batch.
+
+    Args:
+        batch: Rows of the spreadsheet (index = row number)
+        chunk_size: Size of each chunk
+        chunk_overlap: Overlap between chunks
+
+    Yields:
+        Chunks with row metadata
+    """
+    columns = [str(col) for col in batch.columns]
+    present = batch.notna().to_numpy()
+    cells = batch.astype(str).to_numpy(dtype=object)
+
+    texts = np.full(len(batch), "", dtype=object)
+    for j, col in enumerate(columns):
+        labelled = f"{col}: " + cells[:, j]
+        texts = np.where(present[:, j], np.where(texts != "", texts + " | " + labelled, labelled), texts)
+    complete = present.all(axis=1)
+
+    def row_data_at(i: int) -> Dict[str, str]:
+        if complete[i]:
+            return dict(zip(columns, cells[i]))
+        return {col: cell for col, cell, ok in zip(columns, cells[i], present[i]) if ok}
+
+    yield from _row_chunks(batch.index.tolist(), texts.tolist(), row_data_at, chunk_size, chunk_overlap)
+
+
+def _arrow_strings(column: "pa.Array") -> "pa.Array":
+    """Cast an Arrow column to strings (nulls stay null)."""
+    try:
+        return pc.cast(column, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Nested and binary types have no string cast
+        return pa.array([None if value is None else str(value) for value in column.to_pylist()], pa.string())
+
+
+def _arrow_batch_chunks(
+    batch: "pa.RecordBatch", first_row: int, chunk_size: int = 1000, chunk_overlap: int = 200
+) -> Iterator[Dict[str, Any]]:
+    """
+    Turn an Arrow record batch into synthetic docs/chunks.
+
+    Row texts are joined by Arrow compute kernels straight from the column
+    buffers; Python strings are only created for the finished texts and the
+    row metadata.
+
+    Args:
+        batch: Rows of the table
+        first_row: Row number of the batch's first row in the table
+        chunk_size: Size of each chunk
+        chunk_overlap: Overlap between chunks
+
+    Yields:
+        Chunks with row metadata
+    """
+    if batch.num_columns == 0 or batch.num_rows == 0:
+        return
+    columns = batch.schema.names
+    cells = [_arrow_strings(batch.column(j)) for j in range(batch.num_columns)]
+    # "col: value" (null where the cell is null) appended with " | " column by
+    # column; null_handling="skip" would drop rows whose cells are all null
+    texts = None
+    for col, cell in zip(columns, cells):
+        labelled = pc.binary_join_element_wise(f"{col}:", cell, " ")
+        if texts is None:
+            texts = labelled
+        else:
+            texts = pc.coalesce(pc.binary_join_element_wise(texts, labelled, " | "), texts, labelled)
+    texts = pc.fill_null(texts, "").to_numpy(zero_copy_only=False)
+
+    values = np.column_stack([cell.to_numpy(zero_copy_only=False) for cell in cells])
+    complete = np.logical_and.reduce([cell.is_valid().to_numpy(zero_copy_only=False) for cell in cells])
+
+    def row_data_at(i: int) -> Dict[str, str]:
+        if complete[i]:
+            return dict(zip(columns, values[i]))
+        return {col: value for col, value in zip(columns, values[i]) if value is not None}
+
+    yield from _row_chunks(
+        range(first_row, first_row + batch.num_rows), texts.tolist(), row_data_at, chunk_size, chunk_overlap
+    )
+
+
+def _produce_chunks(
+    settings: Settings,
+    file_path: str,
+    options: Dict[str, Any],
+    results: "queue.Queue",
+    cancelled: threading.Event,
+) -> int:
+    """
+    Chunk a file in a pool process, sending chunks back in pickled batches.
+
+    Each batch is pickled here into one bytes object, so the queue's manager
+    process only forwards bytes instead of unpickling and repickling every
+    chunk. ``None`` on ``results`` marks the end; errors are raised through
+    the job's future. Stops early once ``cancelled`` is set.
+
+    Returns:
+        Number of chunks produced
+    """
+
+    def put(item: Optional[bytes]) -> bool:
+        # The queue is bounded: wait for the consumer, unless it went away
+        while not cancelled.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    produced = 0
+    batch: List[Dict[str, Any]] = []
+    try:
+        for chunk in PreprocessService(settings)._iter_file_chunks(file_path, options):
+            batch.append(chunk)
+            if len(batch) >= _RESULT_BATCH_CHUNKS:
+                if not put(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)):
+                    return produced
+                produced += len(batch)
+                batch = []
+        if batch and put(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)):
+            produced += len(batch)
+    finally:
+        put(None)
+    return produced
+
+
+async def _iterate_in_thread(items: Iterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """Yield from a blocking iterator, advancing it on a worker thread a batch at a time."""
+
+    def next_batch() -> List[Dict[str, Any]]:
+        return list(itertools.islice(items, _RESULT_BATCH_CHUNKS))
+
+    while batch := await asyncio.to_thread(next_batch):
+        for item in batch:
+            yield item
+
 
 class PreprocessService:
     """Service for document preprocessing (OCR, STT, chunking)."""
@@ -17,6 +432,45 @@ class PreprocessService:
     def __init__(self, settings: Settings | None = None):
         """Initialize preprocessing service."""
         self.settings = settings or get_settings()
+        # Started on first use: processes for CPU-bound parsing and chunking,
+        # plus a manager serving the result queues
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._pool_lock = threading.Lock()
+        # Chunk outputs persisted by file content, shared with the ingest worker
+        self.artifacts: Optional[ArtifactCache] = None
+        if self.settings.preprocess_cache_dir:
+            self.artifacts = ArtifactCache(
+                self.settings.preprocess_cache_dir, self.settings.preprocess_cache_max_mb * 1024 * 1024
+            )
+
+    def _get_pool(self) -> Optional[Tuple[ProcessPoolExecutor, Any]]:
+        """
+        Return the process pool and its manager, starting them on first use.
+
+        Returns ``None`` where child processes can't be used: when disabled
+        with ``preprocess_processes < 0`` and inside daemonic processes
+        (e.g. Celery prefork workers), which may not have children.
+        """
+        if self.settings.preprocess_processes < 0 or multiprocessing.current_process().daemon:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: the parent runs threads (uvicorn, executors) that fork could copy mid-lock
+                context = multiprocessing.get_context("spawn")
+                processes = self.settings.preprocess_processes or os.cpu_count() or 1
+                self._manager = context.Manager()
+                self._pool = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+                logger.info(f"Started preprocessing pool with {processes} processes")
+            return self._pool, self._manager
+
+    def close(self) -> None:
+        """Shut down the preprocessing pool."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._manager.shutdown()
+                self._pool = self._manager = None
 
     async def process_document(
         self, doc_id: str, file_path: Optional[str] = None, options: Optional[Dict[str, Any]] = None
@@ -32,45 +486,9 @@ class PreprocessService:
         Returns:
             Processing result with chunks
         """
-        options = options or {}
-        enable_ocr = options.get("ocr", False)
-        enable_stt = options.get("stt", False)
-        chunk_size = options.get("chunk_size", 1000)
-        chunk_overlap = options.get("chunk_overlap", 200)
-
         chunks = []
-
         if file_path and os.path.exists(file_path):
-            # Detect file type
-            ext = os.path.splitext(file_path)[1].lower()
-
-            if ext in [".xlsx", ".xls", ".csv"]:
-                # Process spreadsheet
-                chunks = await self._process_spreadsheet(file_path, chunk_size, chunk_overlap)
-            elif ext in [".txt", ".md"]:
-                # Process text file
-                with open(file_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-                chunks = await self._chunk_text(text, chunk_size, chunk_overlap)
-            elif ext in [".pdf"]:
-                # Process PDF
-                # TODO: Implement PDF extraction
-                logger.warning("PDF processing not yet implemented")
-                chunks = []
-            elif ext in [".jpg", ".jpeg", ".png", ".gif", ".webp"]:
-                # Process image with OCR
-                if enable_ocr:
-                    chunks = await self._process_image_ocr(file_path)
-                else:
-                    chunks = []
-            elif ext in [".mp3", ".wav", ".m4a", ".ogg"]:
-                # Process audio with STT
-                if enable_stt:
-                    chunks = await self._process_audio_stt(file_path)
-                else:
-                    chunks = []
-            else:
-                logger.warning(f"Unsupported file type: {ext}")
+            chunks = [chunk async for chunk in self.iter_chunks(file_path, options)]
 
         result = {
             "doc_id": doc_id,
@@ -81,57 +499,333 @@ class PreprocessService:
 
         return result
 
-    async def _process_spreadsheet(
-        self, file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200
-    ) -> List[Dict[str, Any]]:
+    def _artifact_options(self, file_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Options that determine a file's chunks (the artifact key), with defaults filled in."""
+        ext = os.path.splitext(file_path)[1].lower()
+        key_options = {
+            "ext": ext,
+            "chunk_size": options.get("chunk_size", 1000),
+            "chunk_overlap": options.get("chunk_overlap", 200),
+            "columns": options.get("columns"),
+        }
+        if ext in TEXT_EXTENSIONS or ext == ".pdf":
+            key_options["chunking"] = options.get("chunking", self.settings.text_chunking)
+        # OCR/STT flags only matter for the files they apply to, so the API's
+        # and the worker's defaults share artifacts for everything else
+        if ext in IMAGE_EXTENSIONS:
+            key_options["ocr"] = bool(options.get("ocr", False))
+        elif ext in AUDIO_EXTENSIONS:
+            key_options["stt"] = bool(options.get("stt", False))
+        return key_options
+
+    async def iter_chunks(
+        self, file_path: str, options: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Process spreadsheet and convert rows to synthetic docs/chunks.
+        Yield a document's chunks as they are produced.
+
+        Text and tabular files are parsed and chunked in the preprocessing
+        process pool, so the event loop stays free for other requests; their
+        chunks stream back in batches. PDFs are split into page ranges
+        extracted in the same pool. Text files are read and chunked
+        incrementally, so consumers that handle chunks in batches (the
+        ingest worker) hold one batch at a time rather than the whole
+        document.
+
+        With ``preprocess_cache_dir`` set, the chunks of a complete run are
+        saved as an artifact keyed by the file's sha256 and chunking
+        options, and later calls for the same content (from the API or the
+        ingest worker) read it back instead of extracting again.
+
+        Args:
+            file_path: Path to document file
+            options: Processing options (ocr, stt, chunk_size, chunk_overlap,
+                chunking, columns)
+
+        Yields:
+            Chunks with metadata
+        """
+        options = options or {}
+        if self.artifacts is None or not os.path.isfile(file_path):
+            async for chunk in self._extract_chunks(file_path, options):
+                yield chunk
+            return
+
+        # Hashing reads the whole file: not on the event loop
+        key = await asyncio.to_thread(self.artifacts.key, file_path, self._artifact_options(file_path, options))
+        cached = await asyncio.to_thread(self.artifacts.open, key)
+        if cached is not None:
+            logger.info(f"Reusing preprocessing artifact {key[:12]} for {file_path}")
+            async for chunk in _iterate_in_thread(cached):
+                yield chunk
+            return
+
+        writer = await asyncio.to_thread(self.artifacts.writer, key)
+        try:
+            async for chunk in self._extract_chunks(file_path, options):
+                writer.write((chunk,))
+                yield chunk
+        except BaseException:
+            # Failed, or the consumer stopped early: the artifact is incomplete
+            writer.discard()
+            raise
+        if writer.count:
+            await asyncio.to_thread(writer.commit)
+        else:
+            # Not cached: a later run may succeed (e.g. once an optional dependency is installed)
+            writer.discard()
+
+    async def _extract_chunks(self, file_path: str, options: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Extract and chunk a document by file type (``iter_chunks`` without the artifact cache)."""
+        enable_ocr = options.get("ocr", False)
+        enable_stt = options.get("stt", False)
+
+        # Detect file type
+        ext = os.path.splitext(file_path)[1].lower()
+        chunks: List[Dict[str, Any]] = []
+
+        if ext in CPU_BOUND_EXTENSIONS:
+            # Starting the pool waits for its manager process: not on the event loop
+            pool = await asyncio.to_thread(self._get_pool)
+            if pool is None:
+                for chunk in self._iter_file_chunks(file_path, options):
+                    yield chunk
+            else:
+                async for chunk in self._iter_offloaded(pool, file_path, options):
+                    yield chunk
+        elif ext in [".pdf"]:
+            # Process PDF: page ranges are extracted in the process pool
+            if PdfReader is None:
+                logger.warning("Cannot process PDF files: pypdf is not installed")
+            else:
+                async for chunk in self._iter_pdf_chunks(file_path, options):
+                    yield chunk
+        elif ext in IMAGE_EXTENSIONS:
+            # Process image with OCR
+            if enable_ocr:
+                chunks = await self._process_image_ocr(file_path)
+        elif ext in AUDIO_EXTENSIONS:
+            # Process audio with STT
+            if enable_stt:
+                chunks = await self._process_audio_stt(file_path)
+        else:
+            logger.warning(f"Unsupported file type: {ext}")
+
+        for chunk in chunks:
+            yield chunk
+
+    async def _iter_offloaded(
+        self, pool: Tuple[ProcessPoolExecutor, Any], file_path: str, options: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Run ``_iter_file_chunks`` in the process pool and yield its chunks as batches arrive."""
+        executor, manager = pool
+        results = manager.Queue(maxsize=_RESULT_QUEUE_BATCHES)
+        cancelled = manager.Event()
+        # The first submit spawns the pool's processes
+        job: Future = await asyncio.to_thread(
+            executor.submit, _produce_chunks, self.settings, file_path, options, results, cancelled
+        )
+
+        def next_batch() -> Optional[List[Dict[str, Any]]]:
+            while True:
+                try:
+                    data = results.get(timeout=0.1)
+                    return None if data is None else pickle.loads(data)
+                except queue.Empty:
+                    # A crashed job never sends the end marker
+                    if job.done():
+                        return None
+
+        try:
+            while (batch := await asyncio.to_thread(next_batch)) is not None:
+                for chunk in batch:
+                    yield chunk
+            await asyncio.wrap_future(job)
+        finally:
+            if not job.done():
+                # The consumer stopped early: let the job stop too
+                cancelled.set()
+
+    async def _iter_pdf_chunks(self, file_path: str, options: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Extract and chunk a PDF, page ranges in parallel in the process pool.
+
+        Ranges of ``pdf_pages_per_task`` pages go to the pool, at most two per
+        process at a time; their text is chunked in page order as they
+        complete, on a worker thread so the event loop stays free. Without a
+        pool (Celery prefork workers) pages are extracted in-process.
+
+        Yields:
+            Chunks with page metadata
+        """
+        pool = await asyncio.to_thread(self._get_pool)
+        processes = self.settings.preprocess_processes or os.cpu_count() or 1
+        chunks = iter_pdf_chunks(
+            file_path,
+            options.get("chunk_size", 1000),
+            options.get("chunk_overlap", 200),
+            executor=pool[0] if pool else None,
+            pages_per_task=self.settings.pdf_pages_per_task,
+            in_flight=2 * processes,
+            chunker=self._text_chunker(options),
+        )
+        if pool is None:
+            for chunk in chunks:
+                yield chunk
+            return
+
+        try:
+            async for chunk in _iterate_in_thread(chunks):
+                yield chunk
+        finally:
+            # Cancels ranges not yet extracted if the consumer stopped early
+            await asyncio.to_thread(chunks.close)
+
+    def _text_chunker(self, options: Dict[str, Any]) -> Callable[[TextIO, int, int], Iterator[Dict[str, Any]]]:
+        """Chunker for text and PDF text: the ``chunking`` option, else ``text_chunking``."""
+        strategy = options.get("chunking", self.settings.text_chunking)
+        if strategy not in TEXT_CHUNKERS:
+            raise ValueError(f"Unknown text chunking: {strategy}")
+        return TEXT_CHUNKERS[strategy]
+
+    def _iter_file_chunks(self, file_path: str, options: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Parse and chunk a text or tabular file (blocking; runs in a pool process).
+
+        Args:
+            file_path: Path to document file
+            options: Processing options (chunking, columns)
+
+        Yields:
+            Chunks with metadata
+        """
+        chunk_size = options.get("chunk_size", 1000)
+        chunk_overlap = options.get("chunk_overlap", 200)
+        # Tables: read only these columns (all when unset)
+        columns = options.get("columns")
+        ext = os.path.splitext(file_path)[1].lower()
+
+        if ext in TABULAR_EXTENSIONS:
+            # Process spreadsheet, one batch of rows at a time
+            yield from self._iter_spreadsheet_chunks(file_path, chunk_size, chunk_overlap, columns)
+        elif ext in COLUMNAR_EXTENSIONS:
+            # Process Parquet / Arrow IPC (Feather v2), one record batch at a time
+            if pa is None:
+                logger.warning(f"Cannot process {ext} files: pyarrow is not installed")
+            else:
+                yield from self._iter_columnar_chunks(file_path, chunk_size, chunk_overlap, columns)
+        elif ext in TEXT_EXTENSIONS:
+            # Process text file, streaming
+            with open(file_path, "r", encoding="utf-8") as f:
+                yield from self._text_chunker(options)(f, chunk_size, chunk_overlap)
+
+    def _iter_spreadsheet_chunks(
+        self,
+        file_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        columns: Optional[List[str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Convert spreadsheet rows to synthetic docs/chunks, ``spreadsheet_batch_rows`` rows at a time.
+
+        CSV files are read batch by batch, so memory is bounded by the batch
+        size; Excel files are loaded whole and then processed in batches.
 
         Args:
             file_path: Path to spreadsheet file
             chunk_size: Size of each chunk
             chunk_overlap: Overlap between chunks
+            columns: Columns to read (all when omitted)
 
-        Returns:
-            List of chunks with metadata
+        Yields:
+            Chunks with metadata
         """
-        chunks = []
+        batch_rows = max(1, self.settings.spreadsheet_batch_rows)
+        rows = chunk_count = 0
 
         try:
             # Read spreadsheet
-            if file_path.endswith(".csv"):
-                df = pd.read_csv(file_path)
+            if os.path.splitext(file_path)[1].lower() == ".csv":
+                batches = pd.read_csv(file_path, chunksize=batch_rows, usecols=columns)
             else:
-                df = pd.read_excel(file_path)
-
-            # Convert each row to a synthetic document
-            for idx, row in df.iterrows():
-                # Create synthetic document text from row data
-                row_text = " | ".join([f"{col}: {row[col]}" for col in df.columns if pd.notna(row[col])])
-                row_metadata = {
-                    "row_index": int(idx),
-                    "columns": list(df.columns),
-                    "row_data": {col: str(row[col]) for col in df.columns if pd.notna(row[col])},
-                }
+                df = pd.read_excel(file_path, usecols=columns)
+                batches = (df.iloc[start : start + batch_rows] for start in range(0, len(df), batch_rows))
 
-                # Chunk the row text
-                row_chunks = await self._chunk_text(row_text, chunk_size, chunk_overlap)
+            for batch in batches:
+                rows += len(batch)
+                for chunk in _spreadsheet_batch_chunks(batch, chunk_size, chunk_overlap):
+                    chunk_count += 1
+                    yield chunk
 
-                # Add row metadata to each chunk
-                for chunk_idx, chunk in enumerate(row_chunks):
-                    chunk["metadata"]["row_index"] = int(idx)
-                    chunk["metadata"]["chunk_index"] = chunk_idx
-                    chunk["metadata"]["row_data"] = row_metadata["row_data"]
+            logger.info(f"Processed spreadsheet: {rows} rows -> {chunk_count} chunks")
 
-                chunks.extend(row_chunks)
+        except Exception as e:
+            logger.error(f"Error processing spreadsheet: {e}")
+            raise
+
+    def _iter_columnar_chunks(
+        self,
+        file_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        columns: Optional[List[str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Convert Parquet or Arrow IPC (Feather v2) rows to synthetic docs/chunks.
+
+        Parquet is decoded one batch of at most ``spreadsheet_batch_rows``
+        rows at a time, within row groups, reading only ``columns``. Arrow
+        IPC files are memory-mapped, so their record batches are read
+        zero-copy from the file.
+
+        Args:
+            file_path: Path to the ``.parquet``, ``.arrow`` or ``.feather`` file
+            chunk_size: Size of each chunk
+            chunk_overlap: Overlap between chunks
+            columns: Columns to read (all when omitted)
+
+        Yields:
+            Chunks with metadata
+        """
+        batch_rows = max(1, self.settings.spreadsheet_batch_rows)
+        rows = chunk_count = 0
+
+        try:
+            if os.path.splitext(file_path)[1].lower() == ".parquet":
+                batches = pq.ParquetFile(file_path).iter_batches(batch_size=batch_rows, columns=columns)
+            else:
+                batches = self._iter_ipc_batches(file_path, batch_rows, columns)
+
+            for batch in batches:
+                for chunk in _arrow_batch_chunks(batch, rows, chunk_size, chunk_overlap):
+                    chunk_count += 1
+                    yield chunk
+                rows += batch.num_rows
 
-            logger.info(f"Processed spreadsheet: {len(df)} rows -> {len(chunks)} chunks")
+            logger.info(f"Processed columnar file: {rows} rows -> {chunk_count} chunks")
 
         except Exception as e:
-            logger.error(f"Error processing spreadsheet: {e}")
+            logger.error(f"Error processing columnar file: {e}")
             raise
 
-        return chunks
+    @staticmethod
+    def _iter_ipc_batches(
+        file_path: str, batch_rows: int, columns: Optional[List[str]] = None
+    ) -> Iterator["pa.RecordBatch"]:
+        """Record batches of a memory-mapped Arrow IPC file (or stream), sliced to ``batch_rows``."""
+        with pa.memory_map(file_path) as source:
+            try:
+                reader = pa.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            except pa.ArrowInvalid:
+                source.seek(0)
+                batches = iter(pa.ipc.open_stream(source))
+            for batch in batches:
+                if columns:
+                    batch = batch.select(columns)
+                for start in range(0, batch.num_rows, batch_rows):
+                    yield batch.slice(start, batch_rows)
 
     async def _chunk_text(
         self, text: str, chunk_size: int = 1000, chunk_overlap: int = 200
@@ -147,38 +841,7 @@ class PreprocessService:
         Returns:
             List of chunks with metadata
         """
-        chunks = []
-        start = 0
-
-        while start < len(text):
-            end = start + chunk_size
-            chunk_text = text[start:end]
-
-            # Try to end at sentence boundary
-            if end < len(text):
-                last_period = chunk_text.rfind(".")
-                last_newline = chunk_text.rfind("\n")
-                boundary = max(last_period, last_newline)
-                if boundary > chunk_size * 0.5:  # Only adjust if reasonable
-                    end = start + boundary + 1
-                    chunk_text = text[start:end]
-
-            chunk = {
-                "text": chunk_text.strip(),
-                "metadata": {
-                    "chunk_start": start,
-                    "chunk_end": end,
-                    "chunk_length": len(chunk_text),
-                },
-            }
-            chunks.append(chunk)
-
-            # Move start position with overlap
-            start = end - chunk_overlap
-            if start >= len(text):
-                break
-
-        return chunks
+        return list(iter_text_chunks(io.StringIO(text), chunk_size, chunk_overlap))
 
     async def _process_image_ocr(self, file_path: str) -> List[Dict[str, Any]]:
         """
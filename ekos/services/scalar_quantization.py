@@ -0,0 +1,94 @@
+"""Scalar-quantized (int8 / float16) vector copies for cheap first-pass scans."""
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_KINDS = {"int8": 1, "float16": 2}
+CODE_DTYPES = {"int8": np.int8, "float16": np.float16}
+
+# Codes are widened to float32 one block at a time; keeping the widened block
+# cache-resident is what lets the scan read 1-2 bytes per element from memory
+_BLOCK_BYTES = 1 << 19
+
+
+def check_quantization(kind: Optional[str]) -> Optional[str]:
+    """Validate a quantization setting; ``None``, ``""`` and ``"none"`` disable it."""
+    if not kind or kind.lower() == "none":
+        return None
+    kind = kind.lower()
+    if kind not in QUANTIZATION_KINDS:
+        raise ValueError(f"Unknown vector quantization: {kind}")
+    return kind
+
+
+def empty_codes(rows: int, dim: int, kind: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Allocate zeroed ``(codes, scales)`` arrays for ``rows`` vectors."""
+    codes = np.zeros((rows, dim), dtype=CODE_DTYPES[kind])
+    scales = np.ones(rows, dtype=np.float32) if kind == "int8" else None
+    return codes, scales
+
+
+def quantize(vectors: np.ndarray, kind: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode float32 vectors.
+
+    ``int8`` uses a symmetric per-row scale, so no training is needed and rows
+    can be encoded one batch at a time; ``float16`` is a plain cast.
+
+    Args:
+        vectors: ``(n, dim)`` float32 matrix
+        kind: ``"int8"`` or ``"float16"``
+
+    Returns:
+        ``(codes, scales)``; ``scales`` is ``None`` for ``float16``
+    """
+    if kind == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedVectors:
+    """
+    Read-only scoring view over quantized codes (in memory or memory-mapped).
+
+    Scores approximate the float32 dot product; callers rescore a shortlist
+    against the full-precision vectors.
+    """
+
+    def __init__(self, kind: str, codes: np.ndarray, scales: Optional[np.ndarray] = None):
+        """
+        Initialize the view.
+
+        Args:
+            kind: ``"int8"`` or ``"float16"``
+            codes: ``(n, dim)`` codes
+            scales: ``(n,)`` per-row scales (``int8`` only)
+        """
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+        self.block_rows = max(64, _BLOCK_BYTES // (4 * max(codes.shape[1], 1)))
+
+    def block_scores(self, start: int, stop: int, queries: np.ndarray) -> np.ndarray:
+        """Approximate ``(q, stop - start)`` scores of ``queries`` against a row range."""
+        scores = np.empty((len(queries), stop - start), dtype=np.float32)
+        for sub in range(start, stop, self.block_rows):
+            end = min(sub + self.block_rows, stop)
+            scores[:, sub - start : end - start] = queries @ self.codes[sub:end].astype(np.float32).T
+        if self.scales is not None:
+            scores *= self.scales[start:stop]
+        return scores
+
+    def gather_scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate scores of one query against selected rows."""
+        scores = self.codes[rows].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        return scores
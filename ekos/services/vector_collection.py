@@ -0,0 +1,1030 @@
+"""Local vector collection: an in-memory index plus optional durable segments."""
+
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the single-writer rule is not enforced
+    fcntl = None
+
+from services.dim_reduction import Projection
+from services.lexical_index import LexicalIndex, MappedLexicalIndex, bm25_idf, lexical_block, tokenize
+from services.metadata_index import MetadataIndex
+from services.scalar_quantization import check_quantization
+from services.vector_index import VectorIndex, batch_top_k, normalize_rows
+from services.vector_segments import (
+    MANIFEST_NAME,
+    OP_UPSERT,
+    AppendLog,
+    Segment,
+    read_manifest,
+    segment_name,
+    write_manifest,
+    write_projection,
+    write_segment,
+)
+
+logger = logging.getLogger(__name__)
+
+_WRITER_LOCK = "writer.lock"
+_OWNED_FILE = re.compile(r"^(seg-\d+\.seg|seg-\d+\.\d+\.del|wal-\d+\.log|proj-\d+\.npz)(\.tmp)?$")
+# Rows projected per step when reducing a collection
+_REDUCE_BLOCK_ROWS = 65536
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """Check if metadata matches filter (simplified; list values match on any element)."""
+    for key, value in filter.items():
+        if key not in metadata:
+            return False
+        stored = metadata[key]
+        candidates = stored if isinstance(stored, list) else [stored]
+        if isinstance(value, dict):
+            # Support operators like $eq, $in, etc.
+            if "$in" in value:
+                if not any(item in value["$in"] for item in candidates):
+                    return False
+            elif "$eq" in value:
+                if stored != value["$eq"] and value["$eq"] not in candidates:
+                    return False
+        elif stored != value and value not in candidates:
+            return False
+    return True
+
+
+class VectorCollection:
+    """
+    Storage and search for the vectors served without Pinecone.
+
+    Upserts go to an in-memory index built by ``index_factory``. With a
+    ``directory`` every operation is also written to an append log, and after
+    ``segment_rows`` operations the unsealed vectors are written out as an
+    immutable segment. A restart maps the segments and replays only the log.
+
+    Exact indexes search sealed segments in place, straight from the mapping,
+    so only unsealed rows live in the in-memory index. Approximate indexes
+    need every vector in their own structure and are rebuilt from the
+    segments on load.
+
+    A collection can be ``reduce``d to fewer dimensions: its vectors are
+    rewritten through a ``Projection`` stored with it, and every later upsert
+    and query is projected the same way, so callers keep passing full-size
+    embeddings.
+
+    With a ``lexical_field`` the metadata text of every vector is also indexed
+    for BM25 ``lexical_search``: each sealed segment carries the postings of
+    its rows, mapped like its vectors, and only unsealed rows are indexed in
+    memory.
+
+    Deleted rows are tombstoned and skipped through the live masks;
+    ``compact`` rewrites segments (and rebuilds the in-memory index) once
+    their dead ratio crosses a threshold.
+
+    Only one process may write to a directory; it holds an exclusive lock
+    on ``writer.lock``. Any number of processes may open the directory
+    ``read_only``: they map the same segment files, so the sealed vectors
+    are shared through the page cache, and ``refresh`` follows the writer's
+    append log. Writes and compaction are serialized by a lock; searches
+    never take it.
+    """
+
+    def __init__(
+        self,
+        index_factory: Callable[[], VectorIndex],
+        directory: Optional[str] = None,
+        segment_rows: int = 50000,
+        fsync: bool = False,
+        filter_fields: Iterable[str] = (),
+        quantization: Optional[str] = None,
+        rescore_candidates: int = 256,
+        lexical_field: Optional[str] = None,
+        scan_executor: Optional[Executor] = None,
+        read_only: bool = False,
+    ):
+        """
+        Initialize the collection, loading any segments already in ``directory``.
+
+        Args:
+            index_factory: Creates the in-memory index
+            directory: Directory for segments and the append log (in-memory only if omitted)
+            segment_rows: Number of logged operations that triggers sealing a segment
+            fsync: Fsync the append log after every write
+            filter_fields: Metadata fields indexed for filtering
+            quantization: Store an ``"int8"`` or ``"float16"`` copy in sealed segments
+                and scan it first (exact mode only)
+            rescore_candidates: Shortlist size rescored in float32 after a quantized scan
+            lexical_field: Metadata field holding text to index for BM25 search
+            scan_executor: Optional thread pool scanning shards of sealed segments in parallel
+            read_only: Attach to a directory written by another process
+        """
+        self._index_factory = index_factory
+        self._index = index_factory()
+        self._in_place = not self._index.approximate
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        self.filter_fields = frozenset(filter_fields)
+        self.quantization = check_quantization(quantization) if self._in_place else None
+        self.rescore_candidates = rescore_candidates
+        self.scan_executor = scan_executor
+        # Posting lists over in-memory index rows
+        self._filter_index = MetadataIndex(self.filter_fields)
+        # BM25 index over unsealed vectors' text, with its own filter postings
+        self.lexical_field = lexical_field
+        self._lexical = LexicalIndex() if lexical_field else None
+        self._lexical_filter = MetadataIndex(self.filter_fields)
+        # Approximate mode only: vectors upserted since the last seal
+        self._unsealed: Dict[str, np.ndarray] = {}
+
+        self.directory = directory
+        self.segment_rows = max(1, segment_rows)
+        self.fsync = fsync
+        self.dim: Optional[int] = None
+        self.projection: Optional[Projection] = None
+        self._projection_name: Optional[str] = None
+        self.generation = 0
+        self._next_segment = 1
+        self._segments: List[Segment] = []
+        # Lazily built: id -> (position in self._segments, row) for live sealed rows
+        self._locations: Optional[Dict[str, Tuple[int, int]]] = None
+        self._log: Optional[AppendLog] = None
+        self._lock = threading.RLock()
+        self.read_only = read_only
+        self._writer_lock = None
+        # (inode, mtime) of the manifest this collection was loaded from
+        self._manifest_stamp: Optional[Tuple[int, int]] = None
+
+        if directory:
+            self._load()
+
+    def __len__(self) -> int:
+        """Number of live vectors."""
+        if not self._in_place:
+            return len(self._index)
+        return len(self._index) + sum(len(segment) for segment in self._segments)
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and memory statistics for this collection."""
+        return {
+            "vectors": len(self),
+            "segments": len(self._segments),
+            "logged_operations": self._log.records if self._log is not None else 0,
+            "dead_ratio": round(self.dead_ratio(), 4),
+            "memory_bytes": self._index.memory_bytes() + self._filter_index.memory_bytes(),
+            "lexical_bytes": self._lexical.memory_bytes() + self._lexical_filter.memory_bytes()
+            if self._lexical is not None
+            else 0,
+            "mapped_bytes": sum(os.path.getsize(segment.path) for segment in self._segments),
+            "dim": self.dim,
+            "projection": self.projection.describe() if self.projection is not None else None,
+        }
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"wal-{generation:06d}.log")
+
+    def _manifest_version(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.directory, MANIFEST_NAME))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _acquire_writer_lock(self) -> None:
+        if fcntl is None:
+            return
+        self._writer_lock = open(os.path.join(self.directory, _WRITER_LOCK), "a")
+        try:
+            fcntl.flock(self._writer_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._writer_lock.close()
+            self._writer_lock = None
+            raise RuntimeError(
+                f"Vector collection {self.directory} is already open for writing by another process; "
+                f"only the ingest worker writes, open it read-only (VECTOR_STORE_ROLE=reader) instead"
+            )
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise RuntimeError(f"Vector collection {self.directory} is open read-only")
+
+    def _load(self) -> None:
+        """Map committed segments and replay the append log."""
+        if self.read_only:
+            if not os.path.isdir(self.directory):
+                return
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            self._acquire_writer_lock()
+        self._manifest_stamp = self._manifest_version()
+        manifest = read_manifest(self.directory)
+        if manifest:
+            self.dim = manifest["dim"]
+            self.generation = manifest["generation"]
+            self._next_segment = manifest["next_segment"]
+            self._segments = [
+                Segment(self.directory, entry["name"], entry.get("deletes"))
+                for entry in manifest["segments"]
+            ]
+            self._projection_name = manifest.get("projection")
+            if self._projection_name:
+                self.projection = Projection.load(os.path.join(self.directory, self._projection_name))
+
+        if not self._in_place:
+            self._index_segments()
+        if self._lexical is not None:
+            self._attach_lexical(self._segments)
+
+        self._log = AppendLog(self._log_path(self.generation), self.dim, self.fsync)
+        self._replay_log()
+
+        logger.info(
+            f"Loaded vector collection from {self.directory}: {len(self._segments)} segments, "
+            f"{self._log.records} logged operations"
+        )
+
+    def _replay_log(self) -> int:
+        """Apply log records not replayed yet; returns how many were applied."""
+        positions = {segment.sequence: i for i, segment in enumerate(self._segments)}
+        applied = 0
+        for op, vector_id, vector, metadata, sequence, row in self._log.replay(tailing=self.read_only):
+            if sequence >= 0:
+                self._segments[positions[sequence]].delete_row(row)
+                if self._locations is not None:
+                    self._locations.pop(vector_id, None)
+            if op == OP_UPSERT:
+                self._apply_upserts([vector_id], vector[None, :], [metadata])
+            else:
+                self._apply_deletes([vector_id])
+            applied += 1
+        return applied
+
+    def refresh(self) -> bool:
+        """
+        Catch up with the writer (read-only collections).
+
+        Records the writer appended to the current generation's log are
+        applied in place. A newly published generation can't be followed
+        incrementally (segments were sealed or merged), so the caller must
+        reopen the directory.
+
+        Returns:
+            ``False`` if a new generation was published and the collection must be reopened
+        """
+        if not self.read_only or not self.directory:
+            return True
+        if self._manifest_version() != self._manifest_stamp:
+            return False
+        if self._log is not None:
+            with self._lock:
+                applied = self._replay_log()
+            if applied:
+                logger.debug(f"Applied {applied} logged operations from {self._log.path}")
+        return True
+
+    def _index_segments(self) -> None:
+        """Add every live sealed row to the in-memory index (approximate mode)."""
+        for segment in self._segments:
+            rows = np.flatnonzero(segment.live)
+            ids = [segment.id_at(row) for row in rows]
+            if ids:
+                self._index_add(ids, segment.vectors[rows], [segment.metadata_at(row) for row in rows])
+
+    def _attach_lexical(self, segments: Sequence[Segment]) -> None:
+        """Map each segment's BM25 postings; index segments written without them in the background."""
+        missing = []
+        for segment in segments:
+            postings = segment.lexical_postings()
+            if postings is not None and postings.field == self.lexical_field:
+                segment.lexical = postings
+            else:
+                missing.append(segment)
+        if missing:
+            logger.info(f"Indexing the text of {len(missing)} segments without BM25 postings in {self.directory}")
+            threading.Thread(target=self._build_lexical, args=(missing,), name="lexical-build", daemon=True).start()
+
+    def _build_lexical(self, segments: Sequence[Segment]) -> None:
+        """Index segments written without BM25 postings; lexical search skips each one until it is done."""
+        for segment in segments:
+            metadata = [segment.metadata_at(row) for row in range(segment.count)]
+            segment.lexical = MappedLexicalIndex(lexical_block(self._lexical_texts(metadata), self.lexical_field))
+
+    def _lexical_texts(self, metadata: Sequence[Dict[str, Any]]) -> List[str]:
+        return [str(md.get(self.lexical_field) or "") for md in metadata]
+
+    def _lexical_add(self, ids: Sequence[str], metadata: Sequence[Dict[str, Any]]) -> None:
+        self._lexical_filter.add(self._lexical.add(ids, self._lexical_texts(metadata)), metadata)
+
+    def _metadata_of(self, vector_id: str) -> Dict[str, Any]:
+        """Metadata of a live vector, wherever it is stored."""
+        if vector_id in self._metadata:
+            return self._metadata[vector_id]
+        location = self._sealed_locations().get(vector_id) if self._in_place else None
+        if location is None:
+            return {}
+        return self._segments[location[0]].metadata_at(location[1])
+
+    def _sealed_locations(self) -> Dict[str, Tuple[int, int]]:
+        """Map live sealed ids to their segment rows (decodes id tables on first use)."""
+        if self._locations is None:
+            self._locations = {}
+            for position, segment in enumerate(self._segments):
+                for row in np.flatnonzero(segment.live).tolist():
+                    self._locations[segment.id_at(row)] = (position, row)
+        return self._locations
+
+    def _tombstone_sealed(self, ids: Sequence[str]) -> List[Optional[Tuple[int, int]]]:
+        """Tombstone sealed rows holding ``ids``; return ``(segment sequence, row)`` per id."""
+        if not self._segments:
+            return [None] * len(ids)
+        locations = self._sealed_locations()
+        replaced: List[Optional[Tuple[int, int]]] = []
+        for vector_id in ids:
+            location = locations.pop(vector_id, None)
+            if location is None:
+                replaced.append(None)
+                continue
+            segment = self._segments[location[0]]
+            segment.delete_row(location[1])
+            replaced.append((segment.sequence, location[1]))
+        return replaced
+
+    def _index_add(self, ids: Sequence[str], matrix: np.ndarray, metadata: Sequence[Dict[str, Any]]) -> None:
+        """Add to the in-memory index and keep its posting lists in step."""
+        old_rows = [self._index.row_of(vector_id) for vector_id in ids]
+        rows = self._index.add(ids, matrix)
+        # Rows overwritten in place only need their changed postings updated
+        previous = [
+            self._metadata.get(vector_id) if old_row == row else None
+            for vector_id, old_row, row in zip(ids, old_rows, rows.tolist())
+        ]
+        self._filter_index.add(rows, metadata, previous)
+        self._metadata.update(zip(ids, metadata))
+
+    def _apply_upserts(
+        self, ids: Sequence[str], matrix: np.ndarray, metadata: Sequence[Dict[str, Any]]
+    ) -> None:
+        self._index_add(ids, matrix, metadata)
+        if self._lexical is not None:
+            self._lexical_add(ids, metadata)
+        if not self._in_place:
+            self._unsealed.update(zip(ids, matrix))
+
+    def _apply_deletes(self, ids: Sequence[str]) -> int:
+        removed = self._index.remove(ids)
+        if self._lexical is not None:
+            self._lexical.remove(ids)
+        for vector_id in ids:
+            self._metadata.pop(vector_id, None)
+            self._unsealed.pop(vector_id, None)
+        return removed
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        vectors,
+        metadata: Sequence[Dict[str, Any]],
+    ) -> int:
+        """
+        Insert or overwrite vectors.
+
+        Args:
+            ids: Vector IDs
+            vectors: One vector per id
+            metadata: One metadata dict per id
+
+        Returns:
+            Number of vectors written
+        """
+        self._check_writable()
+        if len(ids) == 0:
+            return 0
+        matrix = self._project(normalize_rows(vectors))
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+            if self.directory:
+                # Readers and restarts need the dimension to decode the log
+                with self._lock:
+                    self._write_manifest(self._segments)
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {matrix.shape[1]}")
+
+        with self._lock:
+            replaced = self._tombstone_sealed(ids)
+            if self._log is not None:
+                self._log.dim = self.dim
+                self._log.append_upserts(ids, matrix, metadata, replaced)
+            self._apply_upserts(ids, matrix, metadata)
+            self._maybe_seal()
+        return len(ids)
+
+    def _project(self, matrix: np.ndarray) -> np.ndarray:
+        """Map normalized full-size vectors into this collection's (possibly reduced) space."""
+        if self.projection is None:
+            return matrix
+        return normalize_rows(self.projection.apply(matrix))
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """
+        Delete vectors by id.
+
+        Returns:
+            Number of vectors deleted
+        """
+        self._check_writable()
+        with self._lock:
+            replaced = self._tombstone_sealed(ids)
+            if self._log is not None:
+                self._log.append_deletes(ids, replaced)
+            removed = self._apply_deletes(ids)
+            if self._in_place:
+                removed += sum(location is not None for location in replaced)
+            self._maybe_seal()
+        return removed
+
+    def ids_matching(self, filter: Dict[str, Any]) -> List[str]:
+        """
+        Return the ids of all live vectors whose metadata matches ``filter``.
+
+        Indexed fields (``doc_id`` among them by default) are answered from
+        posting lists, so looking up a document's chunks doesn't decode metadata.
+        """
+        mask = self._index_filter_mask(filter)
+        ids = [self._index.id_at(row) for row in np.flatnonzero(mask).tolist()]
+        if self._in_place:
+            for segment in self._segments:
+                rows = np.flatnonzero(self._segment_filter_mask(segment, filter))
+                ids.extend(segment.id_at(row) for row in rows.tolist())
+        return ids
+
+    def field_values(self, filter: Dict[str, Any], field: str) -> Dict[str, Any]:
+        """Map the ids of live vectors matching ``filter`` to ``field`` of their metadata (if set)."""
+        values = {}
+        for vector_id in self.ids_matching(filter):
+            value = self._metadata_of(vector_id).get(field)
+            if value is not None:
+                values[vector_id] = value
+        return values
+
+    def delete_by_filter(self, filter: Dict[str, Any]) -> int:
+        """
+        Delete every vector whose metadata matches ``filter``.
+
+        Returns:
+            Number of vectors deleted
+        """
+        if not filter:
+            raise ValueError("delete_by_filter requires a non-empty filter")
+        with self._lock:
+            return self.delete(self.ids_matching(filter))
+
+    def search(
+        self,
+        vector,
+        top_k: int = 5,
+        filter: Optional[Dict[str, Any]] = None,
+        include_metadata: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the ``top_k`` most similar vectors as ``{"id", "score", "metadata"}`` dicts.
+
+        Args:
+            vector: Query vector
+            top_k: Number of results to return
+            filter: Optional metadata filter
+            include_metadata: Whether to include metadata in results
+        """
+        return self.search_batch(normalize_rows(vector)[:1], top_k, [filter], include_metadata)[0]
+
+    def search_batch(
+        self,
+        vectors,
+        top_k: int = 5,
+        filters: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+        include_metadata: bool = True,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several queries in one pass over the index and sealed segments.
+
+        Exact scans share matrix-matrix products across the queries and each
+        distinct filter is resolved once.
+
+        Args:
+            vectors: Query vectors, one per row
+            top_k: Number of results per query
+            filters: Optional metadata filter per query
+            include_metadata: Whether to include metadata in results
+
+        Returns:
+            One list of ``{"id", "score", "metadata"}`` dicts per query
+        """
+        queries = normalize_rows(vectors)
+        if top_k <= 0 or self.dim is None:
+            return [[] for _ in queries]
+        queries = self._project(queries)
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional query, got {queries.shape[1]}")
+        filters = list(filters) if filters is not None else [None] * len(queries)
+        if len(filters) != len(queries):
+            raise ValueError(f"Got {len(filters)} filters for {len(queries)} queries")
+
+        # (score, id, metadata getter) per query
+        hits: List[List[Tuple[float, str, Callable[[], Dict[str, Any]]]]] = [[] for _ in queries]
+
+        masks = self._batch_masks(filters, self._index_filter_mask)
+        for query_hits, results in zip(hits, self._index.search_batch(queries, top_k, masks)):
+            for vector_id, score in results:
+                query_hits.append((score, vector_id, lambda vector_id=vector_id: self._metadata.get(vector_id, {})))
+
+        if self._in_place:
+            for segment in self._segments:
+                masks = self._batch_masks(
+                    filters, lambda filter: self._segment_filter_mask(segment, filter), segment.live
+                )
+                scanned = batch_top_k(
+                    segment.vectors,
+                    queries,
+                    masks,
+                    top_k,
+                    segment.quantized,
+                    self.rescore_candidates,
+                    self.scan_executor,
+                )
+                for query_hits, (rows, scores) in zip(hits, scanned):
+                    for row, score in zip(rows.tolist(), scores.tolist()):
+                        query_hits.append(
+                            (score, segment.id_at(row), lambda segment=segment, row=row: segment.metadata_at(row))
+                        )
+
+        results = []
+        for query_hits in hits:
+            query_hits.sort(key=lambda hit: hit[0], reverse=True)
+            results.append(
+                [
+                    {
+                        "id": vector_id,
+                        "score": score,
+                        "metadata": get_metadata() if include_metadata else {},
+                    }
+                    for score, vector_id, get_metadata in query_hits[:top_k]
+                ]
+            )
+        return results
+
+    def lexical_search(
+        self,
+        text: str,
+        top_k: int = 5,
+        filter: Optional[Dict[str, Any]] = None,
+        include_metadata: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the ``top_k`` best BM25 matches for ``text`` as ``{"id", "score", "metadata"}`` dicts.
+
+        Args:
+            text: Query text
+            top_k: Number of results to return
+            filter: Optional metadata filter
+            include_metadata: Whether to include metadata in results
+        """
+        if self._lexical is None or top_k <= 0:
+            return []
+        # In-memory rows first: a concurrent flush moves them into a new
+        # segment, so a row may be seen twice but never missed
+        lexical, lexical_filter = self._lexical, self._lexical_filter
+        segments = [segment for segment in self._segments if segment.lexical is not None]
+
+        def memory_metadata(row: int) -> Dict[str, Any]:
+            return self._metadata_of(lexical.id_at(row))
+
+        allowed = lexical.live_mask()
+        if filter:
+            allowed = self._filter_mask(lexical_filter, filter, allowed, memory_metadata)
+        # (postings, allowed rows, id_at, metadata_at) per source
+        sources = [(lexical, allowed, lexical.id_at, memory_metadata)]
+        for segment in segments:
+            allowed = self._segment_filter_mask(segment, filter) if filter else segment.live
+            sources.append((segment.lexical, allowed, segment.id_at, segment.metadata_at))
+
+        # Score every source against collection-wide statistics
+        tokens = list(dict.fromkeys(tokenize(text)))
+        rows = len(lexical) + sum(len(segment) for segment in segments)
+        df: Dict[str, int] = {}
+        for postings, _, _, _ in sources:
+            for token, count in postings.document_frequencies(tokens).items():
+                df[token] = df.get(token, 0) + count
+        idf = {token: bm25_idf(rows, count) for token, count in df.items()}
+
+        hits: Dict[str, Tuple[float, Callable[[], Dict[str, Any]]]] = {}
+        for postings, allowed, id_at, metadata_at in sources:
+            found, scores = postings.top_rows(tokens, idf, top_k, allowed)
+            for row, score in zip(found.tolist(), scores.tolist()):
+                vector_id = id_at(row)
+                if vector_id not in hits or score > hits[vector_id][0]:
+                    hits[vector_id] = (score, lambda metadata_at=metadata_at, row=row: metadata_at(row))
+        best = sorted(hits.items(), key=lambda hit: hit[1][0], reverse=True)[:top_k]
+        return [
+            {
+                "id": vector_id,
+                "score": score,
+                "metadata": get_metadata() if include_metadata else {},
+            }
+            for vector_id, (score, get_metadata) in best
+        ]
+
+    @staticmethod
+    def _batch_masks(
+        filters: Sequence[Optional[Dict[str, Any]]],
+        resolve: Callable[[Dict[str, Any]], np.ndarray],
+        unfiltered: Optional[np.ndarray] = None,
+    ) -> List[Optional[np.ndarray]]:
+        """Resolve each distinct filter once; unfiltered queries get ``unfiltered``."""
+        resolved: Dict[str, np.ndarray] = {}
+        masks = []
+        for filter in filters:
+            if not filter:
+                masks.append(unfiltered)
+                continue
+            key = json.dumps(filter, sort_keys=True, default=str)
+            if key not in resolved:
+                resolved[key] = resolve(filter)
+            masks.append(resolved[key])
+        return masks
+
+    @staticmethod
+    def _filter_mask(
+        filter_index: MetadataIndex,
+        filter: Dict[str, Any],
+        live: np.ndarray,
+        metadata_at: Callable[[int], Dict[str, Any]],
+    ) -> np.ndarray:
+        """
+        Resolve ``filter`` to a mask over live rows.
+
+        Indexed clauses are answered from posting lists; residual clauses are
+        checked against the metadata of the surviving rows only.
+        """
+        mask, residual = filter_index.resolve(filter, len(live))
+        allowed = live.copy() if mask is None else live & mask
+        if residual:
+            for row in np.flatnonzero(allowed).tolist():
+                allowed[row] = matches_filter(metadata_at(row), residual)
+        return allowed
+
+    def _index_filter_mask(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask over in-memory index rows whose metadata matches ``filter``."""
+        index = self._index
+        return self._filter_mask(
+            self._filter_index,
+            filter,
+            index.live_mask(),
+            lambda row: self._metadata.get(index.id_at(row), {}),
+        )
+
+    def _segment_filter_index(self, segment: Segment) -> MetadataIndex:
+        """Posting lists for a segment: mapped from the file, or built once from its metadata."""
+        if segment.filter_index is None:
+            postings = segment.postings()
+            if postings is not None:
+                fields = self.filter_fields.intersection(postings)
+                segment.filter_index = MetadataIndex(fields, {f: postings[f] for f in fields})
+            else:
+                segment.filter_index = MetadataIndex(self.filter_fields)
+                segment.filter_index.add(range(segment.count), segment.metadata_list())
+        return segment.filter_index
+
+    def _segment_filter_mask(self, segment: Segment, filter: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask over a segment's live rows whose metadata matches ``filter``."""
+        return self._filter_mask(self._segment_filter_index(segment), filter, segment.live, segment.metadata_at)
+
+    def _maybe_seal(self) -> None:
+        if self._log is not None and self._log.records >= self.segment_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Seal unsealed vectors into a new segment and persist tombstones.
+
+        Publishes a new generation through the manifest, starts a fresh append
+        log and removes files no longer referenced.
+        """
+        if not self.directory or self.dim is None or self.read_only:
+            return
+
+        with self._lock:
+            if self._in_place:
+                ids, vectors = self._index.live_items()
+            else:
+                ids = list(self._unsealed)
+                vectors = np.stack([self._unsealed[vector_id] for vector_id in ids]) if ids else None
+            if not ids and not any(segment.dirty for segment in self._segments) and not self._log.records:
+                return
+
+            self.generation += 1
+            segments = list(self._segments)
+            if ids:
+                metadata = [self._metadata.get(vector_id, {}) for vector_id in ids]
+                segments.append(self._write_segment(ids, vectors, metadata))
+            self._publish(segments)
+
+            if ids:
+                position = len(self._segments)
+                if self._locations is not None:
+                    self._locations.update((vector_id, (position, row)) for row, vector_id in enumerate(ids))
+                if self._in_place:
+                    self._index = self._index_factory()
+                    self._metadata = {}
+                    self._filter_index = MetadataIndex(self.filter_fields)
+                else:
+                    self._unsealed = {}
+            self._segments = segments
+            if self._lexical is not None:
+                # Every live row's text is now in a segment's postings
+                self._lexical = LexicalIndex()
+                self._lexical_filter = MetadataIndex(self.filter_fields)
+            self._remove_unreferenced()
+        logger.info(f"Sealed vector collection generation {self.generation}: {len(ids)} new rows")
+
+    def _write_segment(
+        self, ids: Sequence[str], vectors: np.ndarray, metadata: Sequence[Dict[str, Any]]
+    ) -> Segment:
+        """Write a new segment with its posting lists and return it mapped."""
+        name = segment_name(self._next_segment)
+        self._next_segment += 1
+        postings = MetadataIndex(self.filter_fields)
+        postings.add(range(len(ids)), metadata)
+        write_segment(
+            os.path.join(self.directory, f"{name}.seg"),
+            ids,
+            vectors,
+            metadata,
+            postings=postings.export(),
+            quantization=self.quantization,
+            lexical=lexical_block(self._lexical_texts(metadata), self.lexical_field) if self.lexical_field else None,
+            fsync=self.fsync,
+        )
+        segment = Segment(self.directory, name)
+        if self._lexical is not None:
+            segment.lexical = segment.lexical_postings()
+        return segment
+
+    def _publish(self, segments: List[Segment]) -> None:
+        """Persist dirty tombstones, commit ``segments`` as ``self.generation`` and start its log."""
+        for segment in segments:
+            if segment.dirty:
+                segment.write_deletes(self.generation, fsync=self.fsync)
+        self._write_manifest(segments)
+        self._log.close()
+        self._log = AppendLog(self._log_path(self.generation), self.dim, self.fsync)
+
+    def _write_manifest(self, segments: List[Segment]) -> None:
+        write_manifest(
+            self.directory,
+            {
+                "version": 1,
+                "dim": self.dim,
+                "generation": self.generation,
+                "next_segment": self._next_segment,
+                "segments": [{"name": s.name, "deletes": s.deletes} for s in segments],
+                "projection": self._projection_name,
+            },
+            fsync=self.fsync,
+        )
+
+    def dead_ratio(self) -> float:
+        """Fraction of stored rows that are tombstoned (worst of segments and in-memory index)."""
+        sealed = sum(segment.count for segment in self._segments)
+        sealed_dead = sealed - sum(len(segment) for segment in self._segments)
+        indexed, indexed_dead = self._index.row_count, self._index.row_count - len(self._index)
+        if self._in_place:
+            # Disjoint rows: one combined ratio
+            sealed, sealed_dead = sealed + indexed, sealed_dead + indexed_dead
+        counts = [(sealed, sealed_dead), (indexed, indexed_dead)]
+        if self._lexical is not None:
+            counts.append((self._lexical.row_count, self._lexical.row_count - len(self._lexical)))
+        ratios = [dead / rows for rows, dead in counts if rows]
+        return max(ratios, default=0.0)
+
+    def compact(self, min_dead_ratio: float = 0.3) -> int:
+        """
+        Reclaim space held by deleted and overwritten rows.
+
+        Segments whose dead ratio is at least ``min_dead_ratio`` are merged,
+        live rows only, into one new segment published as a new generation.
+        An in-memory index over the same threshold is rebuilt from its live
+        rows (approximate indexes are rebuilt from the segments).
+
+        Args:
+            min_dead_ratio: Dead-row fraction at which a segment or index is rewritten
+
+        Returns:
+            Number of dead rows reclaimed
+        """
+        if self.read_only:
+            return 0
+        with self._lock:
+            reclaimed = 0
+            if self.directory and self.dim is not None:
+                # Seal first: the log refers to rows of the segments being replaced
+                self.flush()
+                victims = [
+                    segment
+                    for segment in self._segments
+                    if segment.count and 1 - len(segment) / segment.count >= min_dead_ratio
+                ]
+                if victims:
+                    reclaimed += self._merge_segments(victims)
+
+            index = self._index
+            if index.row_count and 1 - len(index) / index.row_count >= min_dead_ratio:
+                dead = index.row_count - len(index)
+                # Approximate indexes hold the same rows as the segments; don't count them twice
+                reclaimed = reclaimed + dead if self._in_place else max(reclaimed, dead)
+                self._rebuild_index()
+
+            lexical = self._lexical
+            if lexical is not None and lexical.row_count and 1 - len(lexical) / lexical.row_count >= min_dead_ratio:
+                ids = [lexical.id_at(row) for row in np.flatnonzero(lexical.live_mask()).tolist()]
+                metadata = [self._metadata_of(vector_id) for vector_id in ids]
+                self._lexical = LexicalIndex()
+                self._lexical_filter = MetadataIndex(self.filter_fields)
+                self._lexical_add(ids, metadata)
+                logger.info(f"Rebuilt lexical index: {lexical.row_count - len(ids)} dead rows dropped")
+        if reclaimed:
+            logger.info(f"Compacted vector collection: reclaimed {reclaimed} dead rows")
+        return reclaimed
+
+    def _merge_segments(self, victims: List[Segment]) -> int:
+        """Replace ``victims`` by one segment holding their live rows."""
+        ids: List[str] = []
+        vectors: List[np.ndarray] = []
+        metadata: List[Dict[str, Any]] = []
+        for segment in victims:
+            rows = np.flatnonzero(segment.live)
+            ids.extend(segment.id_at(row) for row in rows.tolist())
+            vectors.append(segment.vectors[rows])
+            metadata.extend(segment.metadata_at(row) for row in rows.tolist())
+
+        self.generation += 1
+        segments = [segment for segment in self._segments if segment not in victims]
+        if ids:
+            segments.append(self._write_segment(ids, np.concatenate(vectors), metadata))
+        self._publish(segments)
+        self._segments = segments
+        self._locations = None
+        self._remove_unreferenced()
+        return sum(segment.count - len(segment) for segment in victims)
+
+    def _rebuild_index(self) -> None:
+        """Recreate the in-memory index and its posting lists without dead rows."""
+        if not self._in_place and self.directory:
+            # Everything is sealed at this point; segments hold the live rows
+            self._index = self._index_factory()
+            self._filter_index = MetadataIndex(self.filter_fields)
+            self._index_segments()
+            return
+        if not hasattr(self._index, "live_items"):
+            # Compressed indexes without a backing store can't be rebuilt
+            return
+        ids, vectors = self._index.live_items()
+        self._index = self._index_factory()
+        self._filter_index = MetadataIndex(self.filter_fields)
+        self._metadata, metadata = {}, [self._metadata.get(vector_id, {}) for vector_id in ids]
+        if ids:
+            self._index_add(ids, vectors, metadata)
+
+    def _live_sources(
+        self,
+    ) -> List[Tuple[np.ndarray, np.ndarray, Callable[[int], str], Callable[[int], Dict[str, Any]]]]:
+        """``(vectors, live rows, id_at, metadata_at)`` for every place live vectors are stored."""
+        if not self._in_place and self.directory:
+            ids = list(self._unsealed)
+            vectors = (
+                np.stack([self._unsealed[vector_id] for vector_id in ids])
+                if ids
+                else np.empty((0, self.dim or 0), dtype=np.float32)
+            )
+        elif hasattr(self._index, "live_items"):
+            ids, vectors = self._index.live_items()
+        else:
+            raise ValueError("This index type does not keep its vectors and can't export them")
+        sources = [
+            (vectors, np.arange(len(ids)), ids.__getitem__, lambda i, ids=ids: self._metadata.get(ids[i], {}))
+        ]
+        sources.extend(
+            (segment.vectors, np.flatnonzero(segment.live), segment.id_at, segment.metadata_at)
+            for segment in self._segments
+        )
+        return sources
+
+    def sample_vectors(self, n: int, seed: int = 0) -> np.ndarray:
+        """
+        Draw up to ``n`` live vectors uniformly at random, as stored (after any projection).
+
+        Args:
+            n: Sample size
+            seed: Random seed
+
+        Returns:
+            ``(min(n, len(self)), dim)`` float32 array
+        """
+        sources = self._live_sources()
+        offsets = np.cumsum([0] + [len(rows) for _, rows, _, _ in sources])
+        picks = np.sort(np.random.default_rng(seed).choice(offsets[-1], min(n, offsets[-1]), replace=False))
+        parts = [np.empty((0, self.dim or 0), dtype=np.float32)]
+        for (vectors, rows, _, _), start, end in zip(sources, offsets[:-1], offsets[1:]):
+            local = picks[(picks >= start) & (picks < end)] - start
+            if len(local):
+                parts.append(vectors[rows[local]])
+        return np.concatenate(parts)
+
+    def reduce(self, projection: Projection) -> int:
+        """
+        Rewrite every live vector through ``projection`` and keep it for later upserts and queries.
+
+        With a directory, the reduced vectors are sealed into one segment and
+        the projection is published with the new generation, so readers and
+        restarts pick it up from the manifest. The full-size vectors are not
+        kept: reducing again later needs a re-embed.
+
+        Args:
+            projection: Projection from the current dimension
+
+        Returns:
+            Number of vectors rewritten
+        """
+        self._check_writable()
+        with self._lock:
+            if self.projection is not None:
+                raise ValueError(f"Vector collection is already reduced to {self.dim} dimensions")
+            if self.dim != projection.input_dim:
+                raise ValueError(
+                    f"Cannot apply a {projection.input_dim}-dimensional projection to {self.dim} dimensions"
+                )
+
+            ids: List[str] = []
+            metadata: List[Dict[str, Any]] = []
+            parts = [np.empty((0, projection.output_dim), dtype=np.float32)]
+            for vectors, rows, id_at, metadata_at in self._live_sources():
+                for start in range(0, len(rows), _REDUCE_BLOCK_ROWS):
+                    parts.append(normalize_rows(projection.apply(vectors[rows[start : start + _REDUCE_BLOCK_ROWS]])))
+                ids.extend(id_at(row) for row in rows.tolist())
+                metadata.extend(metadata_at(row) for row in rows.tolist())
+            reduced = np.concatenate(parts)
+
+            self.projection = projection
+            self.dim = projection.output_dim
+            self._index = self._index_factory()
+            self._metadata = {}
+            self._filter_index = MetadataIndex(self.filter_fields)
+            self._unsealed = {}
+            if self.directory:
+                self.generation += 1
+                self._projection_name = f"proj-{self.generation:06d}.npz"
+                write_projection(
+                    os.path.join(self.directory, self._projection_name), projection.to_bytes(), self.fsync
+                )
+                segments = [self._write_segment(ids, reduced, metadata)] if ids else []
+                self._publish(segments)
+                self._segments = segments
+                self._locations = None
+                if self._lexical is not None:
+                    self._lexical = LexicalIndex()
+                    self._lexical_filter = MetadataIndex(self.filter_fields)
+                if not self._in_place:
+                    self._index_segments()
+                self._remove_unreferenced()
+            elif ids:
+                self._index_add(ids, reduced, metadata)
+        logger.info(
+            f"Reduced vector collection to {projection.output_dim} dimensions ({projection.method}): "
+            f"{len(ids)} vectors rewritten"
+        )
+        return len(ids)
+
+    def _remove_unreferenced(self) -> None:
+        """Delete segment, tombstone and log files not referenced by the current generation."""
+        keep = {f"{s.name}.seg" for s in self._segments}
+        keep.update(s.deletes for s in self._segments if s.deletes)
+        keep.add(os.path.basename(self._log.path))
+        if self._projection_name:
+            keep.add(self._projection_name)
+        for entry in os.listdir(self.directory):
+            if _OWNED_FILE.match(entry) and entry not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, entry))
+                except OSError as e:
+                    logger.warning(f"Could not remove stale vector file {entry}: {e}")
+
+    def close(self) -> None:
+        """Close the append log and release the writer lock."""
+        if self._log is not None:
+            self._log.close()
+        if self._writer_lock is not None:
+            self._writer_lock.close()
+            self._writer_lock = None
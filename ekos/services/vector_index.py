@@ -0,0 +1,507 @@
+"""In-process vector indexes backing the local (non-Pinecone) vector store."""
+
+import logging
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.scalar_quantization import QuantizedVectors, check_quantization, empty_codes, quantize
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Convert vectors to a contiguous float32 matrix with unit-length rows.
+
+    Args:
+        vectors: A single vector or a sequence of vectors
+
+    Returns:
+        2-D float32 array; zero vectors are left as zeros
+    """
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2, copy=True)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return the indices of the ``k`` highest scores, best first.
+
+    Uses ``argpartition`` so only the selected ``k`` entries are sorted.
+    """
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+# Rows scored per matrix-matrix block in batched scans; bounds the temporary
+# score matrix to ``queries x _BATCH_BLOCK_ROWS`` floats
+_BATCH_BLOCK_ROWS = 16384
+
+# Smallest row range worth handing to another scan thread
+_MIN_SHARD_ROWS = 32768
+
+
+class ScanExecutor(ThreadPoolExecutor):
+    """Thread pool for sharded scans; scans are split into at most ``workers`` shards."""
+
+    def __init__(self, workers: int):
+        """
+        Initialize the pool.
+
+        Args:
+            workers: Number of scan threads
+        """
+        super().__init__(max_workers=workers, thread_name_prefix="vector-scan")
+        self.workers = workers
+
+
+def batch_top_k(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    allowed: Sequence[np.ndarray],
+    top_k: int,
+    quantized: Optional[QuantizedVectors] = None,
+    rescore_candidates: int = 256,
+    executor: Optional[Executor] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Exact top-k for several queries over one matrix, restricted per query by a mask.
+
+    Queries with a selective mask gather their permitted rows and score only
+    those. The rest share blockwise matrix-matrix products, so the matrix is
+    streamed once for all of them. With ``quantized`` codes the scan runs on
+    the small copy and only the best ``rescore_candidates`` rows per query are
+    rescored against ``vectors``.
+
+    With an ``executor`` the matrix is split into contiguous shards scanned on
+    its threads (BLAS and the top-k selection release the GIL); each shard
+    keeps its own top-k and the shards are merged at the end.
+
+    Args:
+        vectors: ``(n, dim)`` float32 matrix (may be a memory-mapped view)
+        queries: ``(q, dim)`` normalized queries
+        allowed: One boolean mask over the first ``n`` rows per query
+        top_k: Number of results per query
+        quantized: Optional quantized copy of ``vectors`` for the first pass
+        rescore_candidates: Shortlist size rescored in float32
+        executor: Optional thread pool for sharded scans
+
+    Returns:
+        ``(rows, scores)`` per query, best first
+    """
+    if quantized is None:
+        return _scan_top_k(
+            lambda start, stop, shared: shared @ vectors[start:stop].T,
+            lambda rows, query: vectors[rows] @ query,
+            queries,
+            allowed,
+            top_k,
+            executor,
+        )
+
+    shortlists = _scan_top_k(
+        quantized.block_scores,
+        quantized.gather_scores,
+        queries,
+        allowed,
+        max(top_k, rescore_candidates),
+        executor,
+    )
+    results = []
+    for query, (rows, _) in zip(queries, shortlists):
+        # Sorted rows turn the rescoring gather into a forward scan of the mapping
+        rows = np.sort(rows)
+        scores = vectors[rows] @ query
+        best = top_k_indices(scores, top_k)
+        results.append((rows[best], scores[best]))
+    return results
+
+
+def _shard_bounds(n: int, executor: Optional[Executor]) -> List[Tuple[int, int]]:
+    """Split ``n`` rows into contiguous ranges of at least ``_MIN_SHARD_ROWS``, one per scan thread at most."""
+    if executor is None:
+        return [(0, n)]
+    workers = getattr(executor, "workers", None) or os.cpu_count() or 1
+    shards = max(1, min(workers, n // _MIN_SHARD_ROWS))
+    # Shard edges fall on block boundaries so blocks stay full size
+    blocks = -(-n // _BATCH_BLOCK_ROWS)
+    edges = [min(n, (blocks * i // shards) * _BATCH_BLOCK_ROWS) for i in range(shards + 1)]
+    return [(start, stop) for start, stop in zip(edges, edges[1:]) if stop > start]
+
+
+def _scan_top_k(
+    block_scores: Callable[[int, int, np.ndarray], np.ndarray],
+    gather_scores: Callable[[np.ndarray, np.ndarray], np.ndarray],
+    queries: np.ndarray,
+    allowed: Sequence[np.ndarray],
+    top_k: int,
+    executor: Optional[Executor] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Blockwise top-k scan shared by the float32 and quantized paths of ``batch_top_k``."""
+    results: List[Tuple[np.ndarray, np.ndarray]] = [
+        (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+    ] * len(queries)
+    dense = []
+    for i, mask in enumerate(allowed):
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            continue
+        if 4 * rows.size < mask.size:
+            scores = gather_scores(rows, queries[i])
+            best = top_k_indices(scores, top_k)
+            results[i] = (rows[best], scores[best])
+        else:
+            dense.append(i)
+    if not dense:
+        return results
+
+    shared = queries[dense]
+
+    def scan(bounds: Tuple[int, int]) -> List[List[Tuple[np.ndarray, np.ndarray]]]:
+        candidates: List[List[Tuple[np.ndarray, np.ndarray]]] = [[] for _ in dense]
+        for start in range(bounds[0], bounds[1], _BATCH_BLOCK_ROWS):
+            stop = min(start + _BATCH_BLOCK_ROWS, bounds[1])
+            block = block_scores(start, stop, shared)
+            for j, i in enumerate(dense):
+                rows = np.flatnonzero(allowed[i][start:stop])
+                scores = block[j, rows]
+                best = top_k_indices(scores, top_k)
+                candidates[j].append((rows[best] + start, scores[best]))
+        return candidates
+
+    shards = _shard_bounds(len(allowed[dense[0]]), executor)
+    if len(shards) == 1:
+        parts = [scan(shards[0])]
+    else:
+        parts = list(executor.map(scan, shards))
+
+    for j, i in enumerate(dense):
+        rows = np.concatenate([rows for part in parts for rows, _ in part[j]])
+        scores = np.concatenate([scores for part in parts for _, scores in part[j]])
+        best = top_k_indices(scores, top_k)
+        results[i] = (rows[best], scores[best])
+    return results
+
+
+class VectorIndex:
+    """
+    Row bookkeeping shared by the local vector indexes.
+
+    Each vector id owns a row number. Deleted rows are masked out rather than
+    moved, so row numbers stay stable and can be used as filter masks.
+    Subclasses own the vector payload and implement ``add`` and ``search``.
+    """
+
+    # Whether an upsert of an existing id overwrites its row in place; indexes
+    # whose structure depends on the stored vector tombstone and append instead
+    _reuse_rows = True
+
+    # Approximate indexes must hold every vector to build their structure;
+    # exact ones can be split across sealed segments and scanned piecewise
+    approximate = False
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024):
+        """Initialize an empty index (dimension is inferred on first insert if omitted)."""
+        self.dim = dim
+        self._initial_capacity = max(1, initial_capacity)
+        self._live = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        """Number of live vectors."""
+        return len(self._rows)
+
+    def __contains__(self, vector_id: str) -> bool:
+        return vector_id in self._rows
+
+    @property
+    def row_count(self) -> int:
+        """Number of allocated rows, including deleted ones."""
+        return len(self._ids)
+
+    def row_of(self, vector_id: str) -> Optional[int]:
+        """Return the row holding ``vector_id``, if present."""
+        return self._rows.get(vector_id)
+
+    def id_at(self, row: int) -> Optional[str]:
+        """Return the id stored at ``row`` (``None`` if deleted)."""
+        return self._ids[row]
+
+    def live_mask(self) -> np.ndarray:
+        """Boolean mask over allocated rows, ``True`` where the row is live."""
+        return self._live[: self.row_count]
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the index arrays."""
+        return int(self._live.nbytes)
+
+    def _reserve(self, rows: int) -> None:
+        """Grow the backing arrays (amortized doubling) to hold ``rows`` rows."""
+        capacity = self._live.shape[0]
+        if rows <= capacity:
+            return
+        self._resize(max(rows, capacity * 2, self._initial_capacity))
+
+    def _resize(self, capacity: int) -> None:
+        """Reallocate per-row arrays to ``capacity`` rows."""
+        live = np.zeros(capacity, dtype=bool)
+        live[: self._live.shape[0]] = self._live
+        self._live = live
+
+    def _check_vectors(self, ids: Sequence[str], vectors) -> np.ndarray:
+        """Normalize ``vectors`` and validate them against ``ids`` and ``dim``."""
+        matrix = normalize_rows(vectors)
+        if matrix.shape[0] != len(ids):
+            raise ValueError(f"Got {len(ids)} ids for {matrix.shape[0]} vectors")
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {matrix.shape[1]}")
+        return matrix
+
+    def _check_query(self, vector) -> np.ndarray:
+        """Normalize a single query vector and validate its dimension."""
+        query = normalize_rows(vector)[0]
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional query, got {query.shape[0]}")
+        return query
+
+    def _allowed_rows(self, mask: Optional[np.ndarray]) -> np.ndarray:
+        """Combine the live-row mask with an optional caller mask."""
+        allowed = self.live_mask()
+        if mask is not None:
+            allowed = allowed & mask[: self.row_count]
+        return allowed
+
+    def _assign_rows(self, ids: Sequence[str]) -> np.ndarray:
+        """Map ids to rows, appending rows for new ids (and for overwrites if not reusing)."""
+        rows = np.empty(len(ids), dtype=np.int64)
+        for i, vector_id in enumerate(ids):
+            row = self._rows.get(vector_id)
+            if row is not None and not self._reuse_rows:
+                self._ids[row] = None
+                self._live[row] = False
+                row = None
+            if row is None:
+                row = len(self._ids)
+                self._ids.append(vector_id)
+                self._rows[vector_id] = row
+            rows[i] = row
+        self._reserve(len(self._ids))
+        return rows
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """
+        Delete vectors by id.
+
+        Returns:
+            Number of vectors removed
+        """
+        removed = 0
+        for vector_id in ids:
+            row = self._rows.pop(vector_id, None)
+            if row is None:
+                continue
+            self._ids[row] = None
+            self._live[row] = False
+            removed += 1
+        return removed
+
+    def add(self, ids: Sequence[str], vectors) -> np.ndarray:
+        """Insert or overwrite vectors and return their rows."""
+        raise NotImplementedError
+
+    def search(
+        self,
+        vector,
+        top_k: int = 5,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
+        """Return ``(id, score)`` pairs for the ``top_k`` most similar vectors."""
+        raise NotImplementedError
+
+    def search_batch(
+        self,
+        vectors,
+        top_k: int = 5,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Run several queries; subclasses that can share work across them override this.
+
+        Args:
+            vectors: Query vectors, one per row
+            top_k: Number of results per query
+            masks: Optional row mask per query (``None`` entries are unfiltered)
+
+        Returns:
+            One list of ``(id, score)`` pairs per query, best first
+        """
+        queries = normalize_rows(vectors)
+        masks = masks if masks is not None else [None] * len(queries)
+        return [self.search(query, top_k, mask) for query, mask in zip(queries, masks)]
+
+
+class FlatIndex(VectorIndex):
+    """
+    Exact cosine-similarity index over a growable float32 matrix.
+
+    Vectors are normalized on insert, so a query is a single matrix-vector
+    product followed by an ``argpartition`` top-k. With ``quantization`` an
+    int8 or float16 copy is kept alongside and scanned first; only the best
+    ``rescore_candidates`` rows are rescored in float32.
+    """
+
+    def __init__(
+        self,
+        dim: Optional[int] = None,
+        initial_capacity: int = 1024,
+        quantization: Optional[str] = None,
+        rescore_candidates: int = 256,
+        scan_executor: Optional[Executor] = None,
+    ):
+        """
+        Initialize an empty index.
+
+        Args:
+            dim: Vector dimension (inferred on first insert if omitted)
+            initial_capacity: Initial number of matrix rows
+            quantization: ``"int8"`` or ``"float16"`` first-pass copy (off if ``None``)
+            rescore_candidates: Shortlist size rescored in float32 when quantized
+            scan_executor: Optional thread pool scanning shards of the matrix in parallel
+        """
+        super().__init__(dim=dim, initial_capacity=initial_capacity)
+        self._vectors = np.empty((0, dim or 0), dtype=np.float32)
+        self.quantization = check_quantization(quantization)
+        self.rescore_candidates = rescore_candidates
+        self.scan_executor = scan_executor
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the vector matrix, quantized copy and row bookkeeping."""
+        total = int(self._vectors.nbytes) + super().memory_bytes()
+        for array in (self._codes, self._scales):
+            if array is not None:
+                total += int(array.nbytes)
+        return total
+
+    def _resize(self, capacity: int) -> None:
+        old = self._vectors.shape[0]
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        if old:
+            vectors[:old] = self._vectors
+        self._vectors = vectors
+        if self.quantization:
+            codes, scales = empty_codes(capacity, self.dim, self.quantization)
+            if old:
+                codes[:old] = self._codes[:old]
+                if scales is not None:
+                    scales[:old] = self._scales[:old]
+            self._codes, self._scales = codes, scales
+        super()._resize(capacity)
+
+    def quantized(self) -> Optional[QuantizedVectors]:
+        """Scoring view over the quantized copy (``None`` when quantization is off)."""
+        if not self.quantization or self._codes is None:
+            return None
+        return QuantizedVectors(self.quantization, self._codes, self._scales)
+
+    def add(self, ids: Sequence[str], vectors) -> np.ndarray:
+        """
+        Insert or overwrite vectors.
+
+        Args:
+            ids: Vector IDs, one per row of ``vectors``
+            vectors: Sequence of vectors or a 2-D array
+
+        Returns:
+            Row numbers assigned to ``ids``
+        """
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        matrix = self._check_vectors(ids, vectors)
+        rows = self._assign_rows(ids)
+        self._vectors[rows] = matrix
+        if self.quantization:
+            codes, scales = quantize(matrix, self.quantization)
+            self._codes[rows] = codes
+            if scales is not None:
+                self._scales[rows] = scales
+        self._live[rows] = True
+        return rows
+
+    def live_items(self) -> Tuple[List[str], np.ndarray]:
+        """Return the ids and normalized vectors of all live rows, in row order."""
+        rows = np.flatnonzero(self._live[: self.row_count])
+        return [self._ids[row] for row in rows], self._vectors[rows]
+
+    def search(
+        self,
+        vector,
+        top_k: int = 5,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the ``top_k`` most similar vectors.
+
+        Args:
+            vector: Query vector (normalized internally)
+            top_k: Number of results to return
+            mask: Optional boolean array over rows; ``False`` rows are skipped
+
+        Returns:
+            List of ``(id, score)`` pairs, best first
+        """
+        return self.search_batch(normalize_rows(vector)[:1], top_k, [mask])[0]
+
+    def search_batch(
+        self,
+        vectors,
+        top_k: int = 5,
+        masks: Optional[Sequence[Optional[np.ndarray]]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Exact top-k for several queries with shared matrix-matrix products.
+
+        Args:
+            vectors: Query vectors, one per row (normalized internally)
+            top_k: Number of results per query
+            masks: Optional boolean row mask per query
+
+        Returns:
+            One list of ``(id, score)`` pairs per query, best first
+        """
+        queries = normalize_rows(vectors)
+        if self.row_count == 0 or top_k <= 0:
+            return [[] for _ in queries]
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional query, got {queries.shape[1]}")
+
+        masks = masks if masks is not None else [None] * len(queries)
+        allowed = [self._allowed_rows(mask) for mask in masks]
+        return [
+            [(self._ids[row], float(score)) for row, score in zip(rows.tolist(), scores.tolist())]
+            for rows, scores in batch_top_k(
+                self._vectors,
+                queries,
+                allowed,
+                top_k,
+                self.quantized(),
+                self.rescore_candidates,
+                self.scan_executor,
+            )
+        ]
@@ -0,0 +1,523 @@
+"""On-disk segment format and append log for the local vector store.
+
+A collection directory holds:
+
+- ``manifest.json``: the committed generation, listing live segment files,
+  their tombstone files and the current append log.
+- ``seg-NNNNNN.seg``: an immutable segment: header, float32 vector block,
+  optional int8/float16 copy with its scales, id table, metadata block,
+  metadata posting lists and the BM25 postings of its texts. Vectors, codes
+  and postings are memory-mapped, never copied.
+- ``seg-NNNNNN.GGGGGG.del``: packed tombstone bits for a segment as of
+  generation ``G``.
+- ``wal-GGGGGG.log``: upserts and deletes since generation ``G`` was sealed.
+- ``proj-GGGGGG.npz``: the dimensionality-reduction projection published
+  with generation ``G``, if the collection was reduced.
+
+Every file except the log is written once under a fresh name and published
+by atomically replacing the manifest, so a crash never exposes a partial
+generation.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.lexical_index import MappedLexicalIndex
+from services.scalar_quantization import CODE_DTYPES, QUANTIZATION_KINDS, QuantizedVectors, quantize
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b"EKOSSEG1"
+SEGMENT_VERSION = 4
+MANIFEST_NAME = "manifest.json"
+
+# magic, version
+_PREFIX = struct.Struct("<8sI")
+# v1: magic, version, dim, count, vectors offset, ids offset, metadata offset, end offset
+_HEADER_V1 = struct.Struct("<8sIIQQQQQ")
+# v2 adds the postings offset before the end offset
+_HEADER_V2 = struct.Struct("<8sIIQQQQQQ")
+# v3 appends the quantization kind (0 = none), codes offset and scales offset
+_HEADER_V3 = struct.Struct("<8sIIQQQQQQIQQ")
+# v4 appends the lexical (BM25) postings offset (0 = none)
+_HEADER = struct.Struct("<8sIIQQQQQQIQQQ")
+_ALIGN = 64
+
+# op, id length, payload length, replaced segment sequence, replaced row, crc32
+_RECORD = struct.Struct("<BIIiqI")
+OP_UPSERT = 1
+OP_DELETE = 2
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _fsync_dir(directory: str) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: str, data: bytes, fsync: bool = True) -> None:
+    """Write ``data`` to ``path`` via a temporary file and ``os.replace``."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if fsync:
+        _fsync_dir(os.path.dirname(path) or ".")
+
+
+def _string_table(values: Sequence[bytes]) -> bytes:
+    """Encode byte strings as ``uint64`` offsets (n + 1) followed by the concatenated data."""
+    offsets = np.zeros(len(values) + 1, dtype=np.uint64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    return offsets.tobytes() + b"".join(values)
+
+
+def segment_name(sequence: int) -> str:
+    return f"seg-{sequence:06d}"
+
+
+def _postings_block(postings: Dict[str, Dict[str, np.ndarray]]) -> bytes:
+    """
+    Encode posting lists as a ``uint64`` directory length, a JSON directory of
+    ``{field: {key: [start, count]}}`` padded to 4 bytes, then the int32 rows.
+    """
+    directory: Dict[str, Dict[str, List[int]]] = {}
+    arrays = []
+    start = 0
+    for field, values in postings.items():
+        directory[field] = {}
+        for key, rows in values.items():
+            directory[field][key] = [start, len(rows)]
+            arrays.append(np.asarray(rows, dtype=np.int32))
+            start += len(rows)
+    encoded = json.dumps(directory, separators=(",", ":")).encode("utf-8")
+    encoded += b" " * (-len(encoded) % 4)
+    data = np.concatenate(arrays).tobytes() if arrays else b""
+    return struct.pack("<Q", len(encoded)) + encoded + data
+
+
+def write_segment(
+    path: str,
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    metadata: Sequence[Dict[str, Any]],
+    postings: Optional[Dict[str, Dict[str, np.ndarray]]] = None,
+    quantization: Optional[str] = None,
+    lexical: Optional[bytes] = None,
+    fsync: bool = True,
+) -> None:
+    """
+    Write an immutable segment file.
+
+    Args:
+        path: Destination file path
+        ids: Vector IDs, one per row
+        vectors: ``(n, dim)`` normalized vectors
+        metadata: Metadata dicts, one per row
+        postings: Metadata posting lists ``{field: {key: rows}}``
+        quantization: Also store an ``"int8"`` or ``"float16"`` copy of the vectors
+        lexical: Serialized BM25 postings of the rows (``services.lexical_index.lexical_block``)
+        fsync: Flush the file to stable storage before publishing it
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    id_table = _string_table([vector_id.encode("utf-8") for vector_id in ids])
+    metadata_table = _string_table(
+        [json.dumps(md, default=str, separators=(",", ":")).encode("utf-8") for md in metadata]
+    )
+    postings_block = _postings_block(postings or {})
+    codes = scales = None
+    if quantization:
+        codes, scales = quantize(vectors, quantization)
+
+    vectors_offset = _align(_HEADER.size)
+    codes_offset = scales_offset = ids_offset = vectors_offset + vectors.nbytes
+    if codes is not None:
+        codes_offset = _align(ids_offset)
+        scales_offset = ids_offset = codes_offset + codes.nbytes
+        if scales is not None:
+            scales_offset = _align(ids_offset)
+            ids_offset = scales_offset + scales.nbytes
+    metadata_offset = ids_offset + len(id_table)
+    postings_offset = _align(metadata_offset + len(metadata_table))
+    lexical_offset = _align(postings_offset + len(postings_block)) if lexical else 0
+    end_offset = lexical_offset + len(lexical) if lexical else postings_offset + len(postings_block)
+    header = _HEADER.pack(
+        SEGMENT_MAGIC,
+        SEGMENT_VERSION,
+        dim,
+        count,
+        vectors_offset,
+        ids_offset,
+        metadata_offset,
+        postings_offset,
+        end_offset,
+        QUANTIZATION_KINDS[quantization] if codes is not None else 0,
+        codes_offset,
+        scales_offset,
+        lexical_offset,
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(b"\0" * (vectors_offset - len(header)))
+        f.write(vectors.tobytes())
+        for offset, array in ((codes_offset, codes), (scales_offset, scales)):
+            if array is not None:
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(array.tobytes())
+        f.write(id_table)
+        f.write(metadata_table)
+        f.write(b"\0" * (postings_offset - metadata_offset - len(metadata_table)))
+        f.write(postings_block)
+        if lexical:
+            f.write(b"\0" * (lexical_offset - f.tell()))
+            f.write(lexical)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _StringTable:
+    """Lazily decoded view over an offsets + data block inside a mapped file."""
+
+    def __init__(self, buffer: mmap.mmap, offset: int, count: int):
+        self._buffer = buffer
+        self._offsets = np.frombuffer(buffer, dtype=np.uint64, count=count + 1, offset=offset)
+        self._base = offset + self._offsets.nbytes
+
+    def __getitem__(self, i: int) -> bytes:
+        start = self._base + int(self._offsets[i])
+        end = self._base + int(self._offsets[i + 1])
+        return self._buffer[start:end]
+
+
+class Segment:
+    """
+    Read-only, memory-mapped view of a segment file.
+
+    ``vectors`` is a zero-copy ``(count, dim)`` float32 view of the mapping;
+    ids and metadata are decoded only when a row is actually read, and posting
+    lists only when the segment is first filtered (BM25 postings when it is
+    first searched by text). ``quantized`` views the
+    stored int8/float16 copy, if any. ``live`` is the only mutable state and
+    is persisted separately as tombstones.
+    """
+
+    def __init__(self, directory: str, name: str, deletes: Optional[str] = None):
+        """Map ``{directory}/{name}.seg`` and apply the optional tombstone file."""
+        self.directory = directory
+        self.name = name
+        self.sequence = int(name.split("-")[1])
+        self.deletes = deletes
+        self.path = os.path.join(directory, f"{name}.seg")
+
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = _PREFIX.unpack_from(self._buffer, 0)
+        if magic != SEGMENT_MAGIC or version not in (1, 2, 3, SEGMENT_VERSION):
+            raise ValueError(f"Not a vector segment (or unsupported version): {self.path}")
+        self._postings_offset = None
+        quantization, codes_offset, scales_offset, self._lexical_offset = 0, 0, 0, 0
+        if version == 1:
+            _, _, dim, count, vectors_offset, ids_offset, metadata_offset, _ = _HEADER_V1.unpack_from(
+                self._buffer, 0
+            )
+        elif version == 2:
+            (
+                _,
+                _,
+                dim,
+                count,
+                vectors_offset,
+                ids_offset,
+                metadata_offset,
+                self._postings_offset,
+                _,
+            ) = _HEADER_V2.unpack_from(self._buffer, 0)
+        elif version == 3:
+            (
+                _,
+                _,
+                dim,
+                count,
+                vectors_offset,
+                ids_offset,
+                metadata_offset,
+                self._postings_offset,
+                _,
+                quantization,
+                codes_offset,
+                scales_offset,
+            ) = _HEADER_V3.unpack_from(self._buffer, 0)
+        else:
+            (
+                _,
+                _,
+                dim,
+                count,
+                vectors_offset,
+                ids_offset,
+                metadata_offset,
+                self._postings_offset,
+                _,
+                quantization,
+                codes_offset,
+                scales_offset,
+                self._lexical_offset,
+            ) = _HEADER.unpack_from(self._buffer, 0)
+
+        self.dim = dim
+        self.count = count
+        self.vectors = np.frombuffer(
+            self._buffer, dtype=np.float32, count=count * dim, offset=vectors_offset
+        ).reshape(count, dim)
+        self.quantized: Optional[QuantizedVectors] = None
+        if quantization:
+            kind = next(name for name, code in QUANTIZATION_KINDS.items() if code == quantization)
+            codes = np.frombuffer(
+                self._buffer, dtype=CODE_DTYPES[kind], count=count * dim, offset=codes_offset
+            ).reshape(count, dim)
+            scales = None
+            if kind == "int8":
+                scales = np.frombuffer(self._buffer, dtype=np.float32, count=count, offset=scales_offset)
+            self.quantized = QuantizedVectors(kind, codes, scales)
+        self._ids = _StringTable(self._buffer, ids_offset, count)
+        self._metadata = _StringTable(self._buffer, metadata_offset, count)
+        self._metadata_cache: Optional[List[Dict[str, Any]]] = None
+        # Set by the owning collection: MetadataIndex over this segment's rows
+        self.filter_index = None
+        # Set by the owning collection: BM25 postings over this segment's rows
+        self.lexical = None
+
+        self.live = np.ones(count, dtype=bool)
+        if deletes:
+            packed = np.fromfile(os.path.join(directory, deletes), dtype=np.uint8)
+            self.live &= ~np.unpackbits(packed, count=count).astype(bool)
+        self.dirty = False
+
+    def __len__(self) -> int:
+        """Number of live rows."""
+        return int(self.live.sum())
+
+    def id_at(self, row: int) -> str:
+        return self._ids[row].decode("utf-8")
+
+    def ids(self) -> List[str]:
+        """Decode every id in the segment (live or not)."""
+        return [self.id_at(row) for row in range(self.count)]
+
+    def metadata_at(self, row: int) -> Dict[str, Any]:
+        if self._metadata_cache is not None:
+            return self._metadata_cache[row]
+        return json.loads(self._metadata[row])
+
+    def metadata_list(self) -> List[Dict[str, Any]]:
+        """Decode (once) and cache every row's metadata."""
+        if self._metadata_cache is None:
+            self._metadata_cache = [json.loads(self._metadata[row]) for row in range(self.count)]
+        return self._metadata_cache
+
+    def postings(self) -> Optional[Dict[str, Dict[str, np.ndarray]]]:
+        """
+        Return the persisted ``{field: {key: rows}}`` posting lists as zero-copy
+        views, or ``None`` for segments written without them.
+        """
+        if self._postings_offset is None:
+            return None
+        offset = self._postings_offset
+        (length,) = struct.unpack_from("<Q", self._buffer, offset)
+        offset += 8
+        directory = json.loads(self._buffer[offset : offset + length])
+        data_offset = offset + length
+        return {
+            field: {
+                key: np.frombuffer(self._buffer, dtype=np.int32, count=n, offset=data_offset + 4 * start)
+                for key, (start, n) in values.items()
+            }
+            for field, values in directory.items()
+        }
+
+    def lexical_postings(self) -> Optional[MappedLexicalIndex]:
+        """Return the persisted BM25 postings mapped in place, or ``None`` for segments written without them."""
+        if not self._lexical_offset:
+            return None
+        return MappedLexicalIndex(self._buffer, self._lexical_offset)
+
+    def delete_row(self, row: int) -> bool:
+        """Tombstone ``row``; returns whether it was live."""
+        if not self.live[row]:
+            return False
+        self.live[row] = False
+        self.dirty = True
+        return True
+
+    def write_deletes(self, generation: int, fsync: bool = True) -> str:
+        """Persist tombstones as ``{name}.{generation}.del`` and return the file name."""
+        name = f"{self.name}.{generation:06d}.del"
+        _write_atomic(os.path.join(self.directory, name), np.packbits(~self.live).tobytes(), fsync)
+        self.deletes = name
+        self.dirty = False
+        return name
+
+
+def write_projection(path: str, data: bytes, fsync: bool = True) -> None:
+    """Write a serialized projection (see ``services.dim_reduction``) atomically."""
+    _write_atomic(path, data, fsync=fsync)
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    """Return the committed manifest, or ``None`` for a new collection."""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(directory: str, manifest: Dict[str, Any], fsync: bool = True) -> None:
+    """Atomically publish ``manifest``."""
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    _write_atomic(os.path.join(directory, MANIFEST_NAME), data, fsync)
+
+
+class AppendLog:
+    """
+    Write-ahead log of upserts and deletes not yet sealed into a segment.
+
+    Records carry a CRC so replay stops cleanly at a torn tail write. When an
+    operation supersedes a row in a sealed segment, the record stores that
+    ``(segment sequence, row)`` so replay can tombstone it without decoding
+    the segment's id table.
+    """
+
+    def __init__(self, path: str, dim: Optional[int], fsync: bool = False):
+        """Open the log at ``path``; the file is created on first append."""
+        self.path = path
+        self.dim = dim
+        self.fsync = fsync
+        self.records = 0
+        # Bytes of complete records replayed so far
+        self.offset = 0
+        self._valid_bytes: Optional[int] = None
+        self._file = None
+
+    def replay(
+        self, tailing: bool = False
+    ) -> Iterator[Tuple[int, str, Optional[np.ndarray], Optional[Dict[str, Any]], int, int]]:
+        """
+        Yield ``(op, id, vector, metadata, replaced_segment, replaced_row)`` records.
+
+        Replay resumes after the records already replayed, so readers can
+        follow a log another process is appending to. A corrupt or truncated
+        tail is skipped here and cut off before the next append, so read-only
+        processes never modify the file.
+
+        Args:
+            tailing: The log is still being written; an incomplete last record
+                is expected and picked up by a later replay
+        """
+        if not os.path.exists(self.path) or self.dim is None:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+
+        offset = 0
+        vector_bytes = self.dim * 4
+        while offset + _RECORD.size <= len(data):
+            op, id_len, payload_len, segment, row, crc = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            end = start + id_len + payload_len
+            body = data[start:end]
+            if end > len(data) or zlib.crc32(body) != crc or op not in (OP_UPSERT, OP_DELETE):
+                break
+            vector_id = body[:id_len].decode("utf-8")
+            vector = metadata = None
+            if op == OP_UPSERT:
+                payload = body[id_len:]
+                vector = np.frombuffer(payload[:vector_bytes], dtype=np.float32)
+                metadata = json.loads(payload[vector_bytes:])
+            self.records += 1
+            offset = end
+            self.offset += end - start + _RECORD.size
+            yield op, vector_id, vector, metadata, segment, row
+
+        if offset < len(data) and not tailing:
+            logger.warning(f"Ignoring corrupt tail of append log {self.path} after byte {self.offset}")
+            self._valid_bytes = self.offset
+
+    def _write(self, records: List[bytes]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            if self._valid_bytes is not None:
+                self._file.truncate(self._valid_bytes)
+                self._valid_bytes = None
+        data = b"".join(records)
+        self._file.write(data)
+        self._file.flush()
+        self.offset += len(data)
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.records += len(records)
+
+    @staticmethod
+    def _record(op: int, vector_id: str, payload: bytes, replaced: Optional[Tuple[int, int]]) -> bytes:
+        id_bytes = vector_id.encode("utf-8")
+        segment, row = replaced if replaced is not None else (-1, -1)
+        body = id_bytes + payload
+        return _RECORD.pack(op, len(id_bytes), len(payload), segment, row, zlib.crc32(body)) + body
+
+    def append_upserts(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        metadata: Sequence[Dict[str, Any]],
+        replaced: Sequence[Optional[Tuple[int, int]]],
+    ) -> None:
+        """Log a batch of upserts."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._write(
+            [
+                self._record(
+                    OP_UPSERT,
+                    vector_id,
+                    vectors[i].tobytes() + json.dumps(metadata[i], default=str).encode("utf-8"),
+                    replaced[i],
+                )
+                for i, vector_id in enumerate(ids)
+            ]
+        )
+
+    def append_deletes(self, ids: Sequence[str], replaced: Sequence[Optional[Tuple[int, int]]]) -> None:
+        """Log a batch of deletes."""
+        self._write([self._record(OP_DELETE, vector_id, b"", replaced[i]) for i, vector_id in enumerate(ids)])
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
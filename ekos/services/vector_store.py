@@ -1,12 +1,34 @@
 """Vector store adapter for Pinecone/Weaviate."""
 
+import asyncio
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
 
 from app.config import Settings, get_settings
+from services.dim_reduction import REDUCTION_METHODS, Projection, evaluate_reductions
+from services.hnsw_index import HNSW_AVAILABLE, HNSWIndex
+from services.ivfpq_index import IVFPQIndex
+from services.lexical_index import reciprocal_rank_fusion
+from services.near_duplicates import NearDuplicateIndex
+from services.vector_collection import VectorCollection
+from services.vector_index import FlatIndex, ScanExecutor, VectorIndex
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_NAMESPACE = "default"
+# Role of processes without VECTOR_STORE_ROLE; the ingest worker claims the writer role at startup
+_default_role = "reader"
+_READ_ONLY_ERROR = "Vector store is read-only in this process; the ingest worker owns writes (VECTOR_STORE_ROLE)"
+_SAFE_NAMESPACE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]{0,63}$")
+
 
 class VectorStore:
     """Vector store adapter (Pinecone/Weaviate stub)."""
@@ -18,8 +40,31 @@ class VectorStore:
         self.index_name = self.settings.pinecone_index_name
         self.environment = self.settings.pinecone_environment
 
-        # Mock storage for development
-        self._mock_store: Dict[str, Dict[str, Any]] = {}
+        # Local collections for development / no Pinecone key: one per namespace,
+        # most recently used last
+        self._collections: "OrderedDict[str, VectorCollection]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        # Readers attach to directories written by another process (the ingest
+        # worker) and follow its generations; in memory, nothing is shared
+        self.read_only = bool(self.settings.vector_store_dir) and vector_store_role(self.settings) == "reader"
+        self._refreshed: Dict[str, float] = {}
+        # New generations are opened off the request path, one namespace at a time
+        self._reopening: Dict[str, "Future[VectorCollection]"] = {}
+        self._reopen_executor = ThreadPoolExecutor(1, thread_name_prefix="vector-reopen") if self.read_only else None
+        # Threads for sharded exact scans, shared by every namespace
+        threads = self.settings.vector_scan_threads or os.cpu_count() or 1
+        self._scan_executor = ScanExecutor(threads) if threads > 1 else None
+        if self.settings.vector_index_backend.lower() == "hnsw" and not HNSW_AVAILABLE:
+            logger.warning("VECTOR_INDEX_BACKEND=hnsw but hnswlib is not installed; using the exact flat index")
+
+        # Canonical chunks and the near-duplicates collapsed into them (kept with the segments)
+        self.near_duplicates: Optional[NearDuplicateIndex] = None
+        if self.settings.near_duplicate_threshold > 0:
+            path = self.settings.vector_store_dir
+            self.near_duplicates = NearDuplicateIndex(
+                os.path.join(path, "near_duplicates.sqlite") if path else None,
+                self.settings.near_duplicate_threshold,
+            )
 
         if not self.api_key:
             logger.warning("PINECONE_API_KEY not found. Using mock vector store.")
@@ -32,6 +77,162 @@ class VectorStore:
             logger.info("Pinecone client would be initialized here (stub)")
             self._client = None
 
+    def _create_index(self) -> VectorIndex:
+        """Create the local index selected by ``vector_index_backend``."""
+        backend = self.settings.vector_index_backend.lower()
+        if backend == "hnsw" and HNSW_AVAILABLE:
+            return HNSWIndex(
+                m=self.settings.hnsw_m,
+                ef_construction=self.settings.hnsw_ef_construction,
+                ef_search=self.settings.hnsw_ef_search,
+            )
+        # Without hnswlib the hnsw backend serves exact results from the flat index
+        if backend in ("flat", "hnsw"):
+            return FlatIndex(
+                quantization=self.settings.vector_quantization,
+                rescore_candidates=self.settings.vector_rescore_candidates,
+                scan_executor=self._scan_executor,
+            )
+        if backend == "ivfpq":
+            return IVFPQIndex(
+                nlist=self.settings.ivfpq_nlist,
+                m=self.settings.ivfpq_m,
+                nprobe=self.settings.ivfpq_nprobe,
+                rerank=self.settings.ivfpq_rerank,
+                rerank_candidates=self.settings.ivfpq_rerank_candidates,
+                train_size=self.settings.ivfpq_train_size,
+            )
+        raise ValueError(f"Unknown vector index backend: {backend}")
+
+    def _namespace_dir(self, namespace: str) -> Optional[str]:
+        """Directory holding a namespace's segments (``None`` when running in memory)."""
+        if not self.settings.vector_store_dir:
+            return None
+        if not _SAFE_NAMESPACE.match(namespace):
+            namespace = "ns-" + hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.settings.vector_store_dir, namespace)
+
+    def _get_collection(self, namespace: Optional[str], create: bool = True) -> Optional[VectorCollection]:
+        """
+        Return the local collection for ``namespace``, opening or creating it on demand.
+
+        Args:
+            namespace: Namespace (tenant); ``None`` selects the default namespace
+            create: Create the namespace if it does not exist yet
+
+        Returns:
+            The collection, or ``None`` if it does not exist and ``create`` is False
+        """
+        if create and self.read_only:
+            raise RuntimeError(_READ_ONLY_ERROR)
+        namespace = namespace or DEFAULT_NAMESPACE
+        collection = self._collections.get(namespace)
+        if collection is None:
+            directory = self._namespace_dir(namespace)
+            if not create and not (directory and os.path.isdir(directory)):
+                return None
+            collection = self._open_collection(directory)
+            self._collections[namespace] = collection
+            self._refreshed[namespace] = time.monotonic()
+            self._evict_idle(keep=namespace)
+        elif self.read_only and (
+            namespace in self._reopening
+            or time.monotonic() - self._refreshed.get(namespace, 0.0) >= self.settings.vector_store_refresh_seconds
+        ):
+            collection = self._refresh(namespace, collection)
+        self._collections.move_to_end(namespace)
+        self._last_used[namespace] = time.time()
+        return collection
+
+    def _open_collection(self, directory: Optional[str]) -> VectorCollection:
+        return VectorCollection(
+            self._create_index,
+            directory=directory,
+            segment_rows=self.settings.vector_segment_rows,
+            fsync=self.settings.vector_store_fsync,
+            # doc_id postings double as the document -> chunk registry
+            filter_fields=[*self.settings.vector_filter_fields, "doc_id"],
+            quantization=self.settings.vector_quantization,
+            rescore_candidates=self.settings.vector_rescore_candidates,
+            lexical_field=self.settings.lexical_index_field or None,
+            scan_executor=self._scan_executor,
+            read_only=self.read_only,
+        )
+
+    def _refresh(self, namespace: str, collection: VectorCollection) -> VectorCollection:
+        """
+        Catch a reader's collection up with the writer.
+
+        New log records are applied in place. When the writer has published a
+        new generation, the directory is opened again on a background thread
+        while queries keep using the current collection; the first call after
+        it is ready swaps it in with one dict assignment (searches already
+        running finish on the old one).
+        """
+        self._refreshed[namespace] = time.monotonic()
+        pending = self._reopening.get(namespace)
+        if pending is None:
+            if not collection.refresh():
+                self._reopening[namespace] = self._reopen_executor.submit(self._reopen, collection.directory)
+            return collection
+        if not pending.done():
+            return collection
+        del self._reopening[namespace]
+        try:
+            fresh = pending.result()
+        except Exception as e:
+            # Keep serving the current generation; the next refresh tries again
+            logger.error(f"Failed to reopen vector namespace {namespace}: {e}")
+            return collection
+        self._collections[namespace] = fresh
+        collection.close()
+        logger.info(f"Vector namespace {namespace} moved to generation {fresh.generation}")
+        return fresh
+
+    def _reopen(self, directory: str) -> VectorCollection:
+        """Open a namespace directory again at its latest generation (runs on the reopen thread)."""
+        for attempt in range(3):
+            try:
+                return self._open_collection(directory)
+            except FileNotFoundError:
+                # The writer published again and removed files while we were mapping them
+                if attempt == 2:
+                    raise
+
+    def _evict_idle(self, keep: str) -> None:
+        """Close least recently used persistent namespaces beyond ``vector_max_open_namespaces``."""
+        limit = self.settings.vector_max_open_namespaces
+        if limit <= 0 or len(self._collections) <= limit:
+            return
+        for namespace in list(self._collections):
+            if len(self._collections) <= limit:
+                break
+            collection = self._collections[namespace]
+            # In-memory namespaces can't be reopened, so they are never evicted
+            if namespace == keep or collection.directory is None:
+                continue
+            collection.flush()
+            collection.close()
+            pending = self._reopening.pop(namespace, None)
+            if pending is not None:
+                pending.add_done_callback(lambda done: done.exception() is None and done.result().close())
+            del self._collections[namespace]
+            self._last_used.pop(namespace, None)
+            self._refreshed.pop(namespace, None)
+            logger.info(f"Evicted idle vector namespace {namespace}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-namespace statistics for the open local collections.
+
+        Returns:
+            Mapping of namespace to collection stats plus ``last_used`` (epoch seconds)
+        """
+        return {
+            namespace: {**collection.stats(), "last_used": self._last_used.get(namespace)}
+            for namespace, collection in self._collections.items()
+        }
+
     async def upsert(
         self,
         vectors: List[Dict[str, Any]],
@@ -48,15 +249,18 @@ class VectorStore:
             Upsert result
         """
         if not self._client:
-            # Mock upsert
+            # Local upsert
+            ids = []
+            values = []
+            metadata = []
             for vector in vectors:
                 vector_id = vector.get("id")
-                if vector_id:
-                    self._mock_store[vector_id] = {
-                        "values": vector.get("values", []),
-                        "metadata": vector.get("metadata", {}),
-                    }
-            logger.info(f"Mock upserted {len(vectors)} vectors")
+                if vector_id and len(vector.get("values", [])):
+                    ids.append(vector_id)
+                    values.append(vector["values"])
+                    metadata.append(vector.get("metadata", {}))
+            self._get_collection(namespace).upsert(ids, values, metadata)
+            logger.info(f"Mock upserted {len(vectors)} vectors into namespace {namespace or DEFAULT_NAMESPACE}")
             return {"upserted_count": len(vectors), "status": "success"}
 
         # TODO: Implement real Pinecone upsert
@@ -69,6 +273,42 @@ class VectorStore:
 
         return {"upserted_count": 0, "status": "not_implemented"}
 
+    async def upsert_array(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        metadata: Sequence[Dict[str, Any]],
+        namespace: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Upsert an ``(n, dim)`` embedding matrix without per-vector lists.
+
+        Args:
+            ids: Vector IDs, one per row
+            vectors: ``(n, dim)`` float32 embeddings
+            metadata: Metadata dict per row
+            namespace: Optional namespace for multi-tenancy
+
+        Returns:
+            Upsert result
+        """
+        if len(ids) != len(vectors) or len(ids) != len(metadata):
+            raise ValueError(f"Got {len(ids)} ids, {len(vectors)} vectors and {len(metadata)} metadata dicts")
+
+        if not self._client:
+            self._get_collection(namespace).upsert(ids, vectors, metadata)
+            logger.info(f"Mock upserted {len(ids)} vectors into namespace {namespace or DEFAULT_NAMESPACE}")
+            return {"upserted_count": len(ids), "status": "success"}
+
+        # The Pinecone client takes one values list per vector
+        return await self.upsert(
+            [
+                {"id": vector_id, "values": values, "metadata": md}
+                for vector_id, values, md in zip(ids, vectors.tolist(), metadata)
+            ],
+            namespace,
+        )
+
     async def query(
         self,
         vector: List[float],
@@ -91,36 +331,12 @@ class VectorStore:
             List of similar vectors with scores
         """
         if not self._client:
-            # Mock query - simple cosine similarity search
-            from services.embeddings import get_embedding_service
-
-            embedding_service = get_embedding_service()
-            results = []
-
-            for vector_id, stored_data in self._mock_store.items():
-                stored_vector = stored_data.get("values", [])
-                if not stored_vector:
-                    continue
-
-                # Check filter
-                if filter:
-                    metadata = stored_data.get("metadata", {})
-                    if not self._matches_filter(metadata, filter):
-                        continue
-
-                # Calculate similarity
-                similarity = embedding_service.cosine_similarity(vector, stored_vector)
-                results.append(
-                    {
-                        "id": vector_id,
-                        "score": similarity,
-                        "metadata": stored_data.get("metadata", {}) if include_metadata else {},
-                    }
-                )
-
-            # Sort by score descending
-            results.sort(key=lambda x: x["score"], reverse=True)
-            results = results[:top_k]
+            # Local query - cosine search over this namespace's index only
+            collection = self._get_collection(namespace, create=False)
+            if collection is None:
+                return []
+            # The sharded scan waits on the scan pool: keep it off the event loop
+            results = await asyncio.to_thread(collection.search, vector, top_k, filter, include_metadata)
 
             logger.info(f"Mock query returned {len(results)} results")
             return results
@@ -141,22 +357,155 @@ class VectorStore:
 
         return []
 
-    def _matches_filter(self, metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
-        """Check if metadata matches filter (simplified)."""
-        for key, value in filter.items():
-            if key not in metadata:
-                return False
-            if isinstance(value, dict):
-                # Support operators like $eq, $in, etc.
-                if "$in" in value:
-                    if metadata[key] not in value["$in"]:
-                        return False
-                elif "$eq" in value:
-                    if metadata[key] != value["$eq"]:
-                        return False
-            elif metadata[key] != value:
-                return False
-        return True
+    async def query_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int = 5,
+        namespace: Optional[str] = None,
+        filters: Optional[Any] = None,
+        include_metadata: bool = True,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Query several vectors in one pass.
+
+        Args:
+            vectors: Query vectors (lists or an ``(n, dim)`` array)
+            top_k: Number of results per query
+            namespace: Optional namespace
+            filters: One metadata filter for every query, or a list with one per query
+            include_metadata: Whether to include metadata in results
+
+        Returns:
+            One list of similar vectors with scores per query
+        """
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(vectors)
+
+        if not self._client:
+            # Local batch query - shared matrix-matrix scan over this namespace
+            collection = self._get_collection(namespace, create=False)
+            if collection is None or not len(vectors):
+                return [[] for _ in vectors]
+            results = await asyncio.to_thread(collection.search_batch, vectors, top_k, filters, include_metadata)
+
+            logger.info(f"Mock batch query of {len(vectors)} vectors returned {sum(map(len, results))} results")
+            return results
+
+        # TODO: Pinecone has no multi-vector query; issue the queries concurrently
+        # results = await asyncio.gather(
+        #     *[
+        #         self.query(vector, top_k, namespace, filter, include_metadata)
+        #         for vector, filter in zip(vectors, filters)
+        #     ]
+        # )
+        # return list(results)
+
+        return [[] for _ in vectors]
+
+    async def lexical_query(
+        self,
+        text: str,
+        top_k: int = 5,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        include_metadata: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Keyword (BM25) query over the chunk texts.
+
+        Args:
+            text: Query text
+            top_k: Number of results to return
+            namespace: Optional namespace
+            filter: Optional metadata filter
+            include_metadata: Whether to include metadata in results
+
+        Returns:
+            List of matching chunks with BM25 scores
+        """
+        if not self._client:
+            collection = self._get_collection(namespace, create=False)
+            if collection is None:
+                return []
+            return await asyncio.to_thread(collection.lexical_search, text, top_k, filter, include_metadata)
+
+        # TODO: Pinecone sparse-dense query (requires sparse vectors at upsert)
+        return []
+
+    async def hybrid_query(
+        self,
+        vectors: List[List[float]],
+        text: str,
+        top_k: int = 5,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        include_metadata: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Run vector and lexical retrieval concurrently and fuse them with reciprocal-rank fusion.
+
+        Args:
+            vectors: Query vectors, lists or an ``(n, dim)`` array (e.g. the query and its expansions)
+            text: Query text for the lexical side
+            top_k: Number of fused results to return
+            namespace: Optional namespace
+            filter: Optional metadata filter applied to both sides
+            include_metadata: Whether to include metadata in results
+
+        Returns:
+            Fused results; ``score`` is the RRF score
+        """
+        candidates = max(top_k, self.settings.hybrid_candidates)
+
+        if not self._client:
+            collection = self._get_collection(namespace, create=False)
+            if collection is None:
+                return []
+            # Both sides spend their time in NumPy, which releases the GIL
+            vector_lists, lexical = await asyncio.gather(
+                asyncio.to_thread(
+                    collection.search_batch, vectors, candidates, [filter] * len(vectors), include_metadata
+                ),
+                asyncio.to_thread(collection.lexical_search, text, candidates, filter, include_metadata),
+            )
+        else:
+            vector_lists, lexical = await asyncio.gather(
+                self.query_batch(vectors, candidates, namespace, filter, include_metadata),
+                self.lexical_query(text, candidates, namespace, filter, include_metadata),
+            )
+
+        weights = [1.0] * len(vector_lists) + [self.settings.hybrid_lexical_weight]
+        return reciprocal_rank_fusion(
+            [*vector_lists, lexical], top_k, k=self.settings.hybrid_rrf_k, weights=weights
+        )
+
+    async def attach_duplicates(
+        self, results: List[Dict[str, Any]], namespace: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Add back-references to the near-duplicates collapsed into each result.
+
+        Results with copies get ``metadata["duplicates"]``: the ``chunk_id``
+        and ``doc_id`` of every chunk that was not stored because it nearly
+        duplicates this one, so a passage found once can cite all its sources.
+
+        Args:
+            results: Query results (``id`` and ``metadata``)
+            namespace: Namespace they came from
+
+        Returns:
+            The results, with new metadata dicts where copies exist
+        """
+        if self.near_duplicates is None or not results:
+            return results
+        copies = await asyncio.to_thread(
+            self.near_duplicates.duplicates_of, namespace or DEFAULT_NAMESPACE, [r["id"] for r in results]
+        )
+        for result in results:
+            if result["id"] in copies and "metadata" in result:
+                # Results may share metadata dicts with the index: don't modify them
+                result["metadata"] = {**result["metadata"], "duplicates": copies[result["id"]]}
+        return results
 
     async def delete(
         self,
@@ -166,6 +515,10 @@ class VectorStore:
         """
         Delete vectors by IDs.
 
+        The IDs are also removed from the near-duplicate index; copies that
+        were collapsed into them become orphans, re-homed by the ingest
+        worker (``orphaned_duplicates`` in the result).
+
         Args:
             ids: List of vector IDs to delete
             namespace: Optional namespace
@@ -174,14 +527,14 @@ class VectorStore:
             Delete result
         """
         if not self._client:
-            # Mock delete
-            deleted = 0
-            for vector_id in ids:
-                if vector_id in self._mock_store:
-                    del self._mock_store[vector_id]
-                    deleted += 1
+            # Mock delete; a reader must not touch the near-duplicate index either
+            if self.read_only:
+                raise RuntimeError(_READ_ONLY_ERROR)
+            orphaned = await self._release_near_duplicates(ids, namespace)
+            collection = self._get_collection(namespace, create=False)
+            deleted = collection.delete(ids) if collection is not None else 0
             logger.info(f"Mock deleted {deleted} vectors")
-            return {"deleted_count": deleted, "status": "success"}
+            return {"deleted_count": deleted, "orphaned_duplicates": orphaned, "status": "success"}
 
         # TODO: Implement real Pinecone delete
         # try:
@@ -193,11 +546,243 @@ class VectorStore:
 
         return {"deleted_count": 0, "status": "not_implemented"}
 
+    async def delete_by_filter(
+        self,
+        filter: Dict[str, Any],
+        namespace: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Delete every vector whose metadata matches ``filter``.
+
+        Collapsed near-duplicates matching ``filter`` are forgotten too, and
+        copies of the deleted vectors become orphans (see ``delete``).
+
+        Args:
+            filter: Metadata filter (must not be empty)
+            namespace: Optional namespace
+
+        Returns:
+            Delete result
+        """
+        if not self._client:
+            if not filter:
+                raise ValueError("delete_by_filter requires a non-empty filter")
+            if self.read_only:
+                raise RuntimeError(_READ_ONLY_ERROR)
+            collection = self._get_collection(namespace, create=False)
+            orphaned = 0
+            if self.near_duplicates is not None:
+                await asyncio.to_thread(
+                    self.near_duplicates.drop_duplicates, namespace or DEFAULT_NAMESPACE, filter
+                )
+                if collection is not None:
+                    orphaned = await self._release_near_duplicates(collection.ids_matching(filter), namespace)
+            deleted = collection.delete_by_filter(filter) if collection is not None else 0
+            logger.info(f"Mock deleted {deleted} vectors matching {filter}")
+            return {"deleted_count": deleted, "orphaned_duplicates": orphaned, "status": "success"}
+
+        # TODO: Implement real Pinecone delete by metadata filter
+        # try:
+        #     result = self._client.delete(filter=filter, namespace=namespace)
+        #     return result
+        # except Exception as e:
+        #     logger.error(f"Error deleting vectors: {e}")
+        #     raise
+
+        return {"deleted_count": 0, "status": "not_implemented"}
+
+    async def _release_near_duplicates(self, ids: Sequence[str], namespace: Optional[str]) -> int:
+        """Remove ``ids`` from the near-duplicate index before their vectors go; return copies orphaned."""
+        if self.near_duplicates is None or not ids:
+            return 0
+        return await asyncio.to_thread(self.near_duplicates.release_chunks, namespace or DEFAULT_NAMESPACE, ids)
+
+    async def delete_by_doc(
+        self,
+        doc_id: str,
+        namespace: Optional[str] = None,
+        keep_ids: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Delete a document's chunks without knowing how many there are.
+
+        Args:
+            doc_id: Document ID
+            namespace: Optional namespace
+            keep_ids: Chunk IDs to keep (e.g. the chunks just re-ingested), so
+                only stale ones are removed. The document's collapsed
+                near-duplicates are then left alone: re-ingesting updates
+                them (``NearDuplicateIndex.release_doc``).
+
+        Returns:
+            Delete result
+        """
+        if not keep_ids:
+            return await self.delete_by_filter({"doc_id": doc_id}, namespace)
+
+        if not self._client:
+            collection = self._get_collection(namespace, create=False)
+            if collection is None:
+                return {"deleted_count": 0, "status": "success"}
+            keep = set(keep_ids)
+            stale = [i for i in collection.ids_matching({"doc_id": doc_id}) if i not in keep]
+            return await self.delete(stale, namespace)
+
+        # TODO: Pinecone: list ids by doc_id prefix and delete those not in keep_ids
+        return {"deleted_count": 0, "status": "not_implemented"}
+
+    async def doc_chunk_hashes(self, doc_id: str, namespace: Optional[str] = None) -> Dict[str, str]:
+        """
+        Content hashes (``chunk_hash`` metadata) of a document's stored chunks.
+
+        Lets re-ingestion skip chunks that haven't changed.
+
+        Args:
+            doc_id: Document ID
+            namespace: Optional namespace
+
+        Returns:
+            Chunk ID to hash; empty for Pinecone (every chunk is re-embedded)
+        """
+        if self._client:
+            return {}
+        collection = self._get_collection(namespace, create=False)
+        if collection is None:
+            return {}
+        return await asyncio.to_thread(collection.field_values, {"doc_id": doc_id}, "chunk_hash")
+
+    async def compact(self, min_dead_ratio: Optional[float] = None) -> Dict[str, int]:
+        """
+        Compact open local namespaces whose dead ratio crosses the threshold.
+
+        Runs in a worker thread; each collection serializes it with its writes.
+
+        Args:
+            min_dead_ratio: Threshold (defaults to ``vector_compact_dead_ratio``)
+
+        Returns:
+            Dead rows reclaimed per compacted namespace
+        """
+        if self._client:
+            return {}
+        threshold = self.settings.vector_compact_dead_ratio if min_dead_ratio is None else min_dead_ratio
+
+        def run() -> Dict[str, int]:
+            reclaimed = {}
+            for namespace, collection in list(self._collections.items()):
+                if collection.dead_ratio() >= threshold:
+                    reclaimed[namespace] = collection.compact(threshold)
+            return reclaimed
+
+        return await asyncio.to_thread(run)
+
+    async def evaluate_reduction(
+        self,
+        namespace: Optional[str],
+        dims: Sequence[int] = (64, 128, 192, 256),
+        methods: Sequence[str] = REDUCTION_METHODS,
+        top_k: int = 10,
+    ) -> Dict[str, Any]:
+        """
+        Report recall against memory for candidate reductions of one namespace, without changing it.
+
+        Args:
+            namespace: Namespace (tenant) to evaluate
+            dims: Target dimensions to try
+            methods: Reduction methods to try
+            top_k: Neighbors compared per query
+
+        Returns:
+            ``{"namespace", "vectors", "dim", "candidates"}``; see ``evaluate_reductions`` for the rows
+        """
+        collection = self._get_collection(namespace, create=False)
+        if collection is None or collection.dim is None:
+            raise ValueError(f"Vector namespace {namespace or DEFAULT_NAMESPACE} is empty")
+        sample = collection.sample_vectors(self.settings.vector_reduction_sample_size)
+        candidates = await asyncio.to_thread(evaluate_reductions, sample, dims, methods, top_k=top_k)
+        return {
+            "namespace": namespace or DEFAULT_NAMESPACE,
+            "vectors": len(collection),
+            "dim": collection.dim,
+            "candidates": candidates,
+        }
+
+    async def reduce_namespace(self, namespace: Optional[str], method: str, dims: int) -> Dict[str, Any]:
+        """
+        Store a namespace's vectors with fewer dimensions from now on.
+
+        PCA is fitted on a sample of the namespace's vectors. The projection
+        is stored with the collection and applied to later upserts and
+        queries automatically.
+
+        Args:
+            namespace: Namespace (tenant) to reduce
+            method: ``"truncate"`` or ``"pca"``
+            dims: Target dimension
+
+        Returns:
+            Reduction result
+        """
+        if self._client:
+            # TODO: Pinecone indexes have a fixed dimension; reducing means a new index
+            return {"status": "not_implemented"}
+        collection = self._get_collection(namespace, create=False)
+        if collection is None or collection.dim is None:
+            raise ValueError(f"Vector namespace {namespace or DEFAULT_NAMESPACE} is empty")
+        if self.read_only:
+            raise RuntimeError(_READ_ONLY_ERROR)
+
+        def run() -> Dict[str, Any]:
+            before = collection.dim
+            projection = Projection.fit(
+                method, collection.sample_vectors(self.settings.vector_reduction_sample_size), dims
+            )
+            rewritten = collection.reduce(projection)
+            return {"status": "success", "vectors": rewritten, "dim_before": before, "dim_after": collection.dim}
+
+        result = await asyncio.to_thread(run)
+        logger.info(f"Reduced vector namespace {namespace or DEFAULT_NAMESPACE}: {result}")
+        return result
+
+    async def flush(self) -> None:
+        """Seal pending local writes into durable segments (no-op without ``vector_store_dir``)."""
+        if not self._client:
+            for collection in self._collections.values():
+                collection.flush()
+
+
+async def run_compaction_loop(interval_seconds: float) -> None:
+    """Periodically compact the local vector store (started from the app lifespan)."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            reclaimed = await get_vector_store().compact()
+            if reclaimed:
+                logger.info(f"Vector compaction reclaimed rows: {reclaimed}")
+        except Exception as e:
+            logger.error(f"Vector compaction failed: {e}", exc_info=True)
+
 
 # Singleton instance
 _vector_store: Optional[VectorStore] = None
 
 
+def claim_writer_role() -> None:
+    """
+    Make this process the vector store writer unless ``VECTOR_STORE_ROLE`` is set.
+
+    Called by the ingest worker when it starts, before its store is opened:
+    it owns writes (ingest, deletes, compaction), and API processes read.
+    """
+    global _default_role
+    _default_role = "writer"
+
+
+def vector_store_role(settings: Settings) -> str:
+    """``VECTOR_STORE_ROLE``, or this process's default (see ``claim_writer_role``)."""
+    return (settings.vector_store_role or _default_role).lower()
+
+
 def get_vector_store() -> VectorStore:
     """Get singleton vector store instance."""
     global _vector_store
@@ -0,0 +1,64 @@
+"""Tests for the embedding micro-batcher."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.embedding_batcher import EmbeddingBatcher
+
+
+class _Backend:
+    """Fake backend: embeds a text as ``[len(text), call number]`` after a delay."""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.batches = []
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        if any(text == "boom" for text in texts):
+            raise RuntimeError("backend failed")
+        return np.array([[len(text), len(self.batches)] for text in texts], dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_batches():
+    """Single-text calls arriving together go out in few, full batches."""
+    backend = _Backend()
+    batcher = EmbeddingBatcher(backend, max_batch_size=16, max_wait_ms=5, max_in_flight=2)
+    texts = ["x" * i for i in range(1, 101)]
+
+    results = await asyncio.gather(*[batcher.embed([text]) for text in texts])
+
+    assert [int(r[0, 0]) for r in results] == list(range(1, 101))
+    assert all(r.shape == (1, 2) and r.dtype == np.float32 for r in results)
+    assert max(map(len, backend.batches)) == 16 and len(backend.batches) == 7
+    assert backend.max_running == 2
+    assert (batcher.batches, batcher.texts) == (7, 100)
+
+
+@pytest.mark.asyncio
+async def test_lone_call_waits_at_most_max_wait_and_errors_propagate():
+    """A single call is sent after max_wait; a failed batch fails only its callers."""
+    backend = _Backend(delay=0)
+    batcher = EmbeddingBatcher(backend, max_batch_size=64, max_wait_ms=1)
+    result = await asyncio.wait_for(batcher.embed(["ab", "abc"]), timeout=1)
+    assert result[:, 0].tolist() == [2, 3]
+
+    with pytest.raises(RuntimeError):
+        await batcher.embed(["boom"])
+    assert (await batcher.embed(["ok"]))[0, 0] == 2
+
+
+def test_batcher_survives_new_event_loops():
+    """Workers call asyncio.run per task; each run gets a fresh queue."""
+    batcher = EmbeddingBatcher(_Backend(delay=0), max_batch_size=4, max_wait_ms=1)
+    for _ in range(2):
+        assert asyncio.run(batcher.embed(["a", "bb", "ccc", "dddd", "eeeee"]))[:, 0].tolist() == [1, 2, 3, 4, 5]
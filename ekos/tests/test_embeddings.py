@@ -0,0 +1,104 @@
+"""Tests for the embedding service."""
+
+import numpy as np
+import pytest
+
+from app.config import Settings
+from services.embeddings import EMBEDDING_DIM, EmbeddingCache, EmbeddingService
+from services.local_embeddings import HashedNgramEmbedder
+from services.vector_store import VectorStore
+
+
+@pytest.mark.asyncio
+async def test_embeddings_array_matches_single_embeddings():
+    """The batch path returns one contiguous float32 matrix equal to per-text embeddings."""
+    service = EmbeddingService()
+    texts = ["alpha", "beta", "", "ünïcode"]
+    matrix = await service.generate_embeddings_array(texts)
+
+    assert matrix.shape == (4, EMBEDDING_DIM) and matrix.dtype == np.float32
+    assert matrix.flags.c_contiguous
+    assert np.allclose(np.linalg.norm(matrix, axis=1), [1, 1, 0, 1], atol=1e-6)
+    for text, row in zip(texts, matrix):
+        assert np.allclose(await service.generate_embedding(text), row)
+    assert (await service.generate_embeddings_array([])).shape == (0, EMBEDDING_DIM)
+
+
+@pytest.mark.asyncio
+async def test_upsert_array_round_trip():
+    """Embedding matrices go into the vector store without per-vector lists."""
+    store = VectorStore(Settings())
+    texts = [f"chunk {i}" for i in range(20)]
+    matrix = await EmbeddingService().generate_embeddings_array(texts)
+    result = await store.upsert_array(
+        [f"c{i}" for i in range(20)], matrix, [{"text": text} for text in texts], namespace="t"
+    )
+    assert result["upserted_count"] == 20
+
+    hits = await store.query_batch(matrix[[3, 7]], top_k=1, namespace="t")
+    assert [h[0]["id"] for h in hits] == ["c3", "c7"]
+    with pytest.raises(ValueError):
+        await store.upsert_array(["x"], matrix, [{}], namespace="t")
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_tiers_and_counters(tmp_path, monkeypatch):
+    """Repeated texts are embedded once; the SQLite tier survives a restart."""
+    settings = Settings(embedding_cache_size=2, embedding_cache_path=str(tmp_path / "cache.sqlite"))
+    service = EmbeddingService(settings)
+    embedded = []
+    original = service._embed
+
+    async def counting_embed(texts, model, task_type):
+        embedded.extend(texts)
+        return await original(texts, model, task_type)
+
+    monkeypatch.setattr(service, "_embed", counting_embed)
+    first = await service.generate_embeddings_array(["footer", "a", "footer", "b"])
+    assert embedded == ["footer", "a", "b"]
+    assert np.array_equal(first[0], first[2])
+
+    second = await service.generate_embeddings_array(["b", "footer", "a"])
+    assert embedded == ["footer", "a", "b"]
+    assert np.array_equal(second, first[[3, 0, 1]])
+    stats = service.cache.stats()
+    # Memory holds 2 entries, so one of the three came from SQLite
+    assert (stats["entries"], stats["hits"], stats["disk_hits"], stats["misses"]) == (2, 2, 1, 4)
+
+    # Query embeddings are cached separately from document embeddings
+    await service.generate_embeddings_array(["a"], task_type="retrieval_query")
+    assert embedded[-1] == "a"
+
+    # Only the model that produces the vectors is served, so cache keys never mislabel them
+    assert np.array_equal(await service.generate_embeddings_array(["a"], model=service.embedder.name), first[1:2])
+    with pytest.raises(ValueError):
+        await service.generate_embeddings_array(["a"], model="embedding-001")
+
+    restarted = EmbeddingCache(max_entries=10, path=settings.embedding_cache_path)
+    keys = [EmbeddingCache.key(text, service.embedder.name, "retrieval_document") for text in ["a", "zzz"]]
+    hit, miss = restarted.get_many(keys)
+    assert np.array_equal(hit, first[1]) and miss is None
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_local_embedder_ranks_related_texts_first():
+    """Hashed n-gram embeddings put texts sharing words (even misspelled) closest."""
+    embedder = HashedNgramEmbedder()
+    documents = [
+        "Resetting the VPN password requires admin access",
+        "Quarterly sales report for the EMEA region",
+        "Error 0x80070005 when installing Windows updates",
+        "Cafeteria menu for next week",
+    ]
+    queries = ["how do I reset my vpn pasword", "EMEA sales numbers this quarter", "update fails with 0x80070005"]
+    matrix = embedder.embed(documents)
+    scores = embedder.embed(queries) @ matrix.T
+    assert scores.argmax(axis=1).tolist() == [0, 1, 2]
+
+    # Batching doesn't change a text's embedding
+    assert np.allclose(embedder.embed(documents[2:3])[0], matrix[2], atol=1e-6)
+    assert not embedder.embed([""]).any()
+
+    # Lone surrogates (tolerated by the chunker) embed like any other text
+    surrogate = embedder.embed(["broken \ud83d text"])
+    assert surrogate.shape == (1, embedder.dim) and np.isclose(np.linalg.norm(surrogate), 1.0)
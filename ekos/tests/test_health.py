@@ -29,3 +29,12 @@ def test_root_endpoint():
     assert data["status"] == "running"
     assert "docs" in data
 
+
+def test_service_stats_endpoint():
+    """Stats endpoint exposes embedding cache counters and vector store stats."""
+    response = client.get("/health/stats")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert {"hits", "disk_hits", "misses", "hit_rate"} <= set(data["embedding_cache"])
+    assert isinstance(data["vector_store"], dict)
@@ -0,0 +1,177 @@
+"""Tests for the BM25 lexical index and hybrid retrieval."""
+
+import time
+
+import numpy as np
+import pytest
+
+from app.config import Settings
+from services.lexical_index import (
+    LexicalIndex,
+    MappedLexicalIndex,
+    _append_varint,
+    decode_varints,
+    lexical_block,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+from services.vector_collection import VectorCollection
+from services.vector_index import FlatIndex
+from services.vector_store import VectorStore
+
+
+def _corpus(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"w{i}" for i in range(300)]
+    # Zipf-like term frequencies, so some terms are common and some rare
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    return [" ".join(rng.choice(vocabulary, size=rng.integers(5, 60), p=weights)) for _ in range(n)]
+
+
+def test_tokenize_keeps_ticket_keys_and_parts():
+    """Compound tokens are indexed whole and by their parts."""
+    assert tokenize("Fix PROJ-1234: error 0x80070005 for j.smith") == [
+        "fix",
+        "proj-1234",
+        "proj",
+        "1234",
+        "error",
+        "0x80070005",
+        "for",
+        "j.smith",
+        "j",
+        "smith",
+    ]
+
+
+def test_varint_round_trip():
+    """Vectorized varint decoding matches the encoded values."""
+    values = [0, 1, 127, 128, 300, 16384, 2**31 + 5]
+    data = bytearray()
+    for value in values:
+        _append_varint(data, value)
+    assert decode_varints(bytes(data)).tolist() == values
+
+
+def test_early_termination_keeps_exact_top_k():
+    """Impact-ordered early termination returns the same top-k set as a full evaluation."""
+    texts = _corpus(2000)
+    index = LexicalIndex()
+    index.add([f"d{i}" for i in range(len(texts))], texts)
+    index.remove(["d3", "d4"])
+
+    for query in ["w1 w50 w200", "w7 w120", "w299 w0 w13 w88"]:
+        fast = index.search(query, top_k=10)
+        full = index.search(query, top_k=10, early_termination=False)
+        assert {vector_id for vector_id, _ in fast} == {vector_id for vector_id, _ in full}
+        assert [score for _, score in fast] == pytest.approx([score for _, score in full])
+        assert not {"d3", "d4"} & {vector_id for vector_id, _ in full}
+
+    # Compressed postings take well under the raw (row, tf) int32 pairs
+    postings = sum(len(set(text.split())) for text in texts)
+    assert index.memory_bytes() < postings * 8
+
+
+def test_mapped_postings_match_the_in_memory_index():
+    """Serialized postings score like the index they were written from, straight from the buffer."""
+    texts = _corpus(500) + ["", "Ünïcode PROJ-7 straße", "proj-7"]
+    index = LexicalIndex()
+    index.add([str(row) for row in range(len(texts))], texts)
+    mapped = MappedLexicalIndex(b"padding!" + lexical_block(texts, "text"), offset=8)
+    assert mapped.field == "text" and mapped.row_count == len(texts)
+    assert mapped._data.flags.owndata is False
+
+    live = np.ones(len(texts), dtype=bool)
+    live[[0, 7]] = False
+    for query in ["w1 w50 w200", "w299 w0 missing", "proj-7 straße", "ünïcode"]:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        idf = {token: 1.0 + len(token) for token in mapped.document_frequencies(tokens)}
+        assert mapped.document_frequencies(tokens) == index.document_frequencies(tokens)
+        rows, scores = mapped.top_rows(tokens, idf, 10, live)
+        expected_rows, expected_scores = index.top_rows(tokens, idf, 10, live)
+        assert rows.tolist() == expected_rows.tolist() and scores.tolist() == expected_scores.tolist()
+        assert not {0, 7} & set(rows.tolist())
+
+
+def test_collection_maps_segment_postings_and_indexes_older_segments(tmp_path):
+    """Reopening maps each segment's BM25 postings; segments written without them are indexed in the background."""
+    vectors = np.random.default_rng(0).standard_normal((30, 8)).astype(np.float32)
+    texts = [f"routine update {i}" for i in range(30)]
+    texts[4], texts[25] = "Outage INC-1001 in eu-west", "follow-up on INC-1001"
+
+    def open_collection(lexical_field="text"):
+        return VectorCollection(
+            FlatIndex,
+            directory=str(tmp_path),
+            segment_rows=20,
+            filter_fields=["tenant_id"],
+            lexical_field=lexical_field,
+        )
+
+    def found(collection, text, filter=None):
+        return [hit["id"] for hit in collection.lexical_search(text, top_k=5, filter=filter)]
+
+    # Written without a lexical field: the segment has no BM25 postings
+    collection = open_collection(lexical_field=None)
+    metadata = [{"text": text, "tenant_id": "a" if i < 25 else "b"} for i, text in enumerate(texts)]
+    collection.upsert([f"c{i}" for i in range(30)], vectors, metadata)
+    collection.flush()
+    collection.close()
+
+    collection = open_collection()
+    deadline = time.monotonic() + 10
+    while collection._segments[0].lexical is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(found(collection, "inc-1001")) == ["c25", "c4"]
+
+    # New segments carry their postings; sealed overwrites and deletes are honoured
+    collection.upsert(["c4"], vectors[4:5], [{"text": "resolved", "tenant_id": "a"}])
+    collection.delete(["c25"])
+    collection.upsert(["c30"], vectors[:1], [{"text": "INC-1001 postmortem", "tenant_id": "b"}])
+    assert found(collection, "inc-1001") == ["c30"]
+    collection.compact(min_dead_ratio=0.01)
+    collection.close()
+
+    reopened = open_collection()
+    assert all(isinstance(segment.lexical, MappedLexicalIndex) for segment in reopened._segments)
+    assert reopened._lexical.row_count == 0
+    assert found(reopened, "inc-1001") == ["c30"]
+    assert found(reopened, "inc-1001", {"tenant_id": "a"}) == []
+    assert found(reopened, "resolved", {"tenant_id": "a"}) == ["c4"]
+
+
+def test_reciprocal_rank_fusion_weights_lists():
+    """RRF rewards ids ranked well in several lists."""
+    vector = [{"id": "a", "score": 0.9}, {"id": "b", "score": 0.8}]
+    lexical = [{"id": "b", "score": 12.0}, {"id": "c", "score": 3.0}]
+    fused = reciprocal_rank_fusion([vector, lexical], top_k=3)
+    assert [r["id"] for r in fused] == ["b", "a", "c"]
+    assert [r["id"] for r in reciprocal_rank_fusion([vector, lexical], 1, weights=[1.0, 0.0])] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_query_finds_exact_keyword(tmp_path):
+    """Exact keywords missed by embeddings are recovered by the lexical side, also after restart."""
+    settings = Settings(vector_store_dir=str(tmp_path), vector_store_role="writer", vector_segment_rows=8)
+    store = VectorStore(settings)
+    vectors = np.random.default_rng(0).standard_normal((12, 8)).astype(np.float32)
+    texts = [f"meeting notes about topic {i}" for i in range(12)]
+    texts[9] = "Incident PROJ-4821 escalated by Priya Raman"
+    await store.upsert(
+        [
+            {"id": f"c{i}", "values": vectors[i].tolist(), "metadata": {"text": texts[i], "tenant_id": "t"}}
+            for i in range(12)
+        ],
+        namespace="t",
+    )
+
+    lexical = await store.lexical_query("proj-4821", top_k=3, namespace="t")
+    assert [r["id"] for r in lexical] == ["c9"]
+
+    reopened = VectorStore(settings.model_copy(update={"vector_store_role": "reader"}))
+    hybrid = await reopened.hybrid_query(
+        [vectors[0].tolist()], "who escalated PROJ-4821", top_k=3, namespace="t", filter={"tenant_id": "t"}
+    )
+    assert {"c0", "c9"} <= {r["id"] for r in hybrid}
+    assert next(r for r in hybrid if r["id"] == "c9")["metadata"]["text"] == texts[9]
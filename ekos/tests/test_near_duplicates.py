@@ -0,0 +1,205 @@
+"""Tests for near-duplicate chunk detection."""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.config import Settings
+from services.embeddings import EmbeddingService
+from services.near_duplicates import NearDuplicateIndex, minhash_signatures
+from services.vector_store import VectorStore
+
+
+def _paragraph(seed: int, words: int = 150) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"w{rng.randrange(5000)}" for _ in range(2000)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def _shingle_jaccard(a: str, b: str) -> float:
+    def shingles(text: str):
+        text = " ".join(text.lower().split())
+        return {text[i : i + 5] for i in range(len(text) - 4)}
+
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / len(a | b)
+
+
+def test_signatures_estimate_shingle_jaccard():
+    """Equal signature positions track the Jaccard similarity of the texts' shingles."""
+    base = _paragraph(0)
+    words = base.split()
+    variants = [
+        " ".join(words[:70] + ["edited"] + words[71:]),
+        "From: alice@example.com Subject: RE: RE: plan\n" + base,
+        " ".join(words[15:]),
+        _paragraph(1),
+    ]
+    signatures = minhash_signatures([base, *variants])
+    for variant, signature in zip(variants, signatures[1:]):
+        assert abs((signature == signatures[0]).mean() - _shingle_jaccard(base, variant)) < 0.15
+    assert (minhash_signatures(["  ", "abc"]) == np.iinfo(np.uint32).max).all()
+
+
+def test_index_matches_within_and_across_batches_per_namespace():
+    """Near-duplicates match stored chunks and earlier chunks of their batch, in their own namespace only."""
+    index = NearDuplicateIndex(threshold=0.8)
+    base, other = _paragraph(0), _paragraph(1)
+    copy = base.replace("w", "W", 3)  # case-only edits: identical shingles
+    signatures = minhash_signatures([base, other, copy])
+    assert index.match("t1", ["a0", "a1", "a2"], signatures) == [None, None, "a0"]
+    index.add_canonical("t1", ["a0", "a1"], ["a", "a"], signatures[:2])
+
+    assert index.match("t1", ["b0"], signatures[2:]) == ["a0"]
+    assert index.match("t2", ["b0"], signatures[2:]) == [None]
+    # A document being re-ingested doesn't match its own previous chunks
+    assert index.match("t1", ["a5"], signatures[2:], replacing_doc="a") == [None]
+    assert index.match("t1", ["a5"], signatures[2:], replacing_doc="a", fresh_ids=["a0"]) == ["a0"]
+
+
+@pytest.mark.asyncio
+async def test_worker_collapses_copies_and_rehomes_them(monkeypatch):
+    """Copies are not stored, are cited from the canonical chunk, and get stored once it changes."""
+    from workers import worker_ingest
+
+    settings = Settings(near_duplicate_threshold=0.8)
+    store = VectorStore(settings)
+    monkeypatch.setattr(worker_ingest, "get_vector_store", lambda: store)
+    monkeypatch.setattr(worker_ingest, "get_embedding_service", lambda: EmbeddingService(settings))
+
+    def metadata(doc_id: str, chunk_id: str, text: str):
+        return {"doc_id": doc_id, "chunk_id": chunk_id, "text": text, "tenant_id": "t"}
+
+    shared, unique_a, unique_b = _paragraph(0), _paragraph(1), _paragraph(2)
+    quoted = "> " + shared  # e.g. the same paragraph quoted in a reply
+    stored, _ = await worker_ingest._store_chunks(
+        ["a_0", "a_1"], [shared, unique_a], [metadata("a", "a_0", shared), metadata("a", "a_1", unique_a)], "t"
+    )
+    assert stored == ["a_0", "a_1"]
+    stored, _ = await worker_ingest._store_chunks(
+        ["b_0", "b_1"], [quoted, unique_b], [metadata("b", "b_0", quoted), metadata("b", "b_1", unique_b)], "t",
+        replacing_doc="b",
+    )
+    assert stored == ["b_1"]
+    assert len(store._get_collection("t")) == 3
+
+    results = await store.query(EmbeddingService(settings).embedder.embed([shared])[0].tolist(), 3, namespace="t")
+    results = await store.attach_duplicates(results, "t")
+    assert results[0]["id"] == "a_0"
+    assert results[0]["metadata"]["duplicates"] == [{"chunk_id": "b_0", "doc_id": "b"}]
+    assert "duplicates" not in store._get_collection("t")._metadata_of("a_0")
+
+    # Document a is edited: its first chunk now holds other text, so b's copy is stored itself
+    edited = _paragraph(3)
+    await worker_ingest._store_chunks(["a_0"], [edited], [metadata("a", "a_0", edited)], "t", replacing_doc="a")
+    assert store.near_duplicates.release_doc("t", "a", ["a_0"], ["a_0"]) == 1
+    await store.delete_by_doc("a", namespace="t", keep_ids=["a_0"])
+    assert await worker_ingest._rehome_duplicates("t") == 1
+    assert sorted(store._get_collection("t").ids_matching({"tenant_id": "t"})) == ["a_0", "b_0", "b_1"]
+    assert store.near_duplicates.stats()["duplicate_chunks"] == 0
+
+
+@pytest.mark.asyncio
+async def test_deleted_chunks_are_not_matched_and_their_copies_are_rehomed(monkeypatch):
+    """After a delete, the same text is stored again and copies of the deleted chunk become searchable."""
+    from workers import worker_ingest
+
+    settings = Settings(near_duplicate_threshold=0.8)
+    store = VectorStore(settings)
+    embedder = EmbeddingService(settings)
+    monkeypatch.setattr(worker_ingest, "get_vector_store", lambda: store)
+    monkeypatch.setattr(worker_ingest, "get_embedding_service", lambda: embedder)
+
+    def metadata(doc_id: str, chunk_id: str, text: str):
+        return {"doc_id": doc_id, "chunk_id": chunk_id, "text": text, "tenant_id": "t"}
+
+    shared = _paragraph(0)
+    quoted = "> " + shared
+    await worker_ingest._store_chunks(["a_0"], [shared], [metadata("a", "a_0", shared)], "t")
+    stored, _ = await worker_ingest._store_chunks(["b_0"], [quoted], [metadata("b", "b_0", quoted)], "t")
+    assert stored == []
+
+    result = await store.delete_by_doc("a", namespace="t")
+    assert result["deleted_count"] == 1 and result["orphaned_duplicates"] == 1
+    assert store.near_duplicates.stats()["canonical_chunks"] == 0
+    assert await worker_ingest._rehome_duplicates("t") == 1
+    assert store._get_collection("t").ids_matching({"doc_id": "b"}) == ["b_0"]
+
+    # The same text ingested again is a copy of b's live chunk, not of the deleted one
+    stored, _ = await worker_ingest._store_chunks(["c_0"], [shared], [metadata("c", "c_0", shared)], "t")
+    assert stored == [] and store.near_duplicates.duplicates_of("t", ["b_0"]) == {
+        "b_0": [{"chunk_id": "c_0", "doc_id": "c"}]
+    }
+
+    # With every copy deleted, it is stored and found again
+    await store.delete_by_doc("b", namespace="t")
+    await store.delete_by_doc("c", namespace="t")
+    assert store.near_duplicates.stats()["duplicate_chunks"] == 0
+    stored, upserted = await worker_ingest._store_chunks(["d_0"], [shared], [metadata("d", "d_0", shared)], "t")
+    assert stored == ["d_0"] and upserted == 1
+    results = await store.query(embedder.embedder.embed([shared])[0].tolist(), 1, namespace="t")
+    assert [r["id"] for r in results] == ["d_0"]
+
+
+@pytest.mark.asyncio
+async def test_rejected_reader_deletes_leave_the_duplicate_map_alone(tmp_path, monkeypatch):
+    """A reader's delete fails before any near-duplicate entry is released."""
+    from workers import worker_ingest
+
+    settings = Settings(vector_store_dir=str(tmp_path), vector_store_role="writer", near_duplicate_threshold=0.8)
+    store = VectorStore(settings)
+    monkeypatch.setattr(worker_ingest, "get_vector_store", lambda: store)
+    monkeypatch.setattr(worker_ingest, "get_embedding_service", lambda: EmbeddingService(settings))
+
+    shared = _paragraph(0)
+    for doc_id, text in (("a", shared), ("b", "> " + shared)):
+        metadata = {"doc_id": doc_id, "chunk_id": f"{doc_id}_0", "text": text, "tenant_id": "t"}
+        await worker_ingest._store_chunks([f"{doc_id}_0"], [text], [metadata], "t")
+    await store.flush()
+
+    reader = VectorStore(settings.model_copy(update={"vector_store_role": "reader"}))
+    with pytest.raises(RuntimeError):
+        await reader.delete(["a_0"], "t")
+    with pytest.raises(RuntimeError):
+        await reader.delete_by_doc("a", "t")
+    assert store.near_duplicates.stats()["canonical_chunks"] == 1
+    assert store.near_duplicates.duplicates_of("t", ["a_0"]) == {"a_0": [{"chunk_id": "b_0", "doc_id": "b"}]}
+
+
+@pytest.mark.asyncio
+async def test_reingesting_an_edited_document_only_embeds_changed_chunks(tmp_path, monkeypatch):
+    """Unchanged chunks keep their vectors; new ones are embedded and removed ones deleted."""
+    from services.preprocess import PreprocessService
+    from workers import worker_ingest
+
+    settings = Settings(preprocess_processes=-1)
+    store = VectorStore(settings)
+    embedder = EmbeddingService(settings)
+    embedded = []
+    generate = embedder.generate_embeddings_array
+
+    async def counting(texts):
+        embedded.extend(texts)
+        return await generate(texts)
+
+    monkeypatch.setattr(embedder, "generate_embeddings_array", counting)
+    monkeypatch.setattr(worker_ingest, "get_vector_store", lambda: store)
+    monkeypatch.setattr(worker_ingest, "get_embedding_service", lambda: embedder)
+    service = PreprocessService(settings)
+
+    paragraphs = [_paragraph(seed, words=400) for seed in range(10)]
+    path = tmp_path / "doc.txt"
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    chunk_ids, stored, upserted, unchanged = await worker_ingest._ingest_chunks(service, "d", str(path), {}, "t")
+    assert upserted == len(chunk_ids) == len(embedded) and unchanged == 0
+
+    paragraphs[5] = paragraphs[5].replace("w", "v", 40)
+    path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+    embedded.clear()
+    new_ids, stored, upserted, unchanged = await worker_ingest._ingest_chunks(service, "d", str(path), {}, "t")
+    await store.delete_by_doc("d", namespace="t", keep_ids=stored)
+
+    assert unchanged == len(new_ids) - len(embedded) and 0 < len(embedded) <= 6 < unchanged
+    assert upserted == len(embedded)
+    assert sorted(store._get_collection("t").ids_matching({"doc_id": "d"})) == sorted(new_ids)
@@ -0,0 +1,231 @@
+"""Tests for document preprocessing."""
+
+import asyncio
+import io
+import os
+
+import pytest
+
+from app.config import Settings
+from services import preprocess
+from services.preprocess import PreprocessService, iter_content_defined_chunks, iter_text_chunks
+
+
+def _sample_text(sentences: int = 400) -> str:
+    return " ".join(f"Sentence {i} talks about topic {i % 7}." + ("\n" if i % 9 == 0 else "") for i in range(sentences))
+
+
+def test_streaming_chunks_have_global_offsets_and_overlap(monkeypatch):
+    """Chunks read in small blocks carry offsets into the whole text and overlap their predecessor."""
+    monkeypatch.setattr(preprocess, "_READ_CHARS", 101)
+    text = _sample_text()
+    chunks = list(iter_text_chunks(io.StringIO(text), chunk_size=300, chunk_overlap=50))
+
+    assert chunks[0]["metadata"]["chunk_start"] == 0
+    assert chunks[-1]["metadata"]["chunk_end"] >= len(text)
+    for chunk in chunks:
+        start, end = chunk["metadata"]["chunk_start"], chunk["metadata"]["chunk_end"]
+        assert chunk["text"] == text[start:end].strip()
+        assert chunk["metadata"]["chunk_length"] == len(text[start:end])
+        assert len(text[start:end]) <= 300
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["metadata"]["chunk_start"] == previous["metadata"]["chunk_end"] - 50
+    assert list(iter_text_chunks(io.StringIO(""))) == []
+
+
+def test_content_defined_chunks_only_change_around_an_edit(monkeypatch):
+    """Editing the middle of a text changes the chunks near the edit; the others come out identical."""
+    text = _sample_text(3000)
+    edited = text[:40000] + " An inserted sentence." + text[40000:41000] + text[41500:]
+    chunks = list(iter_content_defined_chunks(io.StringIO(text), chunk_size=500, chunk_overlap=100))
+    for chunk in chunks:
+        start, end = chunk["metadata"]["chunk_start"], chunk["metadata"]["chunk_end"]
+        assert chunk["text"] == text[start:end].strip()
+        assert len(text[start:end]) <= 500
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["metadata"]["chunk_start"] == previous["metadata"]["chunk_end"] - 100
+    assert chunks[-1]["metadata"]["chunk_end"] == len(text)
+
+    # Boundaries don't depend on how the stream is read
+    monkeypatch.setattr(preprocess, "_READ_CHARS", 101)
+    assert list(iter_content_defined_chunks(io.StringIO(text), chunk_size=500, chunk_overlap=100)) == chunks
+
+    before = {chunk["text"] for chunk in chunks}
+    after = [chunk["text"] for chunk in iter_content_defined_chunks(io.StringIO(edited), 500, 100)]
+    changed = [chunk for chunk in after if chunk not in before]
+    assert 0 < len(changed) <= 8
+    assert list(iter_content_defined_chunks(io.StringIO(""))) == []
+
+
+@pytest.mark.asyncio
+async def test_text_files_are_chunked_like_in_memory_text(tmp_path, monkeypatch):
+    """Streaming a file yields the same chunks as chunking its text in one piece."""
+    text = _sample_text(2000)
+    path = tmp_path / "doc.md"
+    path.write_text(text, encoding="utf-8")
+    service = PreprocessService(Settings(preprocess_processes=-1, text_chunking="fixed"))
+
+    expected = await service._chunk_text(text, 500, 100)
+    monkeypatch.setattr(preprocess, "_READ_CHARS", 777)
+    streamed = [chunk async for chunk in service.iter_chunks(str(path), {"chunk_size": 500, "chunk_overlap": 100})]
+    assert streamed == expected
+
+    result = await service.process_document("doc", str(path), {"chunk_size": 500, "chunk_overlap": 100})
+    assert result["chunk_count"] == len(expected) and result["status"] == "success"
+
+
+@pytest.mark.asyncio
+async def test_spreadsheet_rows_become_chunks_in_batches(tmp_path):
+    """CSV rows are read in batches; null cells are skipped and long rows are split."""
+    path = tmp_path / "sheet.csv"
+    path.write_text("name,qty,note\nalice,3,\nbob,,late\n,,\ncarol,7," + "x" * 150 + "\n", encoding="utf-8")
+    service = PreprocessService(Settings(spreadsheet_batch_rows=2, preprocess_processes=-1))
+
+    chunks = [chunk async for chunk in service.iter_chunks(str(path), {"chunk_size": 100, "chunk_overlap": 10})]
+
+    assert [chunk["text"] for chunk in chunks[:2]] == ["name: alice | qty: 3.0", "name: bob | note: late"]
+    assert chunks[1]["metadata"] == {
+        "chunk_start": 0,
+        "chunk_end": 100,
+        "chunk_length": 22,
+        "row_index": 1,
+        "chunk_index": 0,
+        "row_data": {"name": "bob", "note": "late"},
+    }
+    # The empty row has no chunk; the long one is split with overlap
+    long_row = chunks[2:]
+    assert [chunk["metadata"]["row_index"] for chunk in long_row] == [3, 3]
+    assert [chunk["metadata"]["chunk_index"] for chunk in long_row] == [0, 1]
+    assert long_row[1]["metadata"]["chunk_start"] == 90
+    assert long_row[0]["metadata"]["row_data"] == {"name": "carol", "qty": "7.0", "note": "x" * 150}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("ext", [".parquet", ".feather"])
+async def test_columnar_files_stream_row_chunks(tmp_path, ext):
+    """Parquet and Feather rows become chunks batch by batch, reading only the requested columns."""
+    pa = pytest.importorskip("pyarrow")
+    from pyarrow import feather, parquet
+
+    table = pa.table(
+        {
+            "name": ["alice", "bob", None, "carol", "dave"],
+            "qty": [3, None, None, 7, 1],
+            "note": ["ok", "late", None, "x" * 150, None],
+            "blob": [b"a", b"b", b"c", b"d", b"e"],
+        }
+    )
+    path = tmp_path / f"export{ext}"
+    if ext == ".parquet":
+        parquet.write_table(table, path, row_group_size=2)
+    else:
+        feather.write_feather(table, path, chunksize=2)
+    service = PreprocessService(Settings(spreadsheet_batch_rows=2, preprocess_processes=-1))
+    options = {"chunk_size": 100, "chunk_overlap": 10, "columns": ["name", "qty", "note"]}
+
+    chunks = [chunk async for chunk in service.iter_chunks(str(path), options)]
+
+    assert [chunk["text"] for chunk in chunks[:2]] == ["name: alice | qty: 3 | note: ok", "name: bob | note: late"]
+    assert chunks[1]["metadata"]["row_data"] == {"name": "bob", "note": "late"}
+    # Row 2 is all null; row 3 is split with overlap; row numbers run across batches
+    assert [(c["metadata"]["row_index"], c["metadata"]["chunk_index"]) for c in chunks[2:]] == [(3, 0), (3, 1), (4, 0)]
+    assert chunks[3]["metadata"]["chunk_start"] == 90
+    assert chunks[4]["text"] == "name: dave | qty: 1"
+
+
+@pytest.mark.asyncio
+async def test_process_pool_streams_chunks_without_blocking_the_loop(tmp_path):
+    """Offloaded chunking matches in-process chunking while the event loop keeps running."""
+    path = tmp_path / "large.txt"
+    path.write_text(_sample_text(60000), encoding="utf-8")
+    options = {"chunk_size": 400, "chunk_overlap": 50}
+    expected = list(PreprocessService(Settings(preprocess_processes=-1))._iter_file_chunks(str(path), options))
+    service = PreprocessService(Settings(preprocess_processes=1))
+    try:
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        chunks = [chunk async for chunk in service.iter_chunks(str(path), options)]
+        task.cancel()
+        assert chunks == expected and ticks > 10
+
+        # A consumer that stops early cancels the job instead of leaving it blocked
+        stream = service.iter_chunks(str(path), options)
+        assert await stream.__anext__() == expected[0]
+        await stream.aclose()
+        assert [chunk async for chunk in service.iter_chunks(str(path), options)][-1] == expected[-1]
+    finally:
+        service.close()
+
+
+@pytest.mark.asyncio
+async def test_pdf_pages_are_extracted_in_ranges_with_page_metadata(tmp_path):
+    """PDF chunks come out in page order and record the pages they span."""
+    pytest.importorskip("pypdf")
+    from benchmarks.pdf_extraction import synthetic_pdf
+
+    path = tmp_path / "doc.pdf"
+    synthetic_pdf(str(path), pages=7, lines_per_page=20)
+    service = PreprocessService(Settings(preprocess_processes=-1, pdf_pages_per_task=3))
+    chunks = [chunk async for chunk in service.iter_chunks(str(path), {"chunk_size": 500, "chunk_overlap": 50})]
+
+    assert chunks[0]["metadata"]["page_start"] == 1
+    assert chunks[-1]["metadata"]["page_end"] == 7
+    for chunk in chunks:
+        metadata = chunk["metadata"]
+        assert metadata["page_count"] == 7
+        # Every "Page N line" marker in the text lies within the recorded span
+        for line in chunk["text"].splitlines():
+            if line.startswith("Page "):
+                assert metadata["page_start"] <= int(line.split()[1]) <= metadata["page_end"]
+    assert any(c["metadata"]["page_start"] < c["metadata"]["page_end"] for c in chunks)
+
+
+@pytest.mark.asyncio
+async def test_chunk_artifacts_are_reused_by_content_and_evicted(tmp_path, monkeypatch):
+    """A second run over the same content reads the saved artifact; old artifacts are evicted."""
+    settings = Settings(preprocess_processes=-1, preprocess_cache_dir=str(tmp_path / "artifacts"))
+    service = PreprocessService(settings)
+    first = tmp_path / "a.md"
+    first.write_text(_sample_text(), encoding="utf-8")
+    options = {"chunk_size": 300, "chunk_overlap": 50}
+
+    # Stopping early leaves no artifact behind
+    async for _ in service.iter_chunks(str(first), options):
+        break
+    assert service.artifacts.stats()["artifacts"] == 0
+
+    chunks = [chunk async for chunk in service.iter_chunks(str(first), options)]
+    assert service.artifacts.stats()["artifacts"] == 1
+
+    async def no_extraction(*args):
+        raise AssertionError("extracted again")
+        yield
+
+    monkeypatch.setattr(service, "_extract_chunks", no_extraction)
+    # Same bytes under another name (and the worker's OCR/STT flags) hit the artifact
+    copy = tmp_path / "b.md"
+    copy.write_bytes(first.read_bytes())
+    cached = [chunk async for chunk in service.iter_chunks(str(copy), {**options, "ocr": True, "stt": True})]
+    assert cached == chunks
+    assert service.artifacts.hits == 1
+    # Other chunking options are a different artifact
+    with pytest.raises(AssertionError):
+        _ = [chunk async for chunk in service.iter_chunks(str(first), {"chunk_size": 500})]
+    monkeypatch.undo()
+
+    # Over budget, the least recently used artifact goes first
+    service.artifacts.max_bytes = service.artifacts.stats()["bytes"]
+    first_key = service.artifacts.key(str(first), service._artifact_options(str(first), options))
+    os.utime(service.artifacts.path(first_key), (0, 0))
+    other = tmp_path / "c.md"
+    other.write_text(_sample_text(50), encoding="utf-8")
+    _ = [chunk async for chunk in service.iter_chunks(str(other), options)]
+    assert service.artifacts.stats()["artifacts"] == 1
+    assert service.artifacts.open(first_key) is None
@@ -31,6 +31,20 @@ def test_query_endpoint():
     assert "query_id" in data
 
 
+def test_query_endpoint_with_expansions():
+    """Query expansions are retrieved in one batch alongside the query."""
+    payload = {
+        "query": "What is EKOS?",
+        "tenant_id": "test_tenant",
+        "top_k": 5,
+        "expansions": ["EKOS overview", "What does EKOS do?"],
+    }
+
+    response = client.post("/query", json=payload)
+    assert response.status_code == 200
+    assert "answer" in response.json()
+
+
 def test_screenshot_match():
     """Test screenshot matching endpoint."""
     # Create a simple test image (1x1 pixel PNG in base64)
@@ -0,0 +1,517 @@
+"""Tests for the local vector store and its indexes."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.config import Settings
+from services.hnsw_index import HNSW_AVAILABLE, HNSWIndex
+from services.ivfpq_index import IVFPQIndex
+from services import vector_index
+from services.vector_collection import VectorCollection
+from services.vector_index import FlatIndex
+from services import vector_store
+from services.vector_store import VectorStore
+
+needs_hnswlib = pytest.mark.skipif(not HNSW_AVAILABLE, reason="hnswlib is not installed")
+
+
+def _random_vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def test_flat_index_matches_brute_force():
+    """Flat index returns the same top-k as a brute-force cosine ranking."""
+    vectors = _random_vectors(500)
+    ids = [f"v{i}" for i in range(len(vectors))]
+    index = FlatIndex()
+    index.add(ids, vectors)
+
+    query = _random_vectors(1, seed=1)[0]
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(normed @ (query / np.linalg.norm(query))))[:10]
+
+    hits = index.search(query, top_k=10)
+    assert [vector_id for vector_id, _ in hits] == [ids[i] for i in expected]
+    assert hits[0][1] >= hits[-1][1]
+
+
+def test_flat_index_overwrite_and_remove():
+    """Upserting an existing id reuses its row; removed ids are never returned."""
+    index = FlatIndex(initial_capacity=2)
+    index.add(["a", "b", "c"], np.eye(3))
+    row = index.row_of("a")
+    index.add(["a"], [[0.0, 1.0, 0.0]])
+
+    assert index.row_of("a") == row
+    assert len(index) == 3
+
+    assert index.remove(["b", "missing"]) == 1
+    hits = index.search([0.0, 1.0, 0.0], top_k=3)
+    assert [vector_id for vector_id, _ in hits] == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_vector_store_local_query_with_filter():
+    """Local store applies metadata filters before ranking."""
+    store = VectorStore()
+    vectors = _random_vectors(20, dim=8)
+    await store.upsert(
+        [
+            {
+                "id": f"chunk_{i}",
+                "values": vectors[i].tolist(),
+                "metadata": {"tenant_id": "a" if i % 2 else "b", "text": str(i)},
+            }
+            for i in range(len(vectors))
+        ]
+    )
+
+    results = await store.query(vectors[3].tolist(), top_k=3, filter={"tenant_id": "a"})
+    assert results[0]["id"] == "chunk_3"
+    assert all(r["metadata"]["tenant_id"] == "a" for r in results)
+
+    await store.delete(["chunk_3"])
+    results = await store.query(vectors[3].tolist(), top_k=3, filter={"tenant_id": "a"})
+    assert "chunk_3" not in [r["id"] for r in results]
+
+
+@needs_hnswlib
+def test_hnsw_index_recall_against_flat():
+    """HNSW reaches high recall@10 and honours tombstones and masks."""
+    vectors = _random_vectors(1000, dim=16, seed=2)
+    ids = [f"v{i}" for i in range(len(vectors))]
+    exact = FlatIndex()
+    exact.add(ids, vectors)
+    approx = HNSWIndex(m=8, ef_construction=64, ef_search=64, seed=0)
+    approx.add(ids, vectors)
+
+    queries = _random_vectors(20, dim=16, seed=3)
+    hits = 0
+    for query in queries:
+        truth = {vector_id for vector_id, _ in exact.search(query, top_k=10)}
+        hits += len(truth & {vector_id for vector_id, _ in approx.search(query, top_k=10)})
+    assert hits / (10 * len(queries)) >= 0.9
+
+    approx.add(["v0"], vectors[1:2])
+    approx.remove(["v1"])
+    top = approx.search(vectors[1], top_k=2)
+    assert top[0][0] == "v0"
+    assert "v1" not in [vector_id for vector_id, _ in top]
+
+    mask = np.zeros(approx.row_count, dtype=bool)
+    mask[approx.row_of("v5")] = True
+    assert [vector_id for vector_id, _ in approx.search(query, top_k=3, mask=mask)] == ["v5"]
+
+    half = approx.live_mask() & (np.arange(approx.row_count) % 2 == 0)
+    hits = approx.search(query, top_k=10, mask=half)
+    assert len(hits) == 10
+    assert all(approx.row_of(vector_id) % 2 == 0 for vector_id, _ in hits)
+
+
+def test_hnsw_backend_falls_back_to_flat_without_hnswlib(monkeypatch):
+    """Without hnswlib, VECTOR_INDEX_BACKEND=hnsw serves exact results from the flat index."""
+    monkeypatch.setattr(vector_store, "HNSW_AVAILABLE", False)
+    store = VectorStore(Settings(vector_index_backend="hnsw"))
+    assert type(store._create_index()) is FlatIndex
+
+
+def test_ivfpq_index_trains_and_compresses():
+    """IVF-PQ answers exactly before training and from compact codes after it."""
+    rng = np.random.default_rng(4)
+    centers = rng.standard_normal((8, 16))
+    vectors = (centers[rng.integers(0, 8, 600)] + 0.5 * rng.standard_normal((600, 16))).astype(np.float32)
+    ids = [f"v{i}" for i in range(len(vectors))]
+    exact = FlatIndex()
+    exact.add(ids, vectors)
+
+    reranked = IVFPQIndex(nlist=8, m=8, nprobe=8, rerank=True, rerank_candidates=50, train_size=500, seed=0)
+    reranked.add(ids[:100], vectors[:100])
+    assert not reranked.trained
+    assert reranked.search(vectors[7], top_k=1)[0][0] == "v7"
+    reranked.add(ids[100:], vectors[100:])
+    assert reranked.trained
+
+    compact = IVFPQIndex(nlist=8, m=8, nprobe=8, train_size=500, seed=0)
+    compact.add(ids, vectors)
+    assert compact.memory_bytes() < exact.memory_bytes() / 2
+
+    def recall(index):
+        hits = 0
+        for query in vectors[:20]:
+            truth = {vector_id for vector_id, _ in exact.search(query, top_k=10)}
+            hits += len(truth & {vector_id for vector_id, _ in index.search(query, top_k=10)})
+        return hits / 200
+
+    assert recall(compact) >= 0.7
+    assert recall(reranked) >= 0.95
+
+
+@pytest.mark.parametrize(
+    "factory", [FlatIndex, pytest.param(lambda: HNSWIndex(m=4, ef_construction=32, seed=0), marks=needs_hnswlib)]
+)
+def test_collection_persists_segments_and_log(tmp_path, factory):
+    """Sealed segments are mapped on restart and the append log is replayed."""
+    vectors = _random_vectors(30, dim=8, seed=5)
+    ids = [f"c{i}" for i in range(30)]
+    metadata = [{"doc_id": f"d{i % 3}", "n": i} for i in range(30)]
+
+    collection = VectorCollection(factory, directory=str(tmp_path), segment_rows=20)
+    collection.upsert(ids[:20], vectors[:20], metadata[:20])  # seals segment 1
+    collection.upsert(ids[20:], vectors[20:], metadata[20:])  # stays in the log
+    collection.delete(["c3", "c25"])
+    collection.upsert(["c4"], vectors[10:11], [{"doc_id": "moved"}])
+    collection.close()
+
+    reopened = VectorCollection(factory, directory=str(tmp_path), segment_rows=20)
+    assert len(reopened) == 28
+    segment = reopened._segments[0]
+    assert not segment.vectors.flags.writeable and not segment.vectors.flags.owndata
+
+    top = reopened.search(vectors[10], top_k=2)
+    assert {hit["id"] for hit in top} == {"c4", "c10"}
+    assert reopened.search(vectors[4], top_k=1, filter={"doc_id": "d1"})[0]["id"] != "c4"
+    assert "c3" not in [hit["id"] for hit in reopened.search(vectors[3], top_k=5)]
+
+    reopened.flush()
+    reopened.close()
+    again = VectorCollection(factory, directory=str(tmp_path), segment_rows=20)
+    assert len(again) == 28
+    assert again.search(vectors[27], top_k=1, filter={"n": 27})[0]["metadata"] == metadata[27]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "manifest.json",
+        "seg-000001.000002.del",
+        "seg-000001.seg",
+        "seg-000002.seg",
+        "writer.lock",
+    ]
+
+
+@pytest.mark.parametrize(
+    "factory", [FlatIndex, pytest.param(lambda: HNSWIndex(m=4, ef_construction=32, seed=0), marks=needs_hnswlib)]
+)
+def test_collection_filters_use_postings(tmp_path, factory):
+    """Indexed filter fields resolve through posting lists, in memory and in sealed segments."""
+    vectors = _random_vectors(40, dim=8, seed=7)
+    ids = [f"f{i}" for i in range(40)]
+    metadata = [
+        {"tenant_id": f"t{i % 4}", "tags": ["even" if i % 2 == 0 else "odd", "all"], "n": i}
+        for i in range(40)
+    ]
+    fields = ["tenant_id", "tags"]
+
+    collection = VectorCollection(factory, directory=str(tmp_path), segment_rows=25, filter_fields=fields)
+    collection.upsert(ids[:30], vectors[:30], metadata[:30])  # seals segment 1
+    collection.upsert(ids[30:], vectors[30:], metadata[30:])
+    collection.upsert(["f1"], vectors[1:2], [{"tenant_id": "t0", "tags": ["even"], "n": 1}])
+
+    def found(filter, store=collection):
+        return {hit["id"] for hit in store.search(vectors[0], top_k=40, filter=filter)}
+
+    expected = {ids[i] for i in range(40) if i % 4 == 1 and i != 1}
+    assert found({"tenant_id": "t1"}) == expected
+    assert found({"tenant_id": {"$in": ["t1", "t2"]}, "tags": "odd"}) == expected
+    assert found({"tenant_id": {"$eq": "t0"}, "n": {"$in": [1, 4, 35]}}) == {"f1", "f4"}
+    assert found({"tags": "missing"}) == set()
+
+    collection.flush()
+    collection.close()
+    reopened = VectorCollection(factory, directory=str(tmp_path), segment_rows=25, filter_fields=fields)
+    assert reopened._segments[0].postings()["tenant_id"]['"t1"'].flags.owndata is False
+    assert found({"tenant_id": "t1"}, reopened) == expected
+    assert found({"tags": {"$in": ["even"]}, "n": 1}, reopened) == {"f1"}
+
+
+def test_posting_filters_match_brute_force_on_numeric_values(tmp_path):
+    """Posting lists treat 1, 1.0 and True as equal, like the brute-force filter."""
+    values = [1, 1.0, True, 0, False, 2.5, [2.0, "x"], "1", None, float("nan")]
+    vectors = _random_vectors(len(values), dim=8, seed=3)
+    ids = [f"n{i}" for i in range(len(values))]
+    metadata = [{"n": value} for value in values]
+
+    indexed = VectorCollection(FlatIndex, directory=str(tmp_path), segment_rows=4, filter_fields=["n"])
+    indexed.upsert(ids, vectors, metadata)  # seals a segment
+    brute_force = VectorCollection(FlatIndex)
+    brute_force.upsert(ids, vectors, metadata)
+
+    def found(store, filter):
+        return {hit["id"] for hit in store.search(vectors[0], top_k=len(values), filter=filter)}
+
+    filters = [
+        {"n": 1},
+        {"n": 1.0},
+        {"n": True},
+        {"n": {"$eq": False}},
+        {"n": {"$in": [2, 2.5]}},
+        {"n": "1"},
+        {"n": float("nan")},
+    ]
+    for filter in filters:
+        assert found(indexed, filter) == found(brute_force, filter), filter
+    assert found(indexed, {"n": 1}) == {"n0", "n1", "n2"}
+    assert found(indexed, {"n": {"$in": [2, 2.5]}}) == {"n5", "n6"}
+
+
+@pytest.mark.asyncio
+async def test_vector_store_namespaces_are_isolated(tmp_path):
+    """Each namespace has its own collection; idle persistent ones are evicted and reopened."""
+    settings = Settings(vector_store_dir=str(tmp_path), vector_store_role="writer", vector_max_open_namespaces=2)
+    store = VectorStore(settings)
+    vectors = _random_vectors(6, dim=8, seed=3)
+    for i, tenant in enumerate(["acme", "globex", "tenant/with spaces"]):
+        await store.upsert(
+            [{"id": f"{tenant}-{j}", "values": vectors[2 * i + j].tolist(), "metadata": {}} for j in range(2)],
+            namespace=tenant,
+        )
+
+    # Three namespaces were opened with room for two: "acme" was closed
+    assert set(store.stats()) == {"globex", "tenant/with spaces"}
+    assert all(stats["vectors"] == 2 for stats in store.stats().values())
+
+    results = await store.query(vectors[0].tolist(), top_k=5, namespace="acme")
+    assert [r["id"] for r in results][:1] == ["acme-0"]
+    assert all(r["id"].startswith("acme-") for r in results)
+    assert await store.query(vectors[0].tolist(), top_k=5, namespace="unknown") == []
+    assert not (tmp_path / "unknown").exists()
+    assert (await store.delete(["acme-0"], namespace="globex"))["deleted_count"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["flat", pytest.param("hnsw", marks=needs_hnswlib)])
+async def test_query_batch_matches_single_queries(tmp_path, backend):
+    """query_batch returns the same per-query results as separate query calls."""
+    settings = Settings(
+        vector_store_dir=str(tmp_path),
+        vector_store_role="writer",
+        vector_segment_rows=60,
+        vector_index_backend=backend,
+    )
+    store = VectorStore(settings)
+    vectors = _random_vectors(100, dim=16, seed=9)
+    await store.upsert(
+        [
+            {"id": f"b{i}", "values": vectors[i].tolist(), "metadata": {"source": f"s{i % 3}"}}
+            for i in range(100)
+        ]
+    )
+    queries = _random_vectors(6, dim=16, seed=10).tolist()
+    filters = [None, {"source": "s1"}, {"source": "s1"}, None, {"source": "s2"}, {"source": "none"}]
+
+    batch = await store.query_batch(queries, top_k=7, filters=filters)
+    for query, filter, results in zip(queries, filters, batch):
+        expected = await store.query(query, top_k=7, filter=filter)
+        assert [r["id"] for r in results] == [r["id"] for r in expected]
+    assert batch[-1] == []
+    assert await store.query_batch(queries[:2], top_k=3, namespace="missing") == [[], []]
+
+
+@pytest.mark.parametrize("quantization", ["int8", "float16"])
+def test_quantized_scan_rescores_in_float32(tmp_path, quantization):
+    """Quantized first-pass scans return exact float32 scores, in memory and from segments."""
+    vectors = _random_vectors(400, dim=32, seed=11)
+    ids = [f"q{i}" for i in range(400)]
+    queries = _random_vectors(5, dim=32, seed=12)
+    exact = FlatIndex()
+    exact.add(ids, vectors)
+    expected = exact.search_batch(queries, top_k=10)
+
+    index = FlatIndex(quantization=quantization, rescore_candidates=50)
+    index.add(ids, vectors)
+    assert index.memory_bytes() > exact.memory_bytes()
+    for hits, reference in zip(index.search_batch(queries, top_k=10), expected):
+        assert [vector_id for vector_id, _ in hits] == [vector_id for vector_id, _ in reference]
+        assert np.allclose([s for _, s in hits], [s for _, s in reference], atol=1e-6)
+
+    def factory():
+        return FlatIndex(quantization=quantization, rescore_candidates=50)
+
+    collection = VectorCollection(factory, str(tmp_path), segment_rows=400, quantization=quantization)
+    collection.upsert(ids, vectors, [{} for _ in ids])
+    collection.close()
+    reopened = VectorCollection(factory, str(tmp_path), quantization=quantization)
+    segment = reopened._segments[0]
+    assert segment.quantized.kind == quantization and not segment.quantized.codes.flags.owndata
+    for hits, reference in zip(reopened.search_batch(queries, top_k=10), expected):
+        assert [hit["id"] for hit in hits] == [vector_id for vector_id, _ in reference]
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+def test_sharded_scan_matches_serial_scan(monkeypatch, quantization):
+    """Scanning shards on a thread pool and merging their top-k gives the serial result."""
+    monkeypatch.setattr(vector_index, "_BATCH_BLOCK_ROWS", 64)
+    monkeypatch.setattr(vector_index, "_MIN_SHARD_ROWS", 100)
+    monkeypatch.setattr(vector_index.os, "cpu_count", lambda: 4)
+    assert len(vector_index._shard_bounds(1000, ThreadPoolExecutor(1))) == 4
+    # A scan pool smaller than the core count gets one shard per thread
+    assert len(vector_index._shard_bounds(1000, vector_index.ScanExecutor(2))) == 2
+
+    vectors = _random_vectors(1000, seed=13)
+    ids = [f"s{i}" for i in range(1000)]
+    queries = _random_vectors(3, seed=14)
+    masks = [None, np.arange(1000) % 3 != 0, np.arange(1000) < 100]
+    serial = FlatIndex(quantization=quantization, rescore_candidates=40)
+    serial.add(ids, vectors)
+    with vector_index.ScanExecutor(4) as executor:
+        sharded = FlatIndex(quantization=quantization, rescore_candidates=40, scan_executor=executor)
+        sharded.add(ids, vectors)
+        assert sharded.search_batch(queries, 10, masks) == serial.search_batch(queries, 10, masks)
+
+
+@pytest.mark.asyncio
+async def test_delete_by_doc_and_compaction(tmp_path):
+    """Stale chunks are removed by doc_id and compaction reclaims their rows across restarts."""
+    settings = Settings(vector_store_dir=str(tmp_path), vector_store_role="writer", vector_segment_rows=20)
+    store = VectorStore(settings)
+    vectors = _random_vectors(30, dim=8, seed=13)
+
+    def chunks(doc_id, count, offset=0):
+        return [
+            {
+                "id": f"{doc_id}_chunk_{i}",
+                "values": vectors[offset + i].tolist(),
+                "metadata": {"doc_id": doc_id, "source": "upload" if i % 2 else "url"},
+            }
+            for i in range(count)
+        ]
+
+    await store.upsert(chunks("a", 12) + chunks("b", 10, offset=12))
+    # Re-ingest "a" with fewer chunks, then drop the leftover tail
+    await store.upsert(chunks("a", 4, offset=22))
+    result = await store.delete_by_doc("a", keep_ids=[f"a_chunk_{i}" for i in range(4)])
+    assert result["deleted_count"] == 8
+    assert (await store.delete_by_filter({"doc_id": "b", "source": "url"}))["deleted_count"] == 5
+
+    collection = store._get_collection(None)
+    assert collection.dead_ratio() > 0.3
+    assert sorted(collection.ids_matching({"doc_id": "a"})) == [f"a_chunk_{i}" for i in range(4)]
+    assert (await store.compact())["default"] > 0
+    assert collection.dead_ratio() == 0.0
+
+    reopened = VectorStore(settings.model_copy(update={"vector_store_role": "reader"}))
+    results = await reopened.query(vectors[22].tolist(), top_k=20)
+    assert results[0]["id"] == "a_chunk_0"
+    assert sorted(r["id"] for r in results) == sorted(
+        [f"a_chunk_{i}" for i in range(4)] + [f"b_chunk_{i}" for i in range(1, 10, 2)]
+    )
+
+
+@pytest.mark.asyncio
+async def test_readers_follow_the_writer(tmp_path):
+    """Read-only stores share the writer's segments, apply its log and switch generations."""
+    settings = Settings(
+        vector_store_dir=str(tmp_path),
+        vector_store_role="writer",
+        vector_segment_rows=10,
+        vector_store_refresh_seconds=0,
+    )
+    writer = VectorStore(settings)
+    reader = VectorStore(settings.model_copy(update={"vector_store_role": "reader"}))
+    vectors = _random_vectors(16, dim=8, seed=21)
+
+    def items(start, stop):
+        return [{"id": f"r{i}", "values": vectors[i].tolist(), "metadata": {"n": i}} for i in range(start, stop)]
+
+    assert await reader.query(vectors[0].tolist(), namespace="t") == []
+    await writer.upsert(items(0, 4), namespace="t")
+    assert (await reader.query(vectors[2].tolist(), top_k=1, namespace="t"))[0]["id"] == "r2"
+    first = reader._get_collection("t", create=False)
+
+    # Log tail: applied in place
+    await writer.upsert(items(4, 8), namespace="t")
+    await writer.delete(["r2"], namespace="t")
+    assert (await reader.query(vectors[6].tolist(), top_k=1, namespace="t"))[0]["id"] == "r6"
+    assert reader._get_collection("t", create=False) is first and len(first) == 7
+
+    # Sealing publishes a new generation: the reader keeps serving the old one
+    # while it reopens in the background, then maps the same files
+    await writer.upsert(items(8, 16), namespace="t")
+    assert len(await reader.query(vectors[12].tolist(), top_k=20, namespace="t")) == 7
+    reader._reopening["t"].result()
+    results = await reader.query(vectors[12].tolist(), top_k=20, namespace="t")
+    assert results[0]["id"] == "r12" and len(results) == 15
+    current = reader._get_collection("t", create=False)
+    assert current is not first and current.generation == writer._get_collection("t").generation
+    assert current._segments[0].path == writer._get_collection("t")._segments[0].path
+
+    with pytest.raises(RuntimeError):
+        await reader.upsert(items(0, 1), namespace="t")
+    with pytest.raises(RuntimeError):
+        VectorStore(settings)._get_collection("t")
+
+
+@pytest.mark.asyncio
+async def test_reduce_namespace_projects_stored_vectors_and_queries(tmp_path):
+    """A reduced namespace keeps its projection with the index and applies it to new upserts and queries."""
+    settings = Settings(
+        vector_store_dir=str(tmp_path),
+        vector_store_role="writer",
+        vector_segment_rows=50,
+        vector_store_refresh_seconds=0,
+    )
+    store = VectorStore(settings)
+    # 32-dimensional vectors close to an 8-dimensional subspace: PCA to 8 keeps almost everything
+    rng = np.random.default_rng(31)
+    vectors = (rng.standard_normal((130, 8)) @ rng.standard_normal((8, 32))).astype(np.float32)
+    vectors += 0.01 * _random_vectors(130, seed=32)
+
+    def items(start, stop):
+        return [{"id": f"d{i}", "values": vectors[i].tolist(), "metadata": {"n": i}} for i in range(start, stop)]
+
+    await store.upsert(items(0, 120), namespace="cold")
+    await store.delete(["d3"], namespace="cold")
+
+    report = await store.evaluate_reduction("cold", dims=(4, 8))
+    recall = {(row["method"], row["dims"]): row["recall@10"] for row in report["candidates"]}
+    assert report["dim"] == 32 and report["vectors"] == 119
+    assert recall[("pca", 8)] > 0.9 and recall[("pca", 8)] >= recall[("truncate", 8)]
+
+    result = await store.reduce_namespace("cold", "pca", 8)
+    assert result == {"status": "success", "vectors": 119, "dim_before": 32, "dim_after": 8}
+    collection = store._get_collection("cold")
+    assert collection.stats()["projection"] == {"method": "pca", "input_dim": 32, "output_dim": 8}
+    with pytest.raises(ValueError):
+        collection.reduce(collection.projection)
+
+    # Full-size vectors go in and queries come in full size too
+    await store.upsert(items(120, 130), namespace="cold")
+    for i in (7, 125):
+        results = await store.query(vectors[i].tolist(), top_k=1, namespace="cold")
+        assert results[0]["id"] == f"d{i}" and results[0]["metadata"] == {"n": i}
+    assert all(r["id"] != "d3" for r in await store.query(vectors[3].tolist(), top_k=130, namespace="cold"))
+
+    # Readers load the projection from the manifest
+    await store.flush()
+    reader = VectorStore(settings.model_copy(update={"vector_store_role": "reader"}))
+    assert (await reader.query(vectors[125].tolist(), top_k=1, namespace="cold"))[0]["id"] == "d125"
+    assert reader._get_collection("cold", create=False).dim == 8
+    assert len([f for f in (tmp_path / "cold").iterdir() if f.name.startswith("proj-")]) == 1
+
+
+def test_only_the_ingest_worker_writes_by_default(tmp_path, monkeypatch):
+    """Without VECTOR_STORE_ROLE persistent stores open read-only until the ingest worker claims the writer role."""
+    from workers import worker_ingest
+
+    monkeypatch.setattr(vector_store, "_default_role", "reader")
+    assert VectorStore(Settings(vector_store_dir=str(tmp_path))).read_only
+    assert not VectorStore(Settings()).read_only
+    with pytest.raises(RuntimeError, match="ingest worker owns writes"):
+        VectorStore(Settings(vector_store_dir=str(tmp_path)))._get_collection("acme")
+
+    worker_ingest._open_vector_store_as_writer()
+    assert not VectorStore(Settings(vector_store_dir=str(tmp_path))).read_only
+    assert VectorStore(Settings(vector_store_dir=str(tmp_path), vector_store_role="reader")).read_only
+
+
+def test_ingest_worker_runs_one_writer_process(tmp_path, monkeypatch):
+    """With a persisted store the prefork worker starts a single child, whatever --concurrency says."""
+    from workers import worker_ingest
+
+    monkeypatch.setattr(worker_ingest, "settings", Settings(vector_store_dir=str(tmp_path)))
+    # Starting a worker claims the writer role for this process; restore it afterwards
+    monkeypatch.setattr(vector_store, "_default_role", vector_store._default_role)
+    worker = worker_ingest.celery_app.WorkController(concurrency=4, pool_cls="prefork")
+    assert worker.concurrency == 1
+    worker = worker_ingest.celery_app.WorkController(concurrency=4, pool_cls="threads")
+    assert worker.concurrency == 4
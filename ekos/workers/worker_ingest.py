@@ -1,16 +1,24 @@
 """Background worker for document ingestion."""
 
+import hashlib
+import json
 import logging
 import os
+import time
 import uuid
-from typing import Any, Dict, Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from celery import Celery
+from celery.concurrency import get_implementation
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.signals import worker_init, worker_process_init
 
 from app.config import Settings, get_settings
 from services.embeddings import get_embedding_service
+from services.near_duplicates import minhash_signatures
 from services.preprocess import get_preprocess_service
-from services.vector_store import get_vector_store
+from services.vector_store import claim_writer_role, get_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +38,40 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
 )
+if settings.vector_store_dir:
+    # Only one process may hold the vector store's writer lock
+    celery_app.conf.worker_concurrency = 1
+
+# This worker is the vector store writer, so it also runs compaction
+_last_compaction = time.monotonic()
+
+
+@worker_init.connect
+def _limit_to_one_writer_process(sender, **_) -> None:
+    """Run a single prefork child when the vector store is persisted, even if ``--concurrency`` asks for more."""
+    if (
+        settings.vector_store_dir
+        and sender.concurrency > 1
+        and issubclass(get_implementation(sender.pool_cls), PreforkPool)
+    ):
+        logger.warning(
+            f"Ingest worker concurrency {sender.concurrency} lowered to 1: only one process may write "
+            f"to {settings.vector_store_dir}"
+        )
+        sender.concurrency = 1
+
+
+@worker_init.connect
+@worker_process_init.connect
+def _open_vector_store_as_writer(**_) -> None:
+    """Claim the vector store writer role when the worker (and its pool process) starts."""
+    claim_writer_role()
+
+
+# Chunk offsets: they move when text before the chunk is edited, without
+# changing the chunk, so they are left out of its hash (and may be stale for
+# chunks kept from an earlier version)
+_POSITIONAL_FIELDS = ("chunk_start", "chunk_end")
 
 
 @celery_app.task(name="workers.worker_ingest.process_document_task")
@@ -68,25 +110,18 @@ def process_document_task(doc_id: str, file_path: str, metadata: Optional[Dict[s
         else:
             actual_file_path = file_path
 
-        # Process document (async method needs to be awaited in async context)
+        # Steps 2-3: chunks are embedded and upserted in batches as the
+        # preprocessor yields them, so only one batch is held at a time
         import asyncio
-        result = asyncio.run(
-            preprocess_service.process_document(
-                doc_id=doc_id,
-                file_path=actual_file_path,
-                options={
-                    "ocr": True,  # Enable OCR for images
-                    "stt": True,  # Enable STT for audio
-                    "chunk_size": 1000,
-                    "chunk_overlap": 200,
-                },
-            )
-        )
 
-        chunks = result.get("chunks", [])
-        logger.info(f"Generated {len(chunks)} chunks for doc_id: {doc_id}")
+        vector_store = get_vector_store()
+        tenant_id = metadata.get("tenant_id", "default")
+        chunk_ids, stored_ids, upserted, unchanged = asyncio.run(
+            _ingest_chunks(preprocess_service, doc_id, actual_file_path, metadata, tenant_id)
+        )
+        logger.info(f"Generated {len(chunk_ids)} chunks for doc_id: {doc_id} ({unchanged} unchanged)")
 
-        if not chunks:
+        if not chunk_ids:
             logger.warning(f"No chunks generated for doc_id: {doc_id}")
             return {
                 "doc_id": doc_id,
@@ -94,42 +129,25 @@ def process_document_task(doc_id: str, file_path: str, metadata: Optional[Dict[s
                 "message": "No chunks generated",
             }
 
-        # Step 2: Generate embeddings
-        embedding_service = get_embedding_service()
-
-        chunk_texts = [chunk["text"] for chunk in chunks]
-        import asyncio
-        embeddings = asyncio.run(embedding_service.generate_embeddings_batch(chunk_texts))
-
-        # Step 3: Upsert to vector store
-        vector_store = get_vector_store()
-
-        tenant_id = metadata.get("tenant_id", "default")
-        vectors = []
-
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_id = f"{doc_id}_chunk_{i}"
-
-            vector = {
-                "id": chunk_id,
-                "values": embedding,
-                "metadata": {
-                    "doc_id": doc_id,
-                    "chunk_id": chunk_id,
-                    "text": chunk["text"][:1000],  # Limit text in metadata
-                    "tenant_id": tenant_id,
-                    "source": metadata.get("source", "unknown"),
-                    **chunk.get("metadata", {}),
-                    **metadata,
-                },
-            }
-            vectors.append(vector)
-
-        # Batch upsert
-        import asyncio
-        upsert_result = asyncio.run(vector_store.upsert(vectors=vectors, namespace=tenant_id))
-
-        logger.info(f"Upserted {len(vectors)} vectors for doc_id: {doc_id}")
+        logger.info(f"Upserted {upserted} vectors for doc_id: {doc_id}")
+        duplicates = len(chunk_ids) - len(stored_ids)
+        if duplicates:
+            logger.info(f"Collapsed {duplicates} near-duplicate chunks for doc_id: {doc_id}")
+
+        if vector_store.near_duplicates is not None:
+            # Copies elsewhere of chunks this version dropped or changed need a new canonical chunk
+            vector_store.near_duplicates.release_doc(tenant_id, doc_id, chunk_ids, stored_ids)
+
+        # Drop chunks of the previous version that this one no longer has
+        # (and chunks that are now near-duplicates of others)
+        stale_result = asyncio.run(vector_store.delete_by_doc(doc_id, namespace=tenant_id, keep_ids=stored_ids))
+        if stale_result.get("deleted_count"):
+            logger.info(f"Deleted {stale_result['deleted_count']} stale chunks for doc_id: {doc_id}")
+        if vector_store.near_duplicates is not None:
+            rehomed = asyncio.run(_rehome_duplicates(tenant_id))
+            if rehomed:
+                logger.info(f"Re-homed {rehomed} near-duplicate chunks of other documents after doc_id: {doc_id}")
+        _maybe_compact(vector_store)
 
         # Cleanup temporary file if downloaded
         if file_path.startswith("http://") or file_path.startswith("https://"):
@@ -141,9 +159,11 @@ def process_document_task(doc_id: str, file_path: str, metadata: Optional[Dict[s
         return {
             "doc_id": doc_id,
             "status": "success",
-            "chunks_processed": len(chunks),
-            "vectors_upserted": upsert_result.get("upserted_count", 0),
-            "message": f"Processed {len(chunks)} chunks and upserted to vector store",
+            "chunks_processed": len(chunk_ids),
+            "vectors_upserted": upserted,
+            "chunks_unchanged": unchanged,
+            "near_duplicates": duplicates,
+            "message": f"Processed {len(chunk_ids)} chunks and upserted to vector store",
         }
 
     except Exception as e:
@@ -155,6 +175,227 @@ def process_document_task(doc_id: str, file_path: str, metadata: Optional[Dict[s
         }
 
 
+def _chunk_hash(text: str, chunk_metadata: Dict[str, Any]) -> str:
+    """Hash of what is stored for a chunk: its text and metadata, except offsets."""
+    fields = {key: value for key, value in chunk_metadata.items() if key not in _POSITIONAL_FIELDS}
+    digest = hashlib.sha256(text.encode("utf-8", "surrogatepass"))
+    digest.update(b"\0")
+    digest.update(json.dumps(fields, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+async def _ingest_chunks(
+    preprocess_service, doc_id: str, file_path: str, metadata: Dict[str, Any], tenant_id: str
+) -> Tuple[List[str], List[str], int, int]:
+    """
+    Embed and upsert a document's chunks, ``ingest_batch_chunks`` at a time.
+
+    Chunk IDs are derived from the chunk text, and each chunk stores a hash
+    of its text and metadata. When the document was ingested before, chunks
+    whose ID and hash are already stored are kept as they are, so
+    re-ingesting an edited document (with content-defined chunking, only the
+    chunks around the edit change) embeds and upserts only the new chunks.
+
+    Returns:
+        IDs of all chunks, IDs of those stored as vectors (the others are
+        near-duplicates of stored chunks), the number of vectors upserted,
+        and the number of chunks unchanged since the previous ingest
+    """
+    chunk_ids: List[str] = []
+    stored_ids: List[str] = []
+    upserted = 0
+    unchanged = 0
+    if not os.path.exists(file_path):
+        return chunk_ids, stored_ids, upserted, unchanged
+
+    previous = await get_vector_store().doc_chunk_hashes(doc_id, namespace=tenant_id)
+    occurrences: Counter = Counter()
+
+    def chunk_id_of(text: str) -> str:
+        # The same text twice in a document: second and later copies get a suffix
+        key = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+        occurrences[key] += 1
+        return f"{doc_id}_chunk_{key}" if occurrences[key] == 1 else f"{doc_id}_chunk_{key}_{occurrences[key]}"
+
+    async def upsert(batch: List[Dict[str, Any]]) -> int:
+        nonlocal unchanged
+        ids = [chunk_id_of(chunk["text"]) for chunk in batch]
+        chunk_ids.extend(ids)
+        changed_ids: List[str] = []
+        texts: List[str] = []
+        chunk_metadata: List[Dict[str, Any]] = []
+        for chunk_id, chunk in zip(ids, batch):
+            fields = {
+                "doc_id": doc_id,
+                "chunk_id": chunk_id,
+                "text": chunk["text"][:1000],  # Limit text in metadata
+                "tenant_id": tenant_id,
+                "source": metadata.get("source", "unknown"),
+                **chunk.get("metadata", {}),
+                **metadata,
+            }
+            fields["chunk_hash"] = _chunk_hash(chunk["text"], fields)
+            if previous.get(chunk_id) == fields["chunk_hash"]:
+                stored_ids.append(chunk_id)
+                unchanged += 1
+                continue
+            changed_ids.append(chunk_id)
+            texts.append(chunk["text"])
+            chunk_metadata.append(fields)
+        if not changed_ids:
+            return 0
+        stored, count = await _store_chunks(
+            changed_ids, texts, chunk_metadata, tenant_id, replacing_doc=doc_id, fresh_ids=stored_ids
+        )
+        stored_ids.extend(stored)
+        return count
+
+    batch: List[Dict[str, Any]] = []
+    async for chunk in preprocess_service.iter_chunks(
+        file_path,
+        options={
+            "ocr": True,  # Enable OCR for images
+            "stt": True,  # Enable STT for audio
+            "chunk_size": 1000,
+            "chunk_overlap": 200,
+        },
+    ):
+        batch.append(chunk)
+        if len(batch) >= settings.ingest_batch_chunks:
+            upserted += await upsert(batch)
+            batch = []
+    if batch:
+        upserted += await upsert(batch)
+    return chunk_ids, stored_ids, upserted, unchanged
+
+
+async def _store_chunks(
+    ids: List[str],
+    texts: List[str],
+    chunk_metadata: List[Dict[str, Any]],
+    namespace: str,
+    replacing_doc: Optional[str] = None,
+    fresh_ids: Sequence[str] = (),
+) -> Tuple[List[str], int]:
+    """
+    Embed and upsert chunks, except near-duplicates of the tenant's stored chunks.
+
+    Near-duplicates are recorded as back-references to the chunk they
+    duplicate instead of being embedded.
+
+    Args:
+        ids: Chunk IDs
+        texts: Chunk texts (embedded)
+        chunk_metadata: Metadata stored with each chunk
+        namespace: Tenant namespace
+        replacing_doc: Document being re-ingested (see ``NearDuplicateIndex.match``)
+        fresh_ids: Its chunks already stored by this run
+
+    Returns:
+        IDs stored as vectors and the number of vectors upserted
+    """
+    embedding_service = get_embedding_service()
+    vector_store = get_vector_store()
+    near_duplicates = vector_store.near_duplicates
+
+    keep = list(range(len(ids)))
+    if near_duplicates is not None:
+        signatures = minhash_signatures(texts)
+        canonical = near_duplicates.match(namespace, ids, signatures, replacing_doc, fresh_ids)
+        keep = [i for i, canonical_id in enumerate(canonical) if canonical_id is None]
+
+    upserted = 0
+    if keep:
+        # One (n, dim) float32 matrix, passed to the vector store as is
+        embeddings = await embedding_service.generate_embeddings_array([texts[i] for i in keep])
+        result = await vector_store.upsert_array(
+            [ids[i] for i in keep], embeddings, [chunk_metadata[i] for i in keep], namespace=namespace
+        )
+        upserted = result.get("upserted_count", 0)
+
+    if near_duplicates is not None:
+        near_duplicates.add_canonical(
+            namespace, [ids[i] for i in keep], [chunk_metadata[i].get("doc_id") for i in keep], signatures[keep]
+        )
+        copies = [i for i, canonical_id in enumerate(canonical) if canonical_id is not None]
+        if copies:
+            near_duplicates.add_duplicates(
+                namespace,
+                [ids[i] for i in copies],
+                [canonical[i] for i in copies],
+                signatures[copies],
+                [texts[i] for i in copies],
+                [chunk_metadata[i] for i in copies],
+            )
+    return [ids[i] for i in keep], upserted
+
+
+async def _rehome_duplicates(namespace: str) -> int:
+    """
+    Match again, or store, the near-duplicates whose canonical chunk was deleted or changed.
+
+    Returns:
+        Number of near-duplicates re-homed
+    """
+    orphans = get_vector_store().near_duplicates.orphans(namespace)
+    for start in range(0, len(orphans), settings.ingest_batch_chunks):
+        batch = orphans[start : start + settings.ingest_batch_chunks]
+        await _store_chunks(
+            [orphan["chunk_id"] for orphan in batch],
+            [orphan["text"] for orphan in batch],
+            [orphan["metadata"] for orphan in batch],
+            namespace,
+        )
+    return len(orphans)
+
+
+def _maybe_compact(vector_store) -> None:
+    """Compact the vector store at most every ``vector_compact_interval_seconds``."""
+    global _last_compaction
+    interval = settings.vector_compact_interval_seconds
+    if interval <= 0 or time.monotonic() - _last_compaction < interval:
+        return
+    _last_compaction = time.monotonic()
+    import asyncio
+
+    reclaimed = asyncio.run(vector_store.compact())
+    if reclaimed:
+        logger.info(f"Vector compaction reclaimed rows: {reclaimed}")
+
+
+@celery_app.task(name="workers.worker_ingest.delete_document_task")
+def delete_document_task(doc_id: str, tenant_id: str = "default"):
+    """
+    Delete a document's chunks, and store or re-match the near-duplicates collapsed into them.
+
+    Args:
+        doc_id: Document ID
+        tenant_id: Tenant namespace
+
+    Returns:
+        Deletion result
+    """
+    import asyncio
+
+    try:
+        vector_store = get_vector_store()
+        result = asyncio.run(vector_store.delete_by_doc(doc_id, namespace=tenant_id))
+        rehomed = 0
+        if vector_store.near_duplicates is not None:
+            rehomed = asyncio.run(_rehome_duplicates(tenant_id))
+        logger.info(f"Deleted {result.get('deleted_count', 0)} chunks for doc_id: {doc_id}, re-homed {rehomed}")
+        _maybe_compact(vector_store)
+        return {
+            "doc_id": doc_id,
+            "status": result.get("status", "success"),
+            "deleted_count": result.get("deleted_count", 0),
+            "near_duplicates_rehomed": rehomed,
+        }
+    except Exception as e:
+        logger.error(f"Error deleting document {doc_id}: {e}", exc_info=True)
+        return {"doc_id": doc_id, "status": "error", "message": str(e)}
+
+
 # Alternative: Async task (if using async workers)
 @celery_app.task(name="workers.worker_ingest.process_document_task_async")
 async def process_document_task_async(
@@ -169,4 +410,3 @@ async def process_document_task_async(
 if __name__ == "__main__":
     # Run worker directly
     celery_app.worker_main()
-